@@ -0,0 +1,102 @@
+"""
+Python 2 SDK for the KATANA(tm) Framework (http://katana.kusanagi.io)
+
+Copyright (c) 2016-2018 KUSANAGI S.L. All rights reserved.
+
+Distributed under the MIT license.
+
+For the full copyright and license information, please view the LICENSE
+file that was distributed with this source code.
+
+Benchmark for the component startup time.
+
+Each statement is run in a new Python process, and the time is the
+median of the runs minus the time to start an empty interpreter.
+
+Usage: python benchmarks/startup.py [RUNS]
+
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import time
+
+__license__ = "MIT"
+__copyright__ = "Copyright (c) 2016-2018 KUSANAGI S.L. (http://kusanagi.io)"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Statements to benchmark by name
+STATEMENTS = (
+    ('empty interpreter', 'pass'),
+    ('import katana.sdk', 'import katana.sdk'),
+    ('create service', (
+        'from katana.sdk import Service; '
+        'Service().action("foo", lambda action: action)'
+        )),
+    ('create server', (
+        'from katana.schema import SchemaRegistry; '
+        'from katana.service import ServiceServer; '
+        'SchemaRegistry(); '
+        'ServiceServer({}, {"name": "foo", "version": "1.0"})'
+        )),
+    )
+
+# Modules that should only be imported when they are used
+DEFERRED_MODULES = ('click', 'gevent', 'zmq', 'inspect', 'multiprocessing')
+
+REPORT_MODULES = (
+    'import sys, katana.sdk; '
+    'print(",".join(sorted(name for name in {!r} if name in sys.modules)))'
+    ).format(DEFERRED_MODULES)
+
+
+def run(statement):
+    """Run a statement in a new Python process.
+
+    :param statement: Python statement to run.
+    :type statement: str
+
+    :returns: The run time in milliseconds.
+    :rtype: float
+
+    """
+
+    start = time.time()
+    subprocess.check_call([sys.executable, '-c', statement], cwd=ROOT)
+    return (time.time() - start) * 1000
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main(runs):
+    timings = []
+    for name, statement in STATEMENTS:
+        timings.append((name, median([run(statement) for _ in range(runs)])))
+
+    baseline = timings[0][1]
+    print('Startup time (median of {} runs):'.format(runs))
+    for name, value in timings:
+        print('  {:<20} {:8.2f}ms {:+8.2f}ms'.format(
+            name,
+            value,
+            value - baseline,
+            ))
+
+    loaded = subprocess.check_output(
+        [sys.executable, '-c', REPORT_MODULES],
+        cwd=ROOT,
+        ).strip()
+    print('Deferred modules imported by katana.sdk: {}'.format(
+        loaded or 'none',
+        ))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
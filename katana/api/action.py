@@ -14,12 +14,11 @@ from __future__ import absolute_import
 
 import copy
 import logging
+import threading
 
+from collections import Iterator
 from decimal import Decimal
 
-import zmq
-import zmq.green
-
 from ..logging import RequestLogger
 from ..payload import CommandPayload
 from ..payload import ErrorPayload
@@ -33,6 +32,8 @@ from ..serialization import unpack
 
 from .base import Api
 from .base import ApiError
+from .collection import ColumnCollection
+from .collection import LazyCollection
 from .file import File
 from .file import file_to_payload
 from .file import payload_to_file
@@ -65,8 +66,10 @@ RETURN_TYPES = {
     'object': (dict, ),
     }
 
-CONTEXT = zmq.green.Context.instance()
-CONTEXT.linger = 0
+# ZMQ module and context for run-time calls, resolved by the first call
+ZMQ = None
+CONTEXT = None
+CONTEXT_LOCK = threading.Lock()
 
 RUNTIME_CALL = b'\x01'
 
@@ -163,6 +166,48 @@ def parse_params(params):
     return result
 
 
+def get_zmq():
+    """Get the ZMQ module for run-time calls.
+
+    The module is imported the first time it is used, so components
+    that don't make run-time calls don't import ZMQ.
+
+    :rtype: module
+
+    """
+
+    global ZMQ
+
+    if ZMQ is None:
+        import zmq.green
+
+        ZMQ = zmq.green
+
+    return ZMQ
+
+
+def get_context():
+    """Get the ZMQ context for run-time calls.
+
+    The context is created the first time it is used, so components
+    that don't make run-time calls don't import or initialize ZMQ.
+
+    :rtype: zmq.green.Context
+
+    """
+
+    global CONTEXT
+
+    if CONTEXT is None:
+        with CONTEXT_LOCK:
+            if CONTEXT is None:
+                context = get_zmq().Context.instance()
+                context.linger = 0
+                CONTEXT = context
+
+    return CONTEXT
+
+
 def runtime_call(address, transport, action, callee, **kwargs):
     """Make a Service run-time call.
 
@@ -205,20 +250,21 @@ def runtime_call(address, transport, action, callee, **kwargs):
 
     command = CommandPayload.new('runtime-call', 'service', args=args)
 
+    zmq = get_zmq()
     timeout = kwargs.get('timeout') or 10000
     channel = ipc(address)
-    socket = CONTEXT.socket(zmq.REQ)
+    socket = get_context().socket(zmq.REQ)
     try:
         socket.connect(channel)
         socket.send_multipart([RUNTIME_CALL, pack(command)], zmq.NOBLOCK)
-        poller = zmq.green.Poller()
+        poller = zmq.Poller()
         poller.register(socket, zmq.POLLIN)
         event = dict(poller.poll(timeout))
         if event.get(socket) == zmq.POLLIN:
             stream = socket.recv()
         else:
             stream = None
-    except zmq.error.ZMQError as err:
+    except zmq.ZMQError as err:
         LOG.exception('Run-time call to address failed: %s', address)
         raise RuntimeCallError('Connection failed')
     finally:
@@ -257,7 +303,7 @@ class Action(Api):
             }
 
         rid = transport.get('meta/id')
-        self._logger = RequestLogger(rid, 'katana.api')
+        self._logger = RequestLogger(rid, 'katana.api', action=action)
 
         service = self.get_name()
         version = self.get_version()
@@ -324,6 +370,45 @@ class Action(Api):
 
         return files_list
 
+    def __get_transport_dict(self, path):
+        # Get a dictionary from the transport using a "|" delimited path.
+        # The dictionary and any missing parent is created when the path
+        # doesn't exist.
+        try:
+            item = self.__transport.get(path, delimiter='|')
+        except KeyError:
+            item = {}
+            self.__transport.set(path, item, delimiter='|')
+        else:
+            if not isinstance(item, dict):
+                raise TypeError(path)
+
+        return item
+
+    def __relate_bulk(self, relations, address, service, many=False):
+        if not isinstance(relations, dict):
+            raise TypeError('Relations must be a dict')
+
+        if many:
+            for foreign_keys in relations.values():
+                if not isinstance(foreign_keys, list):
+                    raise TypeError('Foreign keys must be a list')
+
+        primary_keys = self.__get_transport_dict('relations|{}|{}'.format(
+            self.__gateway[1],
+            nomap(self.get_name()),
+            ))
+        service = '{}'.format(service)
+        for primary_key, foreign_key in relations.items():
+            primary_key = '{}'.format(primary_key)
+            services = primary_keys.get(primary_key)
+            if services is None:
+                services = primary_keys[primary_key] = {}
+
+            services.setdefault(address, {})[service] = foreign_key
+
+        return self
+
     def is_origin(self):
         """Determines if the current service is the origin of the request.
 
@@ -618,8 +703,13 @@ class Action(Api):
         Collextion is validated when validation is enabled for an entity
         in the Service config file.
 
-        :param collection: The collection list.
-        :type collection: list
+        An iterator, like a generator or a database cursor, can also be
+        given as collection. In that case entities are read and packed one
+        at a time when the transport is serialized, and invalid entities
+        make the request fail like errors raised by the action callback.
+
+        :param collection: The collection list or an iterator of entities.
+        :type collection: list, iterator
 
         :raises: TypeError
 
@@ -627,12 +717,14 @@ class Action(Api):
 
         """
 
-        if not isinstance(collection, list):
-            raise TypeError('Collection must be a list')
-
-        for entity in collection:
-            if not isinstance(entity, dict):
-                raise TypeError('Entity must be an dict')
+        if isinstance(collection, list):
+            for entity in collection:
+                if not isinstance(entity, dict):
+                    raise TypeError('Entity must be an dict')
+        elif isinstance(collection, Iterator):
+            collection = LazyCollection(collection)
+        else:
+            raise TypeError('Collection must be a list or an iterator')
 
         self.__transport.push(
             'data|{}|{}|{}|{}'.format(
@@ -646,6 +738,40 @@ class Action(Api):
             )
         return self
 
+    def set_collection_columns(self, fields, columns):
+        """Sets the collection data using columns.
+
+        Sets a collection of entities where the values for each entity
+        field are given as a column. The columns must all have the same
+        length, and the entity at position N is made from the value at
+        position N of each column.
+
+        Entities are created only when the transport is serialized, so
+        columns can use compact sequences like tuples or `array.array`.
+
+        :param fields: The entity field names.
+        :type fields: list
+        :param columns: A column of values for each field name.
+        :type columns: list
+
+        :raises: TypeError
+
+        :rtype: Action
+
+        """
+
+        self.__transport.push(
+            'data|{}|{}|{}|{}'.format(
+                self.__gateway[1],
+                nomap(self.get_name()),
+                self.get_version(),
+                nomap(self.get_action_name()),
+                ),
+            ColumnCollection(fields, columns),
+            delimiter='|',
+            )
+        return self
+
     def relate_one(self, primary_key, service, foreign_key):
         """Creates a "one-to-one" relation between two entities.
 
@@ -784,6 +910,95 @@ class Action(Api):
             )
         return self
 
+    def relate_one_bulk(self, relations, service):
+        """Creates many "one-to-one" relations between entities.
+
+        Creates a "one-to-one" relation for each primary key and foreign
+        key in the given relations.
+
+        :param relations: The foreign keys by primary key.
+        :type relations: dict
+        :param service: The foreign service.
+        :type service: str
+
+        :raises: TypeError
+
+        :rtype: Action
+
+        """
+
+        return self.__relate_bulk(relations, self.__gateway[1], service)
+
+    def relate_many_bulk(self, relations, service):
+        """Creates many "one-to-many" relations between entities.
+
+        Creates a "one-to-many" relation for each primary key and list
+        of foreign keys in the given relations.
+
+        :param relations: The lists of foreign keys by primary key.
+        :type relations: dict
+        :param service: The foreign service.
+        :type service: str
+
+        :raises: TypeError
+
+        :rtype: Action
+
+        """
+
+        return self.__relate_bulk(
+            relations,
+            self.__gateway[1],
+            service,
+            many=True,
+            )
+
+    def relate_one_remote_bulk(self, relations, address, service):
+        """Creates many "one-to-one" relations between entities.
+
+        Creates a "one-to-one" relation for each primary key and foreign
+        key in the given relations.
+
+        This type of relation is done between entities in different realms.
+
+        :param relations: The foreign keys by primary key.
+        :type relations: dict
+        :param address: Foreign service public address.
+        :type address: str
+        :param service: The foreign service.
+        :type service: str
+
+        :raises: TypeError
+
+        :rtype: Action
+
+        """
+
+        return self.__relate_bulk(relations, address, service)
+
+    def relate_many_remote_bulk(self, relations, address, service):
+        """Creates many "one-to-many" relations between entities.
+
+        Creates a "one-to-many" relation for each primary key and list
+        of foreign keys in the given relations.
+
+        This type of relation is done between entities in different realms.
+
+        :param relations: The lists of foreign keys by primary key.
+        :type relations: dict
+        :param address: Foreign service public address.
+        :type address: str
+        :param service: The foreign service.
+        :type service: str
+
+        :raises: TypeError
+
+        :rtype: Action
+
+        """
+
+        return self.__relate_bulk(relations, address, service, many=True)
+
     def set_link(self, link, uri):
         """Sets a link for the given URI.
 
@@ -807,6 +1022,30 @@ class Action(Api):
             )
         return self
 
+    def set_links(self, links):
+        """Sets many links at once.
+
+        :param links: The link URIs by link name.
+        :type links: dict
+
+        :raises: TypeError
+
+        :rtype: Action
+
+        """
+
+        if not isinstance(links, dict):
+            raise TypeError('Links must be a dict')
+
+        references = self.__get_transport_dict('links|{}|{}'.format(
+            self.__gateway[1],
+            nomap(self.get_name()),
+            ))
+        for link, uri in links.items():
+            references['{}'.format(link)] = uri
+
+        return self
+
     def commit(self, action, params=None):
         """Register a transaction to be called when request succeeds.
 
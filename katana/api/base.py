@@ -201,17 +201,29 @@ class Api(object):
 
         return ServiceSchema(name, version, payload)
 
-    def log(self, value, level=INFO):
+    def log(self, value, level=INFO, compact=False):
         """Write a value to KATANA logs.
 
         Given value is converted to string before being logged.
+        The value is not converted when the logging level is disabled.
 
         Output is truncated to have a maximum of 100000 characters.
 
+        :param value: The value to log.
+        :type value: object
+        :param level: Optional logging level.
+        :type level: int
+        :param compact: Optional flag to log dictionaries and lists
+                        as compact JSON.
+        :type compact: bool
+
         """
 
-        if self._logger:
-            self._logger.log(level, value_to_log_string(value))
+        if self._logger and self._logger.isEnabledFor(level):
+            self._logger.log(
+                level,
+                value_to_log_string(value, compact=compact),
+                )
 
     def done(self):
         """This method does nothing and returns False.
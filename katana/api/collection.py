@@ -0,0 +1,191 @@
+"""
+Python 2 SDK for the KATANA(tm) Framework (http://katana.kusanagi.io)
+
+Copyright (c) 2016-2018 KUSANAGI S.L. All rights reserved.
+
+Distributed under the MIT license.
+
+For the full copyright and license information, please view the LICENSE
+file that was distributed with this source code.
+
+"""
+from __future__ import absolute_import
+
+from itertools import izip
+
+__license__ = "MIT"
+__copyright__ = "Copyright (c) 2016-2018 KUSANAGI S.L. (http://kusanagi.io)"
+
+
+class LazyCollection(object):
+    """Collection of entities that is consumed during serialization.
+
+    The collection wraps an iterator, for example a generator or a
+    database cursor, and its entities are validated and packed one at
+    a time when the transport is packed, so the entities don't have to
+    be in memory at the same time.
+
+    """
+
+    def __init__(self, iterable):
+        self.__iterable = iterable
+        self.__entities = None
+        self.__consumed = False
+
+    def __iter__(self):
+        return iter(self.get_entities())
+
+    def __len__(self):
+        return len(self.get_entities())
+
+    def __eq__(self, other):
+        if isinstance(other, LazyCollection):
+            other = other.get_entities()
+
+        return self.get_entities() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __serialize__(self):
+        return self.get_entities()
+
+    def __stream__(self):
+        if self.__entities is not None:
+            return iter(self.__entities)
+
+        return self.__consume()
+
+    def __consume(self):
+        if self.__consumed:
+            raise ValueError('Collection iterator was already consumed')
+
+        self.__consumed = True
+        iterable = self.__iterable
+        self.__iterable = None
+        for entity in iterable:
+            if not isinstance(entity, dict):
+                raise TypeError('Entity must be an dict')
+
+            yield entity
+
+    def is_consumed(self):
+        """Check if the collection iterator was already consumed.
+
+        :rtype: bool
+
+        """
+
+        return self.__consumed
+
+    def get_entities(self):
+        """Get the list of entities in the collection.
+
+        The iterator is consumed the first time this method is called.
+        When the collection is packed before this method is called the
+        entities are not available anymore.
+
+        :raises: TypeError, ValueError
+
+        :rtype: list
+
+        """
+
+        if self.__entities is None:
+            self.__entities = list(self.__consume())
+
+        return self.__entities
+
+
+class ColumnCollection(object):
+    """Collection of entities stored as columns.
+
+    Each column is a sequence with the values for one entity field, so
+    columns can be tuples or `array.array` instances for numeric fields.
+    Entities are only created when the transport is packed, and they
+    are packed one at a time.
+
+    """
+
+    def __init__(self, fields, columns):
+        if not isinstance(fields, (list, tuple)):
+            raise TypeError('Collection fields must be a list')
+
+        for name in fields:
+            if not isinstance(name, basestring):
+                raise TypeError('Collection field names must be strings')
+
+        if not isinstance(columns, (list, tuple)):
+            raise TypeError('Collection columns must be a list')
+
+        if len(columns) != len(fields):
+            raise TypeError('Collection requires one column for each field')
+
+        size = len(columns[0]) if columns else 0
+        for column in columns:
+            if len(column) != size:
+                raise TypeError('Collection columns must have the same length')
+
+        self.__fields = tuple(fields)
+        self.__columns = tuple(columns)
+        self.__size = size
+
+    def __len__(self):
+        return self.__size
+
+    def __iter__(self):
+        fields = self.__fields
+        for row in izip(*self.__columns):
+            yield dict(izip(fields, row))
+
+    def __eq__(self, other):
+        if isinstance(other, ColumnCollection):
+            other = other.get_entities()
+
+        return self.get_entities() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __serialize__(self):
+        return self.get_entities()
+
+    def __stream__(self):
+        return iter(self)
+
+    def get_fields(self):
+        """Get the entity field names.
+
+        :rtype: tuple
+
+        """
+
+        return self.__fields
+
+    def get_column(self, name):
+        """Get the values of an entity field.
+
+        :param name: The field name.
+        :type name: str
+
+        :raises: KeyError
+
+        :rtype: sequence
+
+        """
+
+        try:
+            return self.__columns[self.__fields.index(name)]
+        except ValueError:
+            raise KeyError(name)
+
+    def get_entities(self):
+        """Get the list of entities in the collection.
+
+        A new list of entities is created each time this method is called.
+
+        :rtype: list
+
+        """
+
+        return list(self)
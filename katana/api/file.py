@@ -12,16 +12,16 @@ file that was distributed with this source code.
 
 from __future__ import absolute_import
 
-import httplib
 import logging
 import mimetypes
+import mmap
 import os
-import urllib2
-
-from urlparse import urlparse
 
 from ..payload import get_path
 from ..payload import Payload
+from .fileserver import DEFAULT_CHUNK_SIZE
+from .fileserver import get_cache
+from .fileserver import get_client
 
 __license__ = "MIT"
 __copyright__ = "Copyright (c) 2016-2018 KUSANAGI S.L. (http://kusanagi.io)"
@@ -70,6 +70,85 @@ def payload_to_file(payload):
         )
 
 
+def exists_many(files):
+    """Check if many files exist.
+
+    Remote files are checked in parallel.
+
+    :param files: A list of File objects.
+    :type files: list
+
+    :returns: A list with the existence of each file.
+    :rtype: list
+
+    """
+
+    return get_client().map(lambda file: file.exists(), files)
+
+
+def read_many(files):
+    """Get the data of many files.
+
+    Remote files are read in parallel.
+
+    :param files: A list of File objects.
+    :type files: list
+
+    :returns: A list with the data of each file.
+    :rtype: list
+
+    """
+
+    return get_client().map(lambda file: file.read(), files)
+
+
+def get_local_size(path):
+    """Get the size of a local file.
+
+    :param path: Path to a local file, without the "file://" prefix.
+    :type path: str
+
+    :returns: The size in bytes, or 0 when the file can't be read.
+    :rtype: int
+
+    """
+
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def stat_many(files):
+    """Get the size and mime type of many files at once.
+
+    The sizes of the local files that are not known are read in
+    parallel, and files that share a path are only read once. Values
+    are cached by each file, so files can be created in bulk and their
+    values resolved later in a single step, for example before the
+    files are used from many threads.
+
+    :param files: A list of File objects.
+    :type files: list
+
+    :returns: The list of files.
+    :rtype: list
+
+    """
+
+    paths = sorted(set(
+        file.get_path()[7:] for file in files if not file._has_size()
+        ))
+    sizes = dict(zip(paths, get_client().map(get_local_size, paths)))
+    for file in files:
+        if not file._has_size():
+            file._set_size(sizes[file.get_path()[7:]])
+
+        file.get_mime()
+
+    return files
+
+
 class File(object):
     """File class for API.
 
@@ -93,25 +172,16 @@ class File(object):
         else:
             self.__path = path
 
-        # Set mime type, or guess it from path
-        self.__mime = kwargs.get('mime')
-        if not self.__mime:
-            self.__mime = mimetypes.guess_type(path)[0] or 'text/plain'
+        # Set mime type, or guess it from path when it is first used
+        self.__mime = kwargs.get('mime') or None
 
         # Set file name, or get it from path
         self.__filename = kwargs.get('filename') or os.path.basename(path)
 
-        # Set file size
+        # Set file size, or get it from the file when it is first used
         self.__size = kwargs.get('size')
-        if self.__size is None:
-            if protocol == 'file://':
-                try:
-                    # Get file size from file
-                    self.__size = os.path.getsize(self.__path[7:])
-                except OSError:
-                    self.__size = 0
-            else:
-                self.__size = 0
+        if self.__size is None and protocol != 'file://':
+            self.__size = 0
 
         # Token is required for remote file paths
         self.__token = kwargs.get('token') or ''
@@ -139,10 +209,19 @@ class File(object):
     def get_mime(self):
         """Get mime type.
 
+        When the mime type is not known it is guessed from the path.
+
         :rtype: str.
 
         """
 
+        if self.__mime is None:
+            path = self.__path
+            if path[:7] == 'file://':
+                path = path[7:]
+
+            self.__mime = mimetypes.guess_type(path)[0] or 'text/plain'
+
         return self.__mime
 
     def get_filename(self):
@@ -157,12 +236,24 @@ class File(object):
     def get_size(self):
         """Get file size.
 
+        The size of local files is read from the file system
+        when it is not known.
+
         :rtype: int.
 
         """
 
+        if self.__size is None:
+            self.__size = get_local_size(self.__path[7:])
+
         return self.__size
 
+    def _has_size(self):
+        return self.__size is not None
+
+    def _set_size(self, size):
+        self.__size = size
+
     def get_token(self):
         """Get file server token.
 
@@ -178,6 +269,8 @@ class File(object):
         A request is made to check existence when file
         is located in a remote file server.
 
+        Connections to remote file servers are reused between requests.
+
         :rtype: bool.
 
         """
@@ -193,18 +286,15 @@ class File(object):
                 headers['X-Token'] = self.__token
 
             # Make a HEAD request to check that file exists
-            part = urlparse(self.__path)
             try:
-                conn = httplib.HTTPConnection(part.netloc, timeout=2)
-                conn.request('HEAD', part.path, headers=headers)
-                response = conn.getresponse()
-                exists = response.status == 200
+                status, reason, _ = get_client().head(self.__path, headers)
+                exists = status == 200
                 if not exists:
                     LOG.error(
                         'File server request failed for %s, with error %s %s',
                         self.__path,
-                        response.status,
-                        response.reason,
+                        status,
+                        reason,
                         )
                 return exists
             except:
@@ -223,11 +313,35 @@ class File(object):
 
         return self.__path[:7] == 'file://'
 
+    def __read_remote(self):
+        # Setup headers for request
+        headers = {}
+        if self.__token:
+            headers['X-Token'] = self.__token
+
+        # Read file contents from remote file server
+        try:
+            status, reason, body = get_client().get(self.__path, headers)
+        except:
+            LOG.exception('Unable to read file: %s', self.__path)
+        else:
+            if status == 200:
+                return body
+
+            LOG.error(
+                'Unable to read file %s, with error %s %s',
+                self.__path,
+                status,
+                reason,
+                )
+
     def read(self):
         """Get file data.
 
         Returns the file data from the stored path.
 
+        Remote files are saved in the file cache when it is enabled.
+
         :returns: The file data.
         :rtype: bytes
 
@@ -235,19 +349,15 @@ class File(object):
 
         # Check if file is a remote file
         if self.__path[:7] == 'http://':
-            # Setup headers for request
-            headers = {}
-            if self.__token:
-                headers['X-Token'] = self.__token
-
-            request = urllib2.Request(self.__path, headers=headers)
+            cache = get_cache()
+            if cache:
+                key = cache.get_key(self.__path, self.__token)
+                data = cache.fetch(key, self.__read_remote)
+            else:
+                data = self.__read_remote()
 
-            # Read file contents from remote file server
-            try:
-                with urllib2.urlopen(request) as file:
-                    return file.read()
-            except:
-                LOG.exception('Unable to read file: %s', self.__path)
+            if data is not None:
+                return data
         else:
             # Check that file exists locally
             if not os.path.isfile(self.__path[7:]):
@@ -262,6 +372,138 @@ class File(object):
 
         return b''
 
+    def read_buffer(self):
+        """Get file data as a read only buffer.
+
+        Local files are memory mapped, so the data is not copied
+        into memory. The buffer supports slicing and can be used
+        anywhere a read only buffer is accepted.
+
+        The returned buffer should be closed when it is a memory map.
+
+        Remote files are read completely.
+
+        :returns: The file data.
+        :rtype: `mmap.mmap` or bytes
+
+        """
+
+        if self.__path[:7] != 'file://':
+            return self.read()
+
+        path = self.__path[7:]
+        if not os.path.isfile(path):
+            LOG.error('File does not exist: %s', self.__path)
+            return b''
+
+        try:
+            with open(path, 'rb') as file:
+                return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be memory mapped
+            return b''
+        except:
+            LOG.exception('Unable to read file: %s', self.__path)
+
+        return b''
+
+    def __stream_remote(self, size):
+        # Setup headers for request
+        headers = {}
+        if self.__token:
+            headers['X-Token'] = self.__token
+
+        try:
+            status, reason, chunks = get_client().stream(
+                self.__path,
+                headers,
+                size=size,
+                )
+        except:
+            LOG.exception('Unable to read file: %s', self.__path)
+            return
+
+        if status != 200:
+            # Read the error body so the connection can be reused
+            for _ in chunks:
+                pass
+
+            LOG.error(
+                'Unable to read file %s, with error %s %s',
+                self.__path,
+                status,
+                reason,
+                )
+            return
+
+        return chunks
+
+    def iter_chunks(self, size=DEFAULT_CHUNK_SIZE):
+        """Iterate the file data in chunks.
+
+        Remote files are streamed from the file server, so the
+        complete file data is never loaded into memory.
+
+        No chunks are returned when the file doesn't exist, or when the
+        file server returns an error. When reading the file data fails
+        an IOError is raised, so incomplete data is not mistaken for the
+        complete file.
+
+        :param size: Optional size in bytes for the chunks.
+        :type size: int
+
+        :raises: IOError
+
+        :returns: A generator of bytes.
+        :rtype: generator
+
+        """
+
+        # Check if file is a remote file
+        if self.__path[:7] == 'http://':
+            # Stream the file using the cache when it is enabled
+            cache = get_cache()
+            if cache:
+                chunks = cache.stream(
+                    cache.get_key(self.__path, self.__token),
+                    lambda: self.__stream_remote(size),
+                    size=size,
+                    )
+            else:
+                chunks = self.__stream_remote(size) or ()
+
+            try:
+                for chunk in chunks:
+                    yield chunk
+            except GeneratorExit:
+                raise
+            except:
+                LOG.exception('Unable to read file: %s', self.__path)
+                raise IOError('Unable to read file: {}'.format(self.__path))
+            finally:
+                # Close the connection when the iteration is stopped
+                if hasattr(chunks, 'close'):
+                    chunks.close()
+        else:
+            # Check that file exists locally
+            if not os.path.isfile(self.__path[7:]):
+                LOG.error('File does not exist: %s', self.__path)
+                return
+
+            try:
+                with open(self.__path[7:], 'rb') as file:
+                    while True:
+                        chunk = file.read(size)
+                        if not chunk:
+                            break
+
+                        yield chunk
+            except GeneratorExit:
+                raise
+            except:
+                LOG.exception('Unable to read file: %s', self.__path)
+                raise IOError('Unable to read file: {}'.format(self.__path))
+
     def copy_with_name(self, name):
         return self.__class__(
             name,
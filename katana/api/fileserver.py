@@ -0,0 +1,813 @@
+"""
+Python 2 SDK for the KATANA(tm) Framework (http://katana.kusanagi.io)
+
+Copyright (c) 2016-2018 KUSANAGI S.L. All rights reserved.
+
+Distributed under the MIT license.
+
+For the full copyright and license information, please view the LICENSE
+file that was distributed with this source code.
+
+"""
+from __future__ import absolute_import
+
+import hashlib
+import httplib
+import os
+import socket
+import tempfile
+import threading
+
+from collections import OrderedDict
+from urlparse import urlparse
+
+__license__ = "MIT"
+__copyright__ = "Copyright (c) 2016-2018 KUSANAGI S.L. (http://kusanagi.io)"
+
+# Default timeout in seconds for file server requests
+DEFAULT_TIMEOUT = 2
+
+# Default number of idle connections to keep for each file server
+DEFAULT_POOL_SIZE = 10
+
+# Default size in bytes of the chunks read from streamed responses
+DEFAULT_CHUNK_SIZE = 65536
+
+# Default time in seconds to wait for another thread to fetch a file
+DEFAULT_FETCH_TIMEOUT = 30
+
+# Client shared by all the files
+CLIENT = None
+CLIENT_LOCK = threading.Lock()
+
+# Optional cache for the remote files
+CACHE = None
+
+
+class ConnectionPool(object):
+    """Pool of keep-alive connections to a file server."""
+
+    def __init__(self, netloc, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.__netloc = netloc
+        self.__size = size
+        self.__timeout = timeout
+        self.__idle = []
+        self.__lock = threading.Lock()
+
+    def connect(self):
+        """Create a new connection to the file server.
+
+        :rtype: `httplib.HTTPConnection`
+
+        """
+
+        return httplib.HTTPConnection(self.__netloc, timeout=self.__timeout)
+
+    def acquire(self):
+        """Get an idle connection, or create a new one.
+
+        :returns: The connection and a flag that is True when it was idle.
+        :rtype: tuple
+
+        """
+
+        with self.__lock:
+            if self.__idle:
+                return (self.__idle.pop(), True)
+
+        return (self.connect(), False)
+
+    def release(self, connection):
+        """Return a connection to the pool.
+
+        The connection is closed when the pool is full.
+
+        :param connection: A connection to the file server.
+        :type connection: `httplib.HTTPConnection`
+
+        """
+
+        with self.__lock:
+            if len(self.__idle) < self.__size:
+                self.__idle.append(connection)
+                return
+
+        connection.close()
+
+    def close(self):
+        """Close all the idle connections."""
+
+        with self.__lock:
+            idle = self.__idle
+            self.__idle = []
+
+        for connection in idle:
+            connection.close()
+
+
+class FileServerClient(object):
+    """HTTP client for file servers.
+
+    Connections are kept alive and reused for each file server, and
+    bulk operations are run in parallel using a pool of threads.
+
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE):
+        """Constructor.
+
+        :param timeout: Optional timeout in seconds for the requests.
+        :type timeout: float
+        :param pool_size: Optional number of connections to keep for each
+                          file server, and of threads for bulk operations.
+        :type pool_size: int
+
+        """
+
+        self.__timeout = timeout
+        self.__pool_size = pool_size
+        self.__pools = {}
+        self.__threads = None
+        self.__lock = threading.Lock()
+
+    def __get_pool(self, netloc):
+        pool = self.__pools.get(netloc)
+        if pool is None:
+            with self.__lock:
+                pool = self.__pools.get(netloc)
+                if pool is None:
+                    pool = ConnectionPool(
+                        netloc,
+                        size=self.__pool_size,
+                        timeout=self.__timeout,
+                        )
+                    self.__pools[netloc] = pool
+
+        return pool
+
+    def __get_threads(self):
+        if self.__threads is None:
+            with self.__lock:
+                if self.__threads is None:
+                    from multiprocessing.pool import ThreadPool
+
+                    self.__threads = ThreadPool(self.__pool_size)
+
+        return self.__threads
+
+    def get_timeout(self):
+        """Get the timeout for the requests.
+
+        :rtype: float
+
+        """
+
+        return self.__timeout
+
+    def get_pool_size(self):
+        """Get the number of connections to keep for each file server.
+
+        :rtype: int
+
+        """
+
+        return self.__pool_size
+
+    def __send(self, method, url, headers):
+        part = urlparse(url)
+        path = part.path or '/'
+        if part.query:
+            path = '{}?{}'.format(path, part.query)
+
+        pool = self.__get_pool(part.netloc)
+        connection, idle = pool.acquire()
+        try:
+            connection.request(method, path, headers=headers or {})
+            response = connection.getresponse()
+        except (httplib.HTTPException, socket.error):
+            connection.close()
+            if not idle:
+                raise
+
+            # The file server can close idle connections, so the
+            # request is retried once using a new connection.
+            connection = pool.connect()
+            try:
+                connection.request(method, path, headers=headers or {})
+                response = connection.getresponse()
+            except:
+                connection.close()
+                raise
+        except:
+            connection.close()
+            raise
+
+        return (pool, connection, response)
+
+    def __iter_body(self, pool, connection, response, size):
+        try:
+            while True:
+                chunk = response.read(size)
+                if not chunk:
+                    break
+
+                yield chunk
+        except:
+            # Connection can't be reused when the body is not read
+            # completely, or when the iteration is stopped.
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            pool.release(connection)
+
+    def request(self, method, url, headers=None):
+        """Make a request to a file server.
+
+        The response body is read completely, so the connection
+        can be reused by the following requests.
+
+        :param method: The HTTP method.
+        :type method: str
+        :param url: The URL of the file.
+        :type url: str
+        :param headers: Optional request headers.
+        :type headers: dict
+
+        :raises: `httplib.HTTPException`, `socket.error`
+
+        :returns: The response status, reason and body.
+        :rtype: tuple
+
+        """
+
+        pool, connection, response = self.__send(method, url, headers)
+        try:
+            body = response.read()
+        except:
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            pool.release(connection)
+
+        return (response.status, response.reason, body)
+
+    def stream(self, url, headers=None, size=DEFAULT_CHUNK_SIZE):
+        """Make a GET request to a file server and stream the body.
+
+        The connection is reused when all the chunks are read.
+
+        :param url: The URL of the file.
+        :type url: str
+        :param headers: Optional request headers.
+        :type headers: dict
+        :param size: Optional size in bytes for the body chunks.
+        :type size: int
+
+        :raises: `httplib.HTTPException`, `socket.error`
+
+        :returns: The response status, reason and a generator of chunks.
+        :rtype: tuple
+
+        """
+
+        pool, connection, response = self.__send('GET', url, headers)
+        chunks = self.__iter_body(pool, connection, response, size)
+        return (response.status, response.reason, chunks)
+
+    def head(self, url, headers=None):
+        """Make a HEAD request to a file server.
+
+        :param url: The URL of the file.
+        :type url: str
+        :param headers: Optional request headers.
+        :type headers: dict
+
+        :returns: The response status, reason and body.
+        :rtype: tuple
+
+        """
+
+        return self.request('HEAD', url, headers=headers)
+
+    def get(self, url, headers=None):
+        """Make a GET request to a file server.
+
+        :param url: The URL of the file.
+        :type url: str
+        :param headers: Optional request headers.
+        :type headers: dict
+
+        :returns: The response status, reason and body.
+        :rtype: tuple
+
+        """
+
+        return self.request('GET', url, headers=headers)
+
+    def map(self, callback, items):
+        """Call a function for each item in parallel.
+
+        :param callback: A function that receives an item as argument.
+        :type callback: callable
+        :param items: The items to process.
+        :type items: iterable
+
+        :returns: The results in the same order as the items.
+        :rtype: list
+
+        """
+
+        items = list(items)
+        if len(items) < 2:
+            return [callback(item) for item in items]
+
+        return self.__get_threads().map(callback, items)
+
+    def close(self):
+        """Close the idle connections and stop the threads."""
+
+        with self.__lock:
+            pools = self.__pools
+            threads = self.__threads
+            self.__pools = {}
+            self.__threads = None
+
+        for pool in pools.values():
+            pool.close()
+
+        if threads:
+            threads.close()
+            threads.join()
+
+
+def get_client():
+    """Get the file server client shared by all the files.
+
+    :rtype: `FileServerClient`
+
+    """
+
+    global CLIENT
+
+    if CLIENT is None:
+        with CLIENT_LOCK:
+            if CLIENT is None:
+                CLIENT = FileServerClient()
+
+    return CLIENT
+
+
+def set_client(client):
+    """Set the file server client shared by all the files.
+
+    It can be used to change the timeout or the number of connections.
+    The previous client is closed.
+
+    :param client: A file server client.
+    :type client: `FileServerClient`
+
+    """
+
+    global CLIENT
+
+    with CLIENT_LOCK:
+        previous = CLIENT
+        CLIENT = client
+
+    if previous and previous is not client:
+        previous.close()
+
+
+class FileCache(object):
+    """Local disk cache for remote files.
+
+    Files are saved in a directory using a hash of the file path and
+    token as name, and the least recently used files are removed when
+    the total size of the cached files exceeds the size limit.
+
+    When many threads fetch the same file at the same time only one
+    of them downloads it, while the others wait for the download.
+
+    """
+
+    def __init__(self, directory, max_size, timeout=DEFAULT_FETCH_TIMEOUT):
+        """Constructor.
+
+        Files that already exist in the directory are added to the
+        cache in order of modification time.
+
+        :param directory: Path to the cache directory.
+        :type directory: str
+        :param max_size: Maximum size in bytes for the cached files.
+        :type max_size: int
+        :param timeout: Optional seconds to wait for another thread
+                        that is fetching the same file.
+        :type timeout: float
+
+        """
+
+        self.__directory = directory
+        self.__max_size = max_size
+        self.__timeout = timeout
+        self.__size = 0
+        self.__entries = OrderedDict()
+        self.__fetching = {}
+        self.__lock = threading.Lock()
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        entries = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.startswith('.') or not os.path.isfile(path):
+                continue
+
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, name, stat.st_size))
+
+        for _, name, size in sorted(entries):
+            self.__entries[name] = size
+            self.__size += size
+
+        with self.__lock:
+            self.__evict()
+
+    def __evict(self):
+        # Remove the least recently used files until the cache fits
+        while self.__size > self.__max_size and self.__entries:
+            key, size = self.__entries.popitem(last=False)
+            self.__size -= size
+            try:
+                os.remove(self.get_path(key))
+            except OSError:
+                pass
+
+    def __create_temp_file(self):
+        # Files are written to a temporary file that is renamed when
+        # it is complete, to avoid reading incomplete files.
+        fd, temp_path = tempfile.mkstemp(prefix='.', dir=self.__directory)
+        return (os.fdopen(fd, 'wb'), temp_path)
+
+    def __add(self, key, temp_path, size):
+        try:
+            os.rename(temp_path, self.get_path(key))
+        except OSError:
+            self.__remove_temp_file(temp_path)
+            return False
+
+        with self.__lock:
+            self.__size -= self.__entries.pop(key, 0)
+            self.__entries[key] = size
+            self.__size += size
+            self.__evict()
+
+        return True
+
+    def __remove_temp_file(self, temp_path):
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+    def __start_fetch(self, key):
+        # Get the event to wait for the thread that fetches the file.
+        # The event is created when the current thread must fetch it.
+        with self.__lock:
+            event = self.__fetching.get(key)
+            loading = event is None
+            if loading:
+                event = self.__fetching[key] = threading.Event()
+
+        return (loading, event)
+
+    def __finish_fetch(self, key, event):
+        with self.__lock:
+            del self.__fetching[key]
+
+        event.set()
+
+    def get_directory(self):
+        """Get the path to the cache directory.
+
+        :rtype: str
+
+        """
+
+        return self.__directory
+
+    def get_max_size(self):
+        """Get the maximum size in bytes for the cached files.
+
+        :rtype: int
+
+        """
+
+        return self.__max_size
+
+    def get_size(self):
+        """Get the total size in bytes of the cached files.
+
+        :rtype: int
+
+        """
+
+        return self.__size
+
+    def get_key(self, url, token=''):
+        """Get the cache key for a remote file.
+
+        :param url: The URL of the file.
+        :type url: str
+        :param token: Optional file server token.
+        :type token: str
+
+        :rtype: str
+
+        """
+
+        # Paths are unicode when they are unpacked from a payload
+        values = []
+        for value in (url, token or b''):
+            if isinstance(value, unicode):
+                value = value.encode('utf8')
+
+            values.append(value)
+
+        return hashlib.sha1(b'\x00'.join(values)).hexdigest()
+
+    def get_path(self, key):
+        """Get the path to the file for a cache key.
+
+        :param key: A cache key.
+        :type key: str
+
+        :rtype: str
+
+        """
+
+        return os.path.join(self.__directory, key)
+
+    def has(self, key):
+        """Check if a file is cached.
+
+        :param key: A cache key.
+        :type key: str
+
+        :rtype: bool
+
+        """
+
+        return os.path.isfile(self.get_path(key))
+
+    def open(self, key):
+        """Open a cached file for reading.
+
+        The file is marked as the most recently used file.
+
+        :param key: A cache key.
+        :type key: str
+
+        :returns: The open file, or None when the file is not cached.
+        :rtype: file
+
+        """
+
+        try:
+            file = open(self.get_path(key), 'rb')
+        except IOError:
+            with self.__lock:
+                if key in self.__entries:
+                    self.__size -= self.__entries.pop(key)
+
+            return
+
+        with self.__lock:
+            # Mark the file as the most recently used
+            size = self.__entries.pop(key, None)
+            if size is None:
+                # File was added to the directory by another process
+                size = os.fstat(file.fileno()).st_size
+                self.__size += size
+
+            self.__entries[key] = size
+
+        return file
+
+    def get(self, key):
+        """Get the data of a cached file.
+
+        :param key: A cache key.
+        :type key: str
+
+        :returns: The file data, or None when the file is not cached.
+        :rtype: bytes
+
+        """
+
+        file = self.open(key)
+        if file is None:
+            return
+
+        with file:
+            return file.read()
+
+    def put(self, key, data):
+        """Add a file to the cache.
+
+        Files that are bigger than the cache size limit, or that
+        can't be written to the cache directory, are not added.
+
+        :param key: A cache key.
+        :type key: str
+        :param data: The file data.
+        :type data: bytes
+
+        :returns: True when the file is added.
+        :rtype: bool
+
+        """
+
+        size = len(data)
+        if size > self.__max_size:
+            return False
+
+        try:
+            file, temp_path = self.__create_temp_file()
+        except (IOError, OSError):
+            return False
+
+        try:
+            with file:
+                file.write(data)
+        except (IOError, OSError):
+            self.__remove_temp_file(temp_path)
+            return False
+
+        return self.__add(key, temp_path, size)
+
+    def fetch(self, key, loader):
+        """Get the data of a file, loading it when it is not cached.
+
+        Only one thread loads the file when many threads fetch it at
+        the same time. The loader must return None when it fails, in
+        which case each of the waiting threads calls the loader. The
+        waiting threads also call the loader when the load takes more
+        than the fetch timeout.
+
+        :param key: A cache key.
+        :type key: str
+        :param loader: A function to load the file data.
+        :type loader: callable
+
+        :returns: The file data, or None when it can't be loaded.
+        :rtype: bytes
+
+        """
+
+        data = self.get(key)
+        if data is not None:
+            return data
+
+        loading, event = self.__start_fetch(key)
+        if not loading:
+            event.wait(self.__timeout)
+            data = self.get(key)
+            return data if data is not None else loader()
+
+        try:
+            data = loader()
+            if data is not None:
+                self.put(key, data)
+
+            return data
+        finally:
+            self.__finish_fetch(key, event)
+
+    def stream(self, key, loader, size=DEFAULT_CHUNK_SIZE):
+        """Iterate the data of a file, loading it when it is not cached.
+
+        The loaded chunks are written to the cache while they are
+        iterated, and the file is only added to the cache when all the
+        chunks are read. Files are loaded by one thread at a time, like
+        when they are fetched.
+
+        :param key: A cache key.
+        :type key: str
+        :param loader: A function that returns an iterator of chunks,
+                       or None when it fails.
+        :type loader: callable
+        :param size: Optional size in bytes for the cached file chunks.
+        :type size: int
+
+        :returns: A generator of bytes.
+        :rtype: generator
+
+        """
+
+        file = self.open(key)
+        if file is None:
+            loading, event = self.__start_fetch(key)
+            if not loading:
+                event.wait(self.__timeout)
+                file = self.open(key)
+                if file is None:
+                    # Load the file without caching it
+                    for chunk in loader() or ():
+                        yield chunk
+
+                    return
+
+        if file is not None:
+            with file:
+                while True:
+                    chunk = file.read(size)
+                    if not chunk:
+                        break
+
+                    yield chunk
+
+            return
+
+        chunks = None
+        try:
+            chunks = self.__write_chunks(key, loader())
+            for chunk in chunks:
+                yield chunk
+        finally:
+            if chunks is not None:
+                chunks.close()
+
+            self.__finish_fetch(key, event)
+
+    def __write_chunks(self, key, chunks):
+        if chunks is None:
+            return
+
+        try:
+            file, temp_path = self.__create_temp_file()
+        except (IOError, OSError):
+            file = None
+
+        written = 0
+        complete = False
+        try:
+            for chunk in chunks:
+                if file:
+                    written += len(chunk)
+                    try:
+                        if written > self.__max_size:
+                            # Files bigger than the cache are not added
+                            raise IOError('File is too big for the cache')
+
+                        file.write(chunk)
+                    except (IOError, OSError):
+                        file.close()
+                        file = None
+                        self.__remove_temp_file(temp_path)
+
+                yield chunk
+
+            complete = True
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+            if file:
+                file.close()
+                if complete:
+                    self.__add(key, temp_path, written)
+                else:
+                    self.__remove_temp_file(temp_path)
+
+
+def get_cache():
+    """Get the cache for remote files.
+
+    :returns: The file cache, or None when cache is disabled.
+    :rtype: `FileCache`
+
+    """
+
+    return CACHE
+
+
+def set_cache(cache):
+    """Set the cache for remote files.
+
+    Cache is disabled by default.
+
+    :param cache: A file cache, or None to disable the cache.
+    :type cache: `FileCache`
+
+    """
+
+    global CACHE
+
+    CACHE = cache
@@ -30,18 +30,55 @@ class HttpRequest(object):
         self.__method = method.upper()
         self.__url = url
         self.__protocol_version = kwargs.get('protocol_version') or '1.1'
-        self.__query = kwargs.get('query') or MultiDict()
-        self.__post_data = kwargs.get('post_data') or MultiDict()
         self.__body = kwargs.get('body') or ''
-        self.__files = kwargs.get('files') or MultiDict()
-        # Save headers names in upper case
-        self.__headers = MultiDict({
-            name.upper(): value
-            for name, value in (kwargs.get('headers') or {}).items()
-            })
+        # Query, post data, files and headers are saved as they are given
+        # and they are converted to `MultiDict` the first time they are used.
+        self.__query = kwargs.get('query')
+        self.__post_data = kwargs.get('post_data')
+        self.__files = kwargs.get('files')
+        self.__raw_headers = kwargs.get('headers')
+        self.__headers = None
+        # URL is parsed the first time is used
+        self.__parsed_url = None
+
+    def __get_query(self):
+        if not isinstance(self.__query, MultiDict):
+            self.__query = MultiDict(self.__query or {})
 
-        # Save parsed URL
-        self.__parsed_url = urlparse(self.get_url())
+        return self.__query
+
+    def __get_post_data(self):
+        if not isinstance(self.__post_data, MultiDict):
+            self.__post_data = MultiDict(self.__post_data or {})
+
+        return self.__post_data
+
+    def __get_files(self):
+        if not isinstance(self.__files, MultiDict):
+            self.__files = MultiDict(self.__files or {})
+
+        return self.__files
+
+    def __get_headers(self):
+        if self.__headers is None:
+            # Index headers by upper case name to make them case insensitive
+            headers = MultiDict()
+            for name, values in (self.__raw_headers or {}).items():
+                if not isinstance(values, list):
+                    values = [values]
+
+                headers.setdefault(name.upper(), []).extend(values)
+
+            self.__headers = headers
+            self.__raw_headers = None
+
+        return self.__headers
+
+    def __get_parsed_url(self):
+        if self.__parsed_url is None:
+            self.__parsed_url = urlparse(self.__url)
+
+        return self.__parsed_url
 
     def is_method(self, method):
         """Determine if the request used the given HTTP method.
@@ -86,7 +123,7 @@ class HttpRequest(object):
 
         """
 
-        return self.__parsed_url.scheme
+        return self.__get_parsed_url().scheme
 
     def get_url_host(self):
         """Get request URL host.
@@ -97,7 +134,7 @@ class HttpRequest(object):
 
         """
 
-        return self.__parsed_url.netloc
+        return self.__get_parsed_url().netloc
 
     def get_url_path(self):
         """Get request URL path.
@@ -106,7 +143,7 @@ class HttpRequest(object):
 
         """
 
-        return self.__parsed_url.path.rstrip('/')
+        return self.__get_parsed_url().path.rstrip('/')
 
     def has_query_param(self, name):
         """Determines if the param is defined.
@@ -121,7 +158,7 @@ class HttpRequest(object):
 
         """
 
-        return name in self.__query
+        return name in self.__get_query()
 
     def get_query_param(self, name, default=''):
         """Gets a param from the HTTP query string.
@@ -139,7 +176,7 @@ class HttpRequest(object):
 
         """
 
-        return self.__query.get(name, (default, ))[0]
+        return self.__get_query().get(name, (default, ))[0]
 
     def get_query_param_array(self, name, default=None):
         """Gets a param from the HTTP query string.
@@ -163,7 +200,7 @@ class HttpRequest(object):
         elif not isinstance(default, list):
             raise ValueError('Default value is not a list')
 
-        return self.__query.get(name, default)
+        return self.__get_query().get(name, default)
 
     def get_query_params(self):
         """Get all HTTP query params.
@@ -173,7 +210,7 @@ class HttpRequest(object):
 
         """
 
-        return {key: value[0] for key, value in self.__query.items()}
+        return {key: value[0] for key, value in self.__get_query().items()}
 
     def get_query_params_array(self):
         """Get all HTTP query params.
@@ -185,7 +222,7 @@ class HttpRequest(object):
 
         """
 
-        return self.__query
+        return self.__get_query()
 
     def has_post_param(self, name):
         """Determines if the param is defined.
@@ -200,7 +237,7 @@ class HttpRequest(object):
 
         """
 
-        return name in self.__post_data
+        return name in self.__get_post_data()
 
     def get_post_param(self, name, default=''):
         """Gets a param from the HTTP post data.
@@ -219,7 +256,7 @@ class HttpRequest(object):
 
         """
 
-        return self.__post_data.get(name, (default, ))[0]
+        return self.__get_post_data().get(name, (default, ))[0]
 
     def get_post_param_array(self, name, default=None):
         """Gets a param from the HTTP post data.
@@ -243,7 +280,7 @@ class HttpRequest(object):
         elif not isinstance(default, list):
             raise ValueError('Default value is not a list')
 
-        return self.__post_data.get(name, default)
+        return self.__get_post_data().get(name, default)
 
     def get_post_params(self):
         """Get all HTTP post params.
@@ -253,7 +290,7 @@ class HttpRequest(object):
 
         """
 
-        return {key: value[0] for key, value in self.__post_data.items()}
+        return {key: value[0] for key, value in self.__get_post_data().items()}
 
     def get_post_params_array(self):
         """Get all HTTP post params.
@@ -265,7 +302,7 @@ class HttpRequest(object):
 
         """
 
-        return self.__post_data
+        return self.__get_post_data()
 
     def is_protocol_version(self, version):
         """Determine if the request used the given HTTP version.
@@ -308,7 +345,7 @@ class HttpRequest(object):
 
         """
 
-        return name.upper() in self.__headers
+        return name.upper() in self.__get_headers()
 
     def get_header(self, name, default=''):
         """Get an HTTP header.
@@ -332,7 +369,7 @@ class HttpRequest(object):
         if not self.has_header(name):
             return default
 
-        return self.__headers.get(name)[0]
+        return self.__get_headers().get(name)[0]
 
     def get_header_array(self, name, default=None):
         """Gets an HTTP header.
@@ -356,7 +393,7 @@ class HttpRequest(object):
         elif not isinstance(default, list):
             raise ValueError('Default value is not a list')
 
-        return self.__headers.get(name.upper(), default)
+        return self.__get_headers().get(name.upper(), default)
 
     def get_headers(self):
         """Get all HTTP headers.
@@ -366,7 +403,7 @@ class HttpRequest(object):
 
         """
 
-        return {key: value[0] for key, value in self.__headers.items()}
+        return {key: value[0] for key, value in self.__get_headers().items()}
 
     def get_headers_array(self):
         """Get all HTTP headers.
@@ -376,7 +413,7 @@ class HttpRequest(object):
 
         """
 
-        return self.__headers
+        return self.__get_headers()
 
     def has_body(self):
         """Determines if the HTTP request body has content.
@@ -412,7 +449,7 @@ class HttpRequest(object):
 
         """
 
-        return name in self.__files
+        return name in self.__get_files()
 
     def get_file(self, name):
         """Get an uploaded file.
@@ -427,9 +464,9 @@ class HttpRequest(object):
 
         """
 
-        if name in self.__files:
+        if name in self.__get_files():
             # Get only the first file
-            return self.__files.getone(name)
+            return self.__get_files().getone(name)
         else:
             return File(name, path='')
 
@@ -445,4 +482,4 @@ class HttpRequest(object):
 
         # Fields might have more than one file uploaded for the same name,
         # there for it can happen that file names are duplicated.
-        return chain.from_iterable(self.__files.values())
+        return chain.from_iterable(self.__get_files().values())
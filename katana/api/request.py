@@ -22,6 +22,7 @@ from .param import Param
 from .param import param_to_payload
 from .param import payload_to_param
 from .response import Response
+from .router import get_router
 from .transport import Transport
 
 __license__ = "MIT"
@@ -222,6 +223,37 @@ class Request(Api):
 
         return self.__http_request
 
+    def get_router(self):
+        """Get the HTTP router for the accessible Service actions.
+
+        The router is created from the Service schemas, and it is only
+        created again when the schemas change.
+
+        :rtype: `Router`
+
+        """
+
+        return get_router(self._registry)
+
+    def get_route(self):
+        """Get the route that matches the current HTTP request.
+
+        The route contains the Service name, version and action name
+        for the HTTP method and URL path, and the path parameter values.
+
+        :returns: The matched route or None.
+        :rtype: `Route`
+
+        """
+
+        if not self.__http_request:
+            return
+
+        return self.get_router().match(
+            self.__http_request.get_method(),
+            self.__http_request.get_url_path(),
+            )
+
     def new_param(self, name, value=None, type=None):
         """Creates a new parameter object.
 
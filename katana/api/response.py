@@ -17,6 +17,7 @@ from ..logging import RequestLogger
 from .base import Api
 from .http.request import HttpRequest
 from .http.response import HttpResponse
+from .transport import Transport
 
 __license__ = "MIT"
 __copyright__ = "Copyright (c) 2016-2018 KUSANAGI S.L. (http://kusanagi.io)"
@@ -46,18 +47,14 @@ class Response(Api):
         self.__gateway_protocol = kwargs.get('gateway_protocol')
         self.__gateway_addresses = kwargs.get('gateway_addresses')
 
-        http_request = kwargs.get('http_request')
-        if http_request:
-            self.__http_request = HttpRequest(**http_request)
-        else:
-            self.__http_request = None
-
-        http_response = kwargs.get('http_response')
-        if http_response:
-            self.__http_response = HttpResponse(**http_response)
-        else:
-            self.__http_response = None
+        # HTTP request and response are created the first time they are used
+        self.__http_request = None
+        self.__http_request_values = kwargs.get('http_request')
+        self.__http_response = None
+        self.__http_response_values = kwargs.get('http_response')
 
+        # Transport can be given as a payload, in which case
+        # the `Transport` is created the first time it is used.
         self.__transport = transport
         self.__return_value = kwargs.get('return_value', NO_RETURN_VALUE)
 
@@ -86,6 +83,10 @@ class Response(Api):
 
         """
 
+        if self.__http_request_values:
+            self.__http_request = HttpRequest(**self.__http_request_values)
+            self.__http_request_values = None
+
         return self.__http_request
 
     def get_http_response(self):
@@ -95,6 +96,10 @@ class Response(Api):
 
         """
 
+        if self.__http_response_values:
+            self.__http_response = HttpResponse(**self.__http_response_values)
+            self.__http_response_values = None
+
         return self.__http_response
 
     def has_return(self):
@@ -138,6 +143,9 @@ class Response(Api):
 
         """
 
+        if not isinstance(self.__transport, Transport):
+            self.__transport = Transport(self.__transport or {})
+
         return self.__transport
 
     def get_request_attribute(self, name, default=''):
@@ -0,0 +1,348 @@
+"""
+Python 2 SDK for the KATANA(tm) Framework (http://katana.kusanagi.io)
+
+Copyright (c) 2016-2018 KUSANAGI S.L. All rights reserved.
+
+Distributed under the MIT license.
+
+For the full copyright and license information, please view the LICENSE
+file that was distributed with this source code.
+
+"""
+from __future__ import absolute_import
+
+import re
+import threading
+
+from .schema.service import ServiceSchema
+
+__license__ = "MIT"
+__copyright__ = "Copyright (c) 2016-2018 KUSANAGI S.L. (http://kusanagi.io)"
+
+# Regexp to find parameter names in path segments, like "{id}"
+PATH_PARAM_RE = re.compile(r'\{([^{}]+)\}')
+
+# Registry revision and router built for that revision
+CACHED_ROUTER = (None, None)
+CACHED_ROUTER_LOCK = threading.Lock()
+
+
+def split_path(path):
+    """Split a URL path into segments.
+
+    Empty segments are ignored, so "/users/" and "users" both
+    result in a single "users" segment.
+
+    :param path: A URL path.
+    :type path: str
+
+    :rtype: list
+
+    """
+
+    return [segment for segment in path.split('/') if segment]
+
+
+class Route(object):
+    """Route that matched an HTTP method and URL path."""
+
+    def __init__(self, service, version, action, method, path, params=None):
+        self.__service = service
+        self.__version = version
+        self.__action = action
+        self.__method = method
+        self.__path = path
+        self.__params = params or {}
+
+    def get_service_name(self):
+        """Get the name of the Service.
+
+        :rtype: str
+
+        """
+
+        return self.__service
+
+    def get_service_version(self):
+        """Get the version of the Service.
+
+        :rtype: str
+
+        """
+
+        return self.__version
+
+    def get_action_name(self):
+        """Get the name of the action.
+
+        :rtype: str
+
+        """
+
+        return self.__action
+
+    def get_method(self):
+        """Get the HTTP method of the route in upper case.
+
+        :rtype: str
+
+        """
+
+        return self.__method
+
+    def get_path(self):
+        """Get the URL path of the route, including parameters.
+
+        :rtype: str
+
+        """
+
+        return self.__path
+
+    def get_params(self):
+        """Get the values of the path parameters.
+
+        :rtype: dict
+
+        """
+
+        return self.__params
+
+
+class RouteNode(object):
+    """Node of the router prefix tree.
+
+    Each node represents a URL path segment.
+
+    """
+
+    def __init__(self):
+        # Child nodes for static segments by segment value
+        self.static = {}
+        # Child node for segments that are a single parameter
+        self.param = None
+        # Child nodes for segments that mix parameters with text,
+        # saved as a list of regexp and node.
+        self.patterns = []
+        # Routes for the path that ends in this node by HTTP method
+        self.routes = {}
+
+    def add_child(self, segment):
+        """Get the child node for a path segment.
+
+        The child node is created when it doesn't exist.
+
+        :param segment: Path segment with optional parameters.
+        :type segment: str
+
+        :returns: The child node and the parameter names in the segment.
+        :rtype: tuple
+
+        """
+
+        names = PATH_PARAM_RE.findall(segment)
+        if not names:
+            if segment not in self.static:
+                self.static[segment] = RouteNode()
+
+            return (self.static[segment], names)
+
+        if segment == '{{{}}}'.format(names[0]):
+            if not self.param:
+                self.param = RouteNode()
+
+            return (self.param, names)
+
+        # Segment contains text and parameters, like "{name}.{ext}"
+        regexp = '^{}$'.format(''.join(
+            '(.+?)' if index % 2 else re.escape(part)
+            for index, part in enumerate(PATH_PARAM_RE.split(segment))
+            ))
+        for pattern, node in self.patterns:
+            if pattern.pattern == regexp:
+                return (node, names)
+
+        node = RouteNode()
+        self.patterns.append((re.compile(regexp), node))
+        return (node, names)
+
+    def match(self, segments, index, method):
+        """Get the route for the path segments starting at an index.
+
+        :param segments: The URL path segments.
+        :type segments: list
+        :param index: Index of the segment for current node.
+        :type index: int
+        :param method: The HTTP method in upper case.
+        :type method: str
+
+        :returns: The route and the parameter values, or None.
+        :rtype: tuple
+
+        """
+
+        if index == len(segments):
+            route = self.routes.get(method)
+            return (route, []) if route else None
+
+        segment = segments[index]
+
+        # Static segments have priority over parameters
+        child = self.static.get(segment)
+        if child:
+            result = child.match(segments, index + 1, method)
+            if result:
+                return result
+
+        for pattern, child in self.patterns:
+            match = pattern.match(segment)
+            if match:
+                result = child.match(segments, index + 1, method)
+                if result:
+                    result[1][0:0] = match.groups()
+                    return result
+
+        if self.param:
+            result = self.param.match(segments, index + 1, method)
+            if result:
+                result[1].insert(0, segment)
+                return result
+
+
+class Router(object):
+    """HTTP router for Service actions.
+
+    Routes are saved in a prefix tree where each node is a segment
+    of a URL path, so matching a path doesn't depend on the number
+    of routes in the router.
+
+    """
+
+    def __init__(self):
+        self.__root = RouteNode()
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
+
+    @classmethod
+    def from_registry(cls, registry):
+        """Create a router for the accessible actions in a schema registry.
+
+        Services and actions that are not accessible from the Gateway
+        are not added to the router.
+
+        :param registry: A schema registry.
+        :type registry: SchemaRegistry
+
+        :rtype: Router
+
+        """
+
+        router = cls()
+        for name in registry.get_service_names():
+            versions = registry.get(name, {}, delimiter=' ')
+            for version, payload in versions.items():
+                schema = ServiceSchema(name, version, payload)
+                http_schema = schema.get_http_schema()
+                if not http_schema.is_accessible():
+                    continue
+
+                base_path = http_schema.get_base_path()
+                for action in schema.get_actions():
+                    action_schema = schema.get_action_schema(action)
+                    http_action = action_schema.get_http_schema()
+                    if not http_action.is_accessible():
+                        continue
+
+                    router.add_route(
+                        http_action.get_method(),
+                        base_path + http_action.get_path(),
+                        name,
+                        version,
+                        action,
+                        )
+
+        return router
+
+    def add_route(self, method, path, service, version, action):
+        """Add a route for a Service action.
+
+        When a route already exists for the same HTTP method and
+        path the first route is kept.
+
+        :param method: The HTTP method.
+        :type method: str
+        :param path: The URL path with optional parameters, like "/{id}".
+        :type path: str
+        :param service: The Service name.
+        :type service: str
+        :param version: The Service version.
+        :type version: str
+        :param action: The action name.
+        :type action: str
+
+        :rtype: Router
+
+        """
+
+        node = self.__root
+        param_names = []
+        for segment in split_path(path):
+            node, names = node.add_child(segment)
+            param_names.extend(names)
+
+        method = method.upper()
+        if method not in node.routes:
+            node.routes[method] = (service, version, action, path, param_names)
+            self.__count += 1
+
+        return self
+
+    def match(self, method, path):
+        """Get the route that matches an HTTP method and URL path.
+
+        :param method: The HTTP method.
+        :type method: str
+        :param path: The URL path.
+        :type path: str
+
+        :returns: The matched route or None.
+        :rtype: Route
+
+        """
+
+        method = method.upper()
+        result = self.__root.match(split_path(path), 0, method)
+        if not result:
+            return
+
+        (service, version, action, route_path, names), values = result
+        params = dict(zip(names, values))
+        return Route(service, version, action, method, route_path, params)
+
+
+def get_router(registry):
+    """Get the router for a schema registry.
+
+    The router is only created again when the registry changes.
+
+    :param registry: A schema registry.
+    :type registry: SchemaRegistry
+
+    :rtype: Router
+
+    """
+
+    global CACHED_ROUTER
+
+    revision = registry.revision
+    cached_revision, router = CACHED_ROUTER
+    if cached_revision != revision:
+        with CACHED_ROUTER_LOCK:
+            cached_revision, router = CACHED_ROUTER
+            if cached_revision != revision:
+                router = Router.from_registry(registry)
+                CACHED_ROUTER = (revision, router)
+
+    return router
@@ -19,6 +19,8 @@ from .data import ServiceData
 from .error import Error
 from .link import Link
 from .relation import Relation
+from .renderer import JsonRenderer
+from .resolver import RelationResolver
 from .transaction import Transaction
 
 __license__ = "MIT"
@@ -27,6 +29,27 @@ __copyright__ = "Copyright (c) 2016-2018 KUSANAGI S.L. (http://kusanagi.io)"
 EMPTY = object()
 
 
+def filter_items(data, key=None):
+    """Get the items of a dictionary, optionally only for a single key.
+
+    :param data: A dictionary.
+    :type data: dict
+    :param key: Optional key to filter the items.
+    :type key: str
+
+    :returns: A list of key and value tuples.
+    :rtype: list
+
+    """
+
+    if key is None:
+        return data.items()
+    elif key in data:
+        return [(key, data[key])]
+
+    return []
+
+
 class TransactionTypeError(ApiError):
     """Error raised for invalid transaction types."""
 
@@ -46,6 +69,7 @@ class Transport(object):
 
     def __init__(self, payload):
         self.__transport = Payload(payload)
+        self.__resolvers = {}
 
     def get_request_id(self):
         """
@@ -155,17 +179,32 @@ class Transport(object):
 
         """
 
-        data = []
-        transport_data = self.__transport.get('data', {})
-        if not transport_data:
-            return data
+        return list(self.iter_data())
+
+    def iter_data(self, address=None, service=None, version=None):
+        """
+        Iterate the Transport data.
+
+        The data can be filtered by Gateway address, Service name
+        and version, in which case only the matching data is read.
 
-        for address, services in transport_data.items():
-            for svc, versions in services.items():
-                for ver, actions in versions.items():
-                    data.append(ServiceData(address, svc, ver, actions))
+        :param address: Optional Gateway address of the Service.
+        :type address: str
+        :param service: Optional name of the Service.
+        :type service: str
+        :param version: Optional version of the Service.
+        :type version: str
 
-        return data
+        :returns: A generator of `SeviceData`.
+        :rtype: generator
+
+        """
+
+        data = self.__transport.get('data', None) or {}
+        for addr, services in filter_items(data, address):
+            for svc, versions in filter_items(services, service):
+                for ver, actions in filter_items(versions, version):
+                    yield ServiceData(addr, svc, ver, actions)
 
     def get_relations(self):
         """
@@ -179,19 +218,54 @@ class Transport(object):
 
         """
 
-        relations = []
-        data = self.__transport.get('relations', {})
-        if not data:
-            return relations
+        return list(self.iter_relations())
+
+    def iter_relations(self, address=None, service=None):
+        """
+        Iterate the Service relations.
+
+        The relations can be filtered by Gateway address and Service name.
+
+        :param address: Optional Gateway address of the Service.
+        :type address: str
+        :param service: Optional name of the Service.
+        :type service: str
 
-        for address, services in data.items():
-            for name, pks in services.items():
+        :returns: A generator of `Relation`.
+        :rtype: generator
+
+        """
+
+        data = self.__transport.get('relations', None) or {}
+        for addr, services in filter_items(data, address):
+            for name, pks in filter_items(services, service):
                 for pk, foreign_services in pks.items():
-                    relations.append(
-                        Relation(address, name, pk, foreign_services)
-                        )
+                    yield Relation(addr, name, pk, foreign_services)
+
+    def get_relation_resolver(self, primary_key='id'):
+        """
+        Get a resolver for the relations between the Transport entities.
 
-        return relations
+        The resolver indexes the entities in the Transport data by
+        primary key, so the related entities, including the ones from
+        remote Gateways, can be resolved for each entity.
+
+        The same resolver is returned for each primary key name.
+
+        :param primary_key: Optional field name for the entity primary keys.
+        :type primary_key: str
+
+        :rtype: `RelationResolver`
+
+        """
+
+        if primary_key not in self.__resolvers:
+            self.__resolvers[primary_key] = RelationResolver(
+                self.__transport,
+                primary_key=primary_key,
+                )
+
+        return self.__resolvers[primary_key]
 
     def get_links(self):
         """
@@ -205,17 +279,61 @@ class Transport(object):
 
         """
 
-        links = []
-        data = self.__transport.get('links', {})
-        if not data:
-            return links
+        return list(self.iter_links())
+
+    def iter_links(self, address=None, service=None):
+        """
+        Iterate the Service links.
+
+        The links can be filtered by Gateway address and Service name.
+
+        :param address: Optional Gateway address of the Service.
+        :type address: str
+        :param service: Optional name of the Service.
+        :type service: str
 
-        for address, services in data.items():
-            for name, references in services.items():
+        :returns: A generator of `Link`.
+        :rtype: generator
+
+        """
+
+        data = self.__transport.get('links', None) or {}
+        for addr, services in filter_items(data, address):
+            for name, references in filter_items(services, service):
                 for ref, uri in references.items():
-                    links.append(Link(address, name, ref, uri))
+                    yield Link(addr, name, ref, uri)
+
+    def render_json(self, embed=False, primary_key='id', embed_field=None):
+        """
+        Render the Transport data, relations and links as JSON.
+
+        The result can be used as body for the HTTP response.
 
-        return links
+        When relations are embedded the related entities are added to
+        each entity in a field named "_embedded" by default, and the
+        relations are not rendered. An error is raised when an entity
+        with related entities already has a field with that name.
+
+        :param embed: Optional flag to embed related entities.
+        :type embed: bool
+        :param primary_key: Optional field name for the entity primary keys.
+        :type primary_key: str
+        :param embed_field: Optional field name for the embedded entities.
+        :type embed_field: str
+
+        :raises: ApiError
+
+        :rtype: str
+
+        """
+
+        renderer = JsonRenderer(
+            self.__transport,
+            embed=embed,
+            embed_field=embed_field,
+            resolver=self.get_relation_resolver(primary_key),
+            )
+        return renderer.render()
 
     def get_calls(self):
         """
@@ -229,18 +347,31 @@ class Transport(object):
 
         """
 
-        calls = []
-        data = self.__transport.get('calls', {})
-        if not data:
-            return calls
+        return list(self.iter_calls())
+
+    def iter_calls(self, service=None, version=None):
+        """
+        Iterate the Service calls.
+
+        The calls can be filtered by the name and version
+        of the Service that made the calls.
+
+        :param service: Optional name of the Service.
+        :type service: str
+        :param version: Optional version of the Service.
+        :type version: str
 
-        for service, versions in data.items():
-            for version, service_calls in versions.items():
+        :returns: A generator of `Caller`.
+        :rtype: generator
+
+        """
+
+        data = self.__transport.get('calls', None) or {}
+        for name, versions in filter_items(data, service):
+            for ver, service_calls in filter_items(versions, version):
                 for call_data in service_calls:
                     action = get_path(call_data, 'caller', '')
-                    calls.append(Caller(service, version, action, call_data))
-
-        return calls
+                    yield Caller(name, ver, action, call_data)
 
     def get_transactions(self, type):
         """
@@ -260,14 +391,27 @@ class Transport(object):
 
         """
 
+        return list(self.iter_transactions(type))
+
+    def iter_transactions(self, type):
+        """
+        Iterate the transactions.
+
+        The transaction type is validated when this method is called,
+        and not when the transactions are iterated.
+
+        :raises: TransactionTypeError
+
+        :returns: A generator of `Transaction`.
+        :rtype: generator
+
+        """
+
         if type not in ('commit', 'rollback', 'complete'):
             raise TransactionTypeError(type)
 
-        data = self.__transport.get('transactions/{}'.format(type), [])
-        if not data:
-            return []
-
-        return [Transaction(type, tr_data) for tr_data in data]
+        data = self.__transport.get('transactions/{}'.format(type), None)
+        return (Transaction(type, tr_data) for tr_data in data or [])
 
     def get_errors(self):
         """
@@ -281,15 +425,63 @@ class Transport(object):
 
         """
 
-        errors = []
-        data = self.__transport.get('errors', {})
-        if not data:
-            return errors
+        return list(self.iter_errors())
+
+    def iter_errors(self, address=None, service=None, version=None):
+        """
+        Iterate the Transport errors.
+
+        The errors can be filtered by Gateway address, Service name
+        and version, in which case only the matching errors are read.
+
+        :param address: Optional Gateway address of the Service.
+        :type address: str
+        :param service: Optional name of the Service.
+        :type service: str
+        :param version: Optional version of the Service.
+        :type version: str
+
+        :returns: A generator of `Error`.
+        :rtype: generator
+
+        """
+
+        data = self.__transport.get('errors', None) or {}
+        for addr, services in filter_items(data, address):
+            for name, versions in filter_items(services, service):
+                for ver, error_data in filter_items(versions, version):
+                    for payload in error_data:
+                        yield Error(addr, name, ver, payload)
+
+    def get_errors_for(self, service, version=None, address=None):
+        """
+        Get the Transport errors of a Service.
+
+        :param service: The name of the Service.
+        :type service: str
+        :param version: Optional version of the Service.
+        :type version: str
+        :param address: Optional Gateway address of the Service.
+        :type address: str
+
+        :returns: A list of `Error`.
+        :rtype: list
+
+        """
+
+        return list(self.iter_errors(address, service, version))
+
+    def has_errors(self):
+        """
+        Check if the Transport contains errors.
+
+        The check stops at the first error that is found.
+
+        :rtype: bool
+
+        """
 
-        for address, services in data.items():
-            for name, versions in services.items():
-                for version, error_data in versions.items():
-                    for data in error_data:
-                        errors.append(Error(address, name, version, data))
+        for _ in self.iter_errors():
+            return True
 
-        return errors
+        return False
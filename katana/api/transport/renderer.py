@@ -0,0 +1,184 @@
+"""
+Python 2 SDK for the KATANA(tm) Framework (http://katana.kusanagi.io)
+
+Copyright (c) 2016-2018 KUSANAGI S.L. All rights reserved.
+
+Distributed under the MIT license.
+
+For the full copyright and license information, please view the LICENSE
+file that was distributed with this source code.
+
+"""
+from __future__ import absolute_import
+
+from ...json import Encoder
+from ...payload import get_path
+from ..base import ApiError
+
+from .resolver import RelationResolver
+
+__license__ = "MIT"
+__copyright__ = "Copyright (c) 2016-2018 KUSANAGI S.L. (http://kusanagi.io)"
+
+
+class JsonRenderer(object):
+    """Render transport data, relations and links as JSON.
+
+    The transport is traversed once, and each entity or collection is
+    serialized directly to a list of JSON chunks, without creating the
+    transport API objects.
+
+    The result is a JSON object with the "data", "relations" and "links"
+    fields, where each field has the same structure as in the transport.
+
+    When relations are embedded the related entities that are available
+    in the transport data are added to each entity using a field name,
+    and the "relations" field is not rendered.
+
+    """
+
+    def __init__(self, payload, **kwargs):
+        """Constructor.
+
+        :param payload: A transport payload.
+        :type payload: dict
+        :param embed: Optional flag to embed related entities.
+        :type embed: bool
+        :param primary_key: Optional field name for the entity primary keys.
+        :type primary_key: str
+        :param embed_field: Optional field name for the embedded entities.
+        :type embed_field: str
+        :param resolver: Optional relation resolver for the transport.
+        :type resolver: `RelationResolver`
+
+        """
+
+        self.__payload = payload
+        self.__embed = kwargs.get('embed', False)
+        self.__resolver = kwargs.get('resolver') or RelationResolver(
+            payload,
+            primary_key=(kwargs.get('primary_key') or 'id'),
+            )
+        self.__embed_field = kwargs.get('embed_field') or '_embedded'
+        self.__encode = Encoder(separators=(',', ':')).encode
+
+    def __get(self, name):
+        return get_path(self.__payload, name, None) or {}
+
+    def __render_entity(self, address, service, entity, chunks):
+        embedded = self.__resolver.get_related_entities(
+            address,
+            service,
+            entity,
+            )
+        if not embedded:
+            chunks.append(self.__encode(entity))
+            return
+
+        if self.__embed_field in entity:
+            raise ApiError('Entity field already exists: "{}"'.format(
+                self.__embed_field,
+                ))
+
+        # Add the embedded entities as the last field of the entity
+        # without copying the entity dictionary.
+        value = self.__encode(entity)
+        chunks.append(value[:-1])
+        if len(value) > 2:
+            chunks.append(',')
+
+        chunks.append(self.__encode(self.__embed_field))
+        chunks.append(':')
+        chunks.append(self.__encode(embedded))
+        chunks.append('}')
+
+    def __render_data(self, chunks):
+        data = self.__get('data')
+        if not self.__embed:
+            chunks.append(self.__encode(data))
+            return
+
+        # Data structure is "address/service/version/action/[items]"
+        # where each item is an entity or a collection of entities.
+        chunks.append('{')
+        for i, (address, services) in enumerate(data.items()):
+            if i:
+                chunks.append(',')
+
+            chunks.append(self.__encode(address))
+            chunks.append(':{')
+            for j, (service, versions) in enumerate(services.items()):
+                if j:
+                    chunks.append(',')
+
+                chunks.append(self.__encode(service))
+                chunks.append(':{')
+                for k, (version, actions) in enumerate(versions.items()):
+                    if k:
+                        chunks.append(',')
+
+                    chunks.append(self.__encode(version))
+                    chunks.append(':{')
+                    for l, (action, items) in enumerate(actions.items()):
+                        if l:
+                            chunks.append(',')
+
+                        chunks.append(self.__encode(action))
+                        chunks.append(':[')
+                        for m, item in enumerate(items):
+                            if m:
+                                chunks.append(',')
+
+                            if isinstance(item, dict):
+                                self.__render_entity(
+                                    address, service, item, chunks,
+                                    )
+                                continue
+
+                            chunks.append('[')
+                            for n, entity in enumerate(item):
+                                if n:
+                                    chunks.append(',')
+
+                                self.__render_entity(
+                                    address, service, entity, chunks,
+                                    )
+
+                            chunks.append(']')
+
+                        chunks.append(']')
+
+                    chunks.append('}')
+
+                chunks.append('}')
+
+            chunks.append('}')
+
+        chunks.append('}')
+
+    def render_chunks(self):
+        """Render the transport as a list of JSON chunks.
+
+        :rtype: list
+
+        """
+
+        chunks = ['{"data":']
+        self.__render_data(chunks)
+        if not self.__embed:
+            chunks.append(',"relations":')
+            chunks.append(self.__encode(self.__get('relations')))
+
+        chunks.append(',"links":')
+        chunks.append(self.__encode(self.__get('links')))
+        chunks.append('}')
+        return chunks
+
+    def render(self):
+        """Render the transport as a JSON string.
+
+        :rtype: str
+
+        """
+
+        return ''.join(self.render_chunks())
@@ -0,0 +1,225 @@
+"""
+Python 2 SDK for the KATANA(tm) Framework (http://katana.kusanagi.io)
+
+Copyright (c) 2016-2018 KUSANAGI S.L. All rights reserved.
+
+Distributed under the MIT license.
+
+For the full copyright and license information, please view the LICENSE
+file that was distributed with this source code.
+
+"""
+from __future__ import absolute_import
+
+from ...payload import get_path
+
+from .relation import ForeignRelation
+
+__license__ = "MIT"
+__copyright__ = "Copyright (c) 2016-2018 KUSANAGI S.L. (http://kusanagi.io)"
+
+
+def key_to_str(value):
+    """Convert a primary or foreign key value to a string.
+
+    Relation keys are always strings in the transport, so entity
+    keys must be converted to match them.
+
+    :param value: A key value.
+    :type value: object
+
+    :rtype: str
+
+    """
+
+    return value if isinstance(value, basestring) else str(value)
+
+
+class ResolvedRelation(ForeignRelation):
+    """Represents a foreign relation with the related entities."""
+
+    def __init__(self, address, name, foreign_keys, entities):
+        super(ResolvedRelation, self).__init__(address, name, foreign_keys)
+        self.__entities = entities
+
+    def get_entities(self):
+        """
+        Get the related entities.
+
+        Only the entities that are available in the Transport data
+        are returned, in the same order as the foreign keys.
+
+        :returns: A list of dict.
+        :rtype: list
+
+        """
+
+        return self.__entities
+
+    def get_entity(self):
+        """
+        Get the related entity for a relation of type "one".
+
+        None is returned when the entity is not available in the
+        Transport data.
+
+        :rtype: dict
+
+        """
+
+        return self.__entities[0] if self.__entities else None
+
+
+class RelationResolver(object):
+    """
+    Resolves the relations between the entities in the Transport data.
+
+    The entities are indexed by address, service and primary key the
+    first time they are needed, so resolving the relations of an entity
+    doesn't depend on the number of entities in the Transport.
+
+    Entities from all the Service versions and actions are indexed
+    together, and when two entities have the same primary key the
+    first one that is found is used.
+
+    """
+
+    def __init__(self, payload, primary_key='id'):
+        self.__data = get_path(payload, 'data', None) or {}
+        self.__relations = get_path(payload, 'relations', None) or {}
+        self.__primary_key = primary_key
+        self.__index = None
+
+    def __get_index(self):
+        if self.__index is not None:
+            return self.__index
+
+        primary_key = self.__primary_key
+        index = {}
+        for address, services in self.__data.items():
+            for service, versions in services.items():
+                entities = index.setdefault((address, service), {})
+                for actions in versions.values():
+                    for items in actions.values():
+                        for item in items:
+                            # Items can be entities or collections
+                            if isinstance(item, dict):
+                                item = (item, )
+
+                            for entity in item:
+                                if primary_key in entity:
+                                    pk = key_to_str(entity[primary_key])
+                                    entities.setdefault(pk, entity)
+
+        self.__index = index
+        return index
+
+    def get_primary_key_name(self):
+        """
+        Get the name of the entity field used as primary key.
+
+        :rtype: str
+
+        """
+
+        return self.__primary_key
+
+    def get_entity(self, address, service, primary_key):
+        """
+        Get an entity from the Transport data.
+
+        :param address: The Gateway address of the Service.
+        :type address: str
+        :param service: The name of the Service.
+        :type service: str
+        :param primary_key: The primary key value of the entity.
+        :type primary_key: object
+
+        :returns: The entity, or None when it doesn't exist.
+        :rtype: dict
+
+        """
+
+        entities = self.__get_index().get((address, service))
+        if entities:
+            return entities.get(key_to_str(primary_key))
+
+    def get_related(self, address, service, primary_key):
+        """
+        Get the relations of an entity with the related entities.
+
+        :param address: The Gateway address of the Service.
+        :type address: str
+        :param service: The name of the Service.
+        :type service: str
+        :param primary_key: The primary key value of the entity.
+        :type primary_key: object
+
+        :returns: A list of `ResolvedRelation`.
+        :rtype: list
+
+        """
+
+        # Relation keys can have any value, so path lookups that
+        # use field name mappings can't be used to get them.
+        foreign_services = self.__relations.get(address, {})
+        foreign_services = foreign_services.get(service, {})
+        foreign_services = foreign_services.get(key_to_str(primary_key))
+        if not foreign_services:
+            return []
+
+        index = self.__get_index()
+        relations = []
+        for foreign_address, services in foreign_services.items():
+            for name, foreign_keys in services.items():
+                entities = index.get((foreign_address, name), {})
+                if isinstance(foreign_keys, list):
+                    keys = foreign_keys
+                else:
+                    keys = (foreign_keys, )
+
+                related = []
+                for key in keys:
+                    entity = entities.get(key_to_str(key))
+                    if entity is not None:
+                        related.append(entity)
+
+                relations.append(ResolvedRelation(
+                    foreign_address,
+                    name,
+                    foreign_keys,
+                    related,
+                    ))
+
+        return relations
+
+    def get_related_entities(self, address, service, entity):
+        """
+        Get the related entities of an entity by Service name.
+
+        Relations of type "one" contain the related entity or None,
+        and relations of type "many" contain a list of entities.
+
+        :param address: The Gateway address of the Service.
+        :type address: str
+        :param service: The name of the Service.
+        :type service: str
+        :param entity: An entity from the Transport data.
+        :type entity: dict
+
+        :rtype: dict
+
+        """
+
+        primary_key = entity.get(self.__primary_key)
+        if primary_key is None:
+            return {}
+
+        related = {}
+        for relation in self.get_related(address, service, primary_key):
+            if relation.get_type() == 'many':
+                related[relation.get_name()] = relation.get_entities()
+            else:
+                related[relation.get_name()] = relation.get_entity()
+
+        return related
@@ -12,9 +12,12 @@ file that was distributed with this source code.
 from __future__ import absolute_import
 
 import logging
+import Queue
+import threading
 import time
 import types
 import sys
+import zlib
 
 from datetime import datetime
 
@@ -33,6 +36,15 @@ CRITICAL = logging.CRITICAL
 ALERT = CRITICAL + 1
 EMERGENCY = ALERT + 1
 
+# Default maximum number of log records waiting to be written
+DEFAULT_QUEUE_SIZE = 10000
+
+# Rate of requests that are logged, between 0 and 1
+SAMPLE_RATE = 1.0
+
+# Flag to write logs as JSON lines
+STRUCTURED = False
+
 # Mappings between Syslog numeric severity levels and python logging levels
 SYSLOG_NUMERIC = {
     0: EMERGENCY,
@@ -46,59 +58,93 @@ SYSLOG_NUMERIC = {
     }
 
 
+def is_request_sampled(rid, rate):
+    """Check if the logs for a request are enabled by sampling.
+
+    The request ID is hashed, so all the log records of a request
+    are either enabled or disabled.
+
+    Requests without ID are always sampled.
+
+    :param rid: The request ID.
+    :type rid: str
+    :param rate: The rate of requests to sample, between 0 and 1.
+    :type rate: float
+
+    :rtype: bool
+
+    """
+
+    if not rid or rate >= 1:
+        return True
+    elif rate <= 0:
+        return False
+
+    if isinstance(rid, unicode):
+        rid = rid.encode('utf8')
+
+    return (zlib.crc32(rid) & 0xffffffff) < rate * 0x100000000
+
+
 class RequestLogger(object):
     """
     Logger for requests.
 
-    It appends the request ID to all logging messages.
+    It appends the request ID to all logging messages, or adds it
+    to the log records when logs are written as JSON lines.
+
+    Log records with a level lower than ERROR are only written
+    for the requests selected by the sample rate.
 
     """
 
-    def __init__(self, rid, name):
+    def __init__(self, rid, name, action=None):
         self.rid = rid
+        self.action = action
+        self.sampled = is_request_sampled(rid, SAMPLE_RATE)
+        self.__structured = STRUCTURED
         self.__logger = logging.getLogger(name)
 
-    def debug(self, msg, *args, **kw):
-        if self.rid:
+    def __log(self, lvl, msg, args, kw):
+        if not self.isEnabledFor(lvl):
+            return
+
+        if self.rid and not self.__structured:
             msg += ' |{}|'.format(self.rid)
 
-        self.__logger.debug(msg, *args, **kw)
+        extra = dict(kw.get('extra') or {})
+        extra.setdefault('request_id', self.rid)
+        extra.setdefault('action', self.action)
+        kw['extra'] = extra
+        self.__logger.log(lvl, msg, *args, **kw)
 
-    def info(self, msg, *args, **kw):
-        if self.rid:
-            msg += ' |{}|'.format(self.rid)
+    def isEnabledFor(self, lvl):
+        if not (self.sampled or lvl >= ERROR):
+            return False
 
-        self.__logger.info(msg, *args, **kw)
+        return self.__logger.isEnabledFor(lvl)
 
-    def warning(self, msg, *args, **kw):
-        if self.rid:
-            msg += ' |{}|'.format(self.rid)
+    def debug(self, msg, *args, **kw):
+        self.__log(DEBUG, msg, args, kw)
 
-        self.__logger.warning(msg, *args, **kw)
+    def info(self, msg, *args, **kw):
+        self.__log(INFO, msg, args, kw)
 
-    def error(self, msg, *args, **kw):
-        if self.rid:
-            msg += ' |{}|'.format(self.rid)
+    def warning(self, msg, *args, **kw):
+        self.__log(WARNING, msg, args, kw)
 
-        self.__logger.error(msg, *args, **kw)
+    def error(self, msg, *args, **kw):
+        self.__log(ERROR, msg, args, kw)
 
     def critical(self, msg, *args, **kw):
-        if self.rid:
-            msg += ' |{}|'.format(self.rid)
-
-        self.__logger.critical(msg, *args, **kw)
+        self.__log(CRITICAL, msg, args, kw)
 
     def exception(self, msg, *args, **kw):
-        if self.rid:
-            msg += ' |{}|'.format(self.rid)
-
-        self.__logger.exception(msg, *args, **kw)
+        kw.setdefault('exc_info', 1)
+        self.__log(ERROR, msg, args, kw)
 
     def log(self, lvl, msg, *args, **kw):
-        if self.rid:
-            msg += ' |{}|'.format(self.rid)
-
-        self.__logger.log(lvl, msg, *args, **kw)
+        self.__log(lvl, msg, args, kw)
 
 
 class KatanaFormatter(logging.Formatter):
@@ -109,13 +155,175 @@ class KatanaFormatter(logging.Formatter):
         return datetime.fromtimestamp(utc).isoformat()[:-3]
 
 
-def value_to_log_string(value, max_chars=100000):
+class JsonFormatter(KatanaFormatter):
+    """Logging formatter to write log records as JSON lines."""
+
+    def __init__(self, type, name, version, framework):
+        KatanaFormatter.__init__(self)
+        self.__component = {'type': type, 'name': name, 'version': version}
+        self.__framework = framework
+
+    def format(self, record):
+        entry = {
+            'timestamp': '{}Z'.format(self.formatTime(record)),
+            'level': record.levelname,
+            'component': self.__component,
+            'framework': self.__framework,
+            'message': record.getMessage(),
+            }
+
+        for name in ('request_id', 'action', 'duration'):
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+
+        # Exceptions can be already formatted by the handler
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+
+        return json.serialize(entry).decode('utf8')
+
+
+class AsyncStreamHandler(logging.StreamHandler):
+    """
+    Stream handler that writes log records in a background thread.
+
+    Records are added to a bounded queue, and then formatted and written
+    to the stream by a thread, so a slow stream doesn't block the callers.
+
+    When the queue is full the records are dropped, unless blocking
+    is enabled, in which case callers wait for room in the queue.
+
+    """
+
+    def __init__(self, stream=None, queue_size=DEFAULT_QUEUE_SIZE, block=False):
+        logging.StreamHandler.__init__(self, stream)
+        self.__queue = Queue.Queue(queue_size)
+        self.__block = block
+        self.__dropped = 0
+        self.__thread = None
+        self.__thread_lock = threading.Lock()
+
+    def __start(self):
+        # Thread is started by the first record, so it is created
+        # in the process that writes the logs when forking.
+        with self.__thread_lock:
+            if self.__thread and self.__thread.is_alive():
+                return
+
+            self.__thread = threading.Thread(target=self.__write)
+            self.__thread.daemon = True
+            self.__thread.start()
+
+    def __write(self):
+        while True:
+            record = self.__queue.get()
+            try:
+                if record is None:
+                    return
+
+                logging.StreamHandler.emit(self, record)
+            finally:
+                self.__queue.task_done()
+
+    def is_blocking(self):
+        """Check if callers wait when the queue is full.
+
+        :rtype: bool
+
+        """
+
+        return self.__block
+
+    def get_dropped(self):
+        """Get the number of records dropped because the queue was full.
+
+        :rtype: int
+
+        """
+
+        return self.__dropped
+
+    def handle(self, record):
+        # Queue is thread safe, so the handler lock is not used. Otherwise
+        # callers would keep the lock while waiting for room in the queue,
+        # and the thread would not be able to flush the stream.
+        result = self.filter(record)
+        if result:
+            self.emit(record)
+
+        return result
+
+    def prepare(self, record):
+        """Prepare a log record to be written by the thread.
+
+        The message and the exception are formatted by the caller, so
+        the record contains the argument values at the time of the call,
+        and it doesn't keep references to the arguments or traceback.
+
+        :param record: A log record.
+        :type record: `logging.LogRecord`
+
+        :rtype: `logging.LogRecord`
+
+        """
+
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            formatter = self.formatter or logging._defaultFormatter
+            if not record.exc_text:
+                record.exc_text = formatter.formatException(record.exc_info)
+
+            record.exc_info = None
+
+        return record
+
+    def emit(self, record):
+        if not (self.__thread and self.__thread.is_alive()):
+            self.__start()
+
+        try:
+            self.__queue.put(self.prepare(record), self.__block)
+        except Queue.Full:
+            self.__dropped += 1
+
+    def flush(self):
+        """Wait until all the queued records are written."""
+
+        # The stream handler flushes after each record is written
+        # by the thread, so the queue must not be waited there.
+        thread = self.__thread
+        if thread is not threading.current_thread():
+            if thread and thread.is_alive():
+                self.__queue.join()
+
+        logging.StreamHandler.flush(self)
+
+    def close(self):
+        """Write the queued records and stop the thread."""
+
+        thread = self.__thread
+        if thread and thread.is_alive():
+            self.__queue.put(None)
+            thread.join()
+
+        logging.StreamHandler.close(self)
+
+
+def value_to_log_string(value, max_chars=100000, compact=False):
     """Convert a value to a string.
 
     :param value: A value to log.
     :type value: object
     :param max_chars: Optional maximum number of characters to return.
     :type max_chars: int
+    :param compact: Optional flag to serialize dictionaries and lists
+                    as compact JSON instead of pretty JSON.
+    :type compact: bool
 
     :rtype: str
 
@@ -128,7 +336,7 @@ def value_to_log_string(value, max_chars=100000):
     elif isinstance(value, basestring):
         output = value
     elif isinstance(value, (dict, list, tuple)):
-        output = json.serialize(value, prettify=True).decode('utf8')
+        output = json.serialize(value, prettify=not compact).decode('utf8')
     elif isinstance(value, types.FunctionType):
         if value.__name__ == '<lambda>':
             output = 'anonymous'
@@ -156,14 +364,68 @@ def disable_logging():
     logging.disable(sys.maxint)
 
 
-def setup_katana_logging(type, name, version, framework, level):
+def set_request_sampling(rate):
+    """Set the rate of requests that are logged.
+
+    Logs with ERROR level or higher are always written.
+
+    Components should use `Component.set_request_sampling()`, which
+    sets the rate when the component runs. The rate applies to all the
+    components of the process.
+
+    :param rate: The rate of requests to log, between 0 and 1.
+    :type rate: float
+
+    :raises: ValueError
+
+    """
+
+    global SAMPLE_RATE
+
+    if not 0 <= rate <= 1:
+        raise ValueError('Sample rate must be a value between 0 and 1')
+
+    SAMPLE_RATE = rate
+
+
+def set_structured_logging(enabled=True):
+    """Enable or disable writing logs as JSON lines.
+
+    It must be called before logging is initialized, so components
+    should use `Component.set_structured_logging()`, or call it before
+    the component `run()` method is called.
+
+    :param enabled: Optional flag to enable JSON lines.
+    :type enabled: bool
+
+    """
+
+    global STRUCTURED
+
+    STRUCTURED = enabled
+
+
+def flush_logging():
+    """Write all the pending log records of the KATANA loggers."""
+
+    for name in (None, 'katana', 'katana.api'):
+        for handler in logging.getLogger(name).handlers:
+            handler.flush()
+
+
+def setup_katana_logging(type, name, version, framework, level, **kwargs):
     """Initialize logging defaults for KATANA.
 
+    Logs are written in a background thread when a queue size is given.
+
     :param type: Component type.
     :param name: Component name.
     :param version: Component version.
     :param framework: KATANA framework version.
     :param level: Logging level.
+    :param queue_size: Optional size of the queue for asynchronous logging.
+    :param block: Optional flag to wait when the logging queue is full,
+                  instead of dropping the log records.
 
     """
 
@@ -177,20 +439,32 @@ def setup_katana_logging(type, name, version, framework, level):
         )
 
     output = get_output_buffer()
+    queue_size = kwargs.get('queue_size')
+    if queue_size:
+        # All loggers share the same handler and thread
+        handler = AsyncStreamHandler(
+            stream=output,
+            queue_size=queue_size,
+            block=kwargs.get('block', False),
+            )
+    else:
+        handler = logging.StreamHandler(stream=output)
+
+    if STRUCTURED:
+        handler.setFormatter(JsonFormatter(type, name, version, framework))
+    else:
+        handler.setFormatter(KatanaFormatter(format))
 
     # Setup root logger
     root = logging.root
     if not root.handlers:
-        logging.basicConfig(level=level, stream=output)
+        root.addHandler(handler)
         root.setLevel(level)
-        root.handlers[0].setFormatter(KatanaFormatter(format))
 
     # Setup katana logger
     logger = logging.getLogger('katana')
     logger.setLevel(level)
     if not logger.handlers:
-        handler = logging.StreamHandler(stream=output)
-        handler.setFormatter(KatanaFormatter(format))
         logger.addHandler(handler)
         logger.propagate = False
 
@@ -198,7 +472,5 @@ def setup_katana_logging(type, name, version, framework, level):
     logger = logging.getLogger('katana.api')
     logger.setLevel(level)
     if not logger.handlers:
-        handler = logging.StreamHandler(stream=output)
-        handler.setFormatter(KatanaFormatter(format))
         logger.addHandler(handler)
         logger.propagate = False
@@ -17,13 +17,11 @@ from .api.param import param_to_payload
 from .api.request import Request
 from .api.response import NO_RETURN_VALUE
 from .api.response import Response
-from .api.transport import Transport
 from .payload import ErrorPayload
 from .payload import Payload
 from .payload import ResponsePayload
 from .payload import ServiceCallPayload
 from .server import ComponentServer
-from .utils import MultiDict
 
 __license__ = "MIT"
 __copyright__ = "Copyright (c) 2016-2018 KUSANAGI S.L. (http://kusanagi.io)"
@@ -42,26 +40,33 @@ class MiddlewareServer(ComponentServer):
         from .sdk.middleware import get_component
 
         super(MiddlewareServer, self).__init__(*args, **kwargs)
-        self.__component = get_component()
+        # Hosted components are not the global component instance
+        self.__component = kwargs.get('component') or get_component()
 
     @staticmethod
     def get_type():
         return 'middleware'
 
+    def get_component(self):
+        return self.__component
+
     @staticmethod
     def http_request_from_payload(payload):
         if not payload.path_exists('request'):
             return
 
+        # Query, headers, post data and files are given to the HTTP
+        # request as they are in the payload, because `HttpRequest`
+        # only processes them when they are used.
         return {
             'method': payload.get('request/method'),
             'url': payload.get('request/url'),
             'protocol_version': payload.get('request/version'),
-            'query': MultiDict(payload.get('request/query', {})),
-            'headers': MultiDict(payload.get('request/headers', {})),
-            'post_data': MultiDict(payload.get('request/post_data', {})),
+            'query': payload.get('request/query', None),
+            'headers': payload.get('request/headers', None),
+            'post_data': payload.get('request/post_data', None),
             'body': payload.get('request/body'),
-            'files': MultiDict(payload.get('request/files', {})),
+            'files': payload.get('request/files', None),
             }
 
     @staticmethod
@@ -72,7 +77,7 @@ class MiddlewareServer(ComponentServer):
         code, text = payload.get('response/status').split(' ', 1)
         return {
             'version': payload.get('response/version', '1.1'),
-            'headers': MultiDict(payload.get('response/headers', {})),
+            'headers': payload.get('response/headers', None),
             'status_code': int(code),
             'status_text': text,
             'body': payload.get('response/body', ''),
@@ -102,8 +107,10 @@ class MiddlewareServer(ComponentServer):
             )
 
     def _create_response_component_instance(self, payload, extra):
+        # Transport is given as a payload to avoid creating
+        # the `Transport` when the response callback doesn't use it.
         return Response(
-            Transport(payload.get('transport')),
+            payload.get('transport', None),
             self.__component,
             self.source_file,
             self.component_name,
@@ -11,13 +11,111 @@ file that was distributed with this source code.
 """
 from __future__ import absolute_import
 
+import logging
+import mmap
+import os
+import tempfile
+import threading
+
+from itertools import count
+
 from .errors import KatanaError
 from .payload import Payload
+from .serialization import unpack
 from .utils import Singleton
 
 __license__ = "MIT"
 __copyright__ = "Copyright (c) 2016-2018 KUSANAGI S.L. (http://kusanagi.io)"
 
+LOG = logging.getLogger(__name__)
+
+# Revision numbers for the registry mappings, shared by all registry
+# instances so a revision is never used twice.
+REVISIONS = count(1)
+
+
+def read_snapshot(path):
+    """Read a mappings snapshot file.
+
+    The file is memory mapped so its contents are only read from
+    disk when the mappings are unpacked.
+
+    :param path: Path to the snapshot file.
+    :type path: str
+
+    :returns: The snapshot contents, or None when the file is missing or empty.
+    :rtype: mmap.mmap
+
+    """
+
+    try:
+        with open(path, 'rb') as file:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError):
+        # Empty files can't be mapped and raise a ValueError
+        return
+
+
+def write_snapshot(path, stream):
+    """Write a mappings stream to a snapshot file.
+
+    The stream is written to a temporary file that is renamed, so
+    other processes never read an incomplete snapshot.
+
+    :param path: Path to the snapshot file.
+    :type path: str
+    :param stream: The packed mappings.
+    :type stream: bytes
+
+    :returns: True when the snapshot is written.
+    :rtype: bool
+
+    """
+
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        fd, temp_path = tempfile.mkstemp(prefix='.', dir=directory)
+    except (IOError, OSError):
+        LOG.warning('Failed to write schema snapshot: "%s"', path)
+        return False
+
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(stream)
+
+        os.rename(temp_path, path)
+    except (IOError, OSError):
+        LOG.warning('Failed to write schema snapshot: "%s"', path)
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+        return False
+
+    return True
+
+
+def is_same_stream(stream, other):
+    """Check if two packed mappings are the same.
+
+    Streams can be memory maps, which are compared without copying
+    their contents.
+
+    :param stream: The packed mappings.
+    :type stream: bytes
+    :param other: The other packed mappings.
+    :type other: bytes
+
+    :rtype: bool
+
+    """
+
+    if stream is None or other is None or len(stream) != len(other):
+        return False
+
+    return buffer(stream) == buffer(other)
+
 
 class SchemaRegistry(object):
     """Global service schema registry."""
@@ -27,6 +125,36 @@ class SchemaRegistry(object):
     def __init__(self, *args, **kwargs):
         super(SchemaRegistry, self).__init__(*args, **kwargs)
         self.__mappings = Payload()
+        self.__revision = next(REVISIONS)
+        self.__lock = threading.Lock()
+        self.__snapshot_path = None
+        # Packed mappings that are not unpacked yet
+        self.__stream = None
+        # Packed mappings of the current mappings, which can be the
+        # memory map of the snapshot file.
+        self.__current_stream = None
+        # Last packed mappings written to or read from the snapshot
+        self.__snapshot_stream = None
+
+    def __get_mappings(self):
+        if self.__stream is None:
+            return self.__mappings
+
+        with self.__lock:
+            if self.__stream is not None:
+                stream = self.__stream
+                try:
+                    self.__mappings = Payload(unpack(stream) or {})
+                except Exception:
+                    LOG.warning(
+                        'Invalid schema snapshot: "%s"',
+                        self.__snapshot_path,
+                        )
+                    self.__mappings = Payload()
+
+                self.__stream = None
+
+        return self.__mappings
 
     @staticmethod
     def is_empty(value):
@@ -46,17 +174,106 @@ class SchemaRegistry(object):
 
         """
 
-        return len(self.__mappings) > 0
+        return len(self.__get_mappings()) > 0
 
-    def update_registry(self, mappings):
+    @property
+    def revision(self):
+        """Get the revision of the registry mappings.
+
+        Revision changes each time the registry is updated.
+
+        :rtype: int
+
+        """
+
+        return self.__revision
+
+    def is_current(self, stream):
+        """Check if packed mappings are the current registry mappings.
+
+        :param stream: The packed mappings.
+        :type stream: bytes
+
+        :rtype: bool
+
+        """
+
+        return is_same_stream(stream, self.__current_stream)
+
+    def get_snapshot_path(self):
+        """Get the path to the mappings snapshot file.
+
+        :rtype: str
+
+        """
+
+        return self.__snapshot_path
+
+    def set_snapshot_path(self, path):
+        """Persist the registry mappings to a snapshot file.
+
+        When the file exists its mappings are used until the registry
+        is updated, so the Service schemas are available before the
+        first request. The file is memory mapped and its mappings are
+        only unpacked when they are first used.
+
+        Each time the registry is updated with different mappings the
+        snapshot file is written again.
+
+        :param path: Path to the snapshot file.
+        :type path: str
+
+        """
+
+        self.__snapshot_path = path
+        stream = read_snapshot(path)
+        if stream is None:
+            return
+
+        with self.__lock:
+            self.__stream = stream
+            self.__current_stream = stream
+            self.__snapshot_stream = stream
+            self.__revision = next(REVISIONS)
+
+    def update_registry(self, mappings, stream=None):
         """Update schema registry with mappings info.
 
+        The mappings and the revision only change when the mappings are
+        different from the current ones. When the packed mappings are
+        given they are compared instead of the mappings.
+
+        When a snapshot path is set the packed mappings are written to
+        the snapshot file, unless they are the same as the snapshot.
+
         :param mappings: Mappings payload.
         :type mappings: dict
+        :param stream: Optional packed mappings.
+        :type stream: bytes
 
         """
 
-        self.__mappings = Payload(mappings or {})
+        mappings = Payload(mappings or {})
+        if stream is not None:
+            if self.is_current(stream):
+                return
+        elif mappings == self.__get_mappings():
+            return
+
+        with self.__lock:
+            self.__mappings = mappings
+            self.__stream = None
+            self.__current_stream = stream
+            self.__revision = next(REVISIONS)
+
+        if not self.__snapshot_path or stream is None:
+            return
+
+        if is_same_stream(stream, self.__snapshot_stream):
+            return
+
+        if write_snapshot(self.__snapshot_path, stream):
+            self.__snapshot_stream = stream
 
     def path_exists(self, path):
         """Check if a path is available.
@@ -70,7 +287,7 @@ class SchemaRegistry(object):
 
         """
 
-        return self.__mappings.path_exists(path)
+        return self.__get_mappings().path_exists(path)
 
     def get(self, path, *args, **kwargs):
         """Get value by key path.
@@ -85,7 +302,7 @@ class SchemaRegistry(object):
 
         """
 
-        return self.__mappings.get(path, *args, **kwargs)
+        return self.__get_mappings().get(path, *args, **kwargs)
 
     def get_service_names(self):
         """Get the list of service names in schema.
@@ -94,7 +311,7 @@ class SchemaRegistry(object):
 
         """
 
-        return list(self.__mappings.keys())
+        return list(self.__get_mappings().keys())
 
 
 def get_schema_registry():
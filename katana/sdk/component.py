@@ -12,8 +12,11 @@ file that was distributed with this source code.
 from __future__ import absolute_import
 
 import logging
+import threading
+import time
 
 from ..errors import KatanaError
+from ..logging import DEFAULT_QUEUE_SIZE
 from ..logging import INFO
 from ..logging import value_to_log_string
 from ..schema import SchemaRegistry
@@ -27,6 +30,129 @@ class ComponentError(KatanaError):
     """Exception calss for component errors."""
 
 
+class ResourcePool(object):
+    """Pool of resource values that are checked out by requests.
+
+    Values are created by the factory when they are first needed,
+    until the pool size is reached.
+
+    """
+
+    def __init__(self, name, factory, size, timeout=None):
+        """Constructor.
+
+        :param name: Name of the resource.
+        :type name: str
+        :param factory: A callable that returns a new resource value.
+        :type factory: function
+        :param size: Maximum number of values in the pool.
+        :type size: int
+        :param timeout: Optional seconds to wait for a free value.
+        :type timeout: float
+
+        """
+
+        self.__name = name
+        self.__factory = factory
+        self.__size = size
+        self.__timeout = timeout
+        self.__idle = []
+        self.__created = 0
+        self.__condition = threading.Condition()
+
+    def get_size(self):
+        """Get the maximum number of values in the pool.
+
+        :rtype: int
+
+        """
+
+        return self.__size
+
+    def get_created(self):
+        """Get the number of values created by the pool.
+
+        :rtype: int
+
+        """
+
+        return self.__created
+
+    def get_idle(self):
+        """Get the number of values that are not checked out.
+
+        :rtype: int
+
+        """
+
+        return len(self.__idle)
+
+    def checkout(self):
+        """Get a value from the pool.
+
+        When all the values are checked out the caller waits until
+        a value is returned to the pool.
+
+        :raises: ComponentError
+
+        :rtype: object
+
+        """
+
+        with self.__condition:
+            if self.__timeout is not None:
+                deadline = time.time() + self.__timeout
+
+            while not self.__idle and self.__created >= self.__size:
+                if self.__timeout is None:
+                    self.__condition.wait()
+                    continue
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise ComponentError(
+                        'Timeout waiting for resource "{}"'.format(self.__name)
+                        )
+
+                self.__condition.wait(remaining)
+
+            if self.__idle:
+                return self.__idle.pop()
+
+            # Reserve a place for the new value
+            self.__created += 1
+
+        try:
+            value = self.__factory()
+        except:
+            self.__discard()
+            raise
+
+        if value is None:
+            self.__discard()
+            err = 'Invalid result value for resource "{}"'.format(self.__name)
+            raise ComponentError(err)
+
+        return value
+
+    def checkin(self, value):
+        """Return a value to the pool.
+
+        :param value: A value that was checked out.
+        :type value: object
+
+        """
+
+        with self.__condition:
+            self.__idle.append(value)
+            self.__condition.notify()
+
+    def __discard(self):
+        with self.__condition:
+            self.__created -= 1
+            self.__condition.notify()
+
+
 class Component(object):
     """Base KATANA SDK component class."""
 
@@ -34,10 +160,25 @@ class Component(object):
 
     def __init__(self):
         self.__resources = {}
+        # Factories and locks for the lazy resources that are not created
+        self.__factories = {}
+        self.__pools = {}
+        # Pooled resource values checked out by the request of each thread
+        self.__checkouts = threading.local()
         self.__startup_callback = None
         self.__shutdown_callback = None
         self.__error_callback = None
+        self.__schema_snapshot = None
+        self.__reload_signal = None
+        self.__grace_period = None
+        self.__recycling = None
+        self.__idle_gc = None
+        self.__log_queue = None
+        self.__sample_rate = None
+        self.__structured_logging = None
         self._callbacks = {}
+        # Enabled while the callbacks are reloaded from the source file
+        self._reloading = False
         self._runner = None
         self.__logger = logging.getLogger('katana.api')
 
@@ -51,22 +192,39 @@ class Component(object):
 
         """
 
-        return name in self.__resources
+        return (
+            name in self.__resources
+            or name in self.__factories
+            or name in self.__pools
+            )
 
-    def set_resource(self, name, callable):
+    def set_resource(self, name, callable, lazy=False):
         """Store a resource.
 
         Callback receives the `Component` instance as first argument.
 
+        Lazy resources are created the first time they are used, or
+        when they are loaded with `load_resources()`.
+
         :param name: Name of the resource.
         :type name: str
         :param callable: A callable that returns the resource value.
         :type callable: function
+        :param lazy: Optional flag to create the resource when first used.
+        :type lazy: bool
 
         :raises: ComponentError
 
         """
 
+        # Reloads keep the existing resources
+        if self._reloading and self.has_resource(name):
+            return
+
+        if lazy:
+            self.__factories[name] = (callable, threading.Lock())
+            return
+
         value = callable(self)
         if value is None:
             err = 'Invalid result value for resource "{}"'.format(name)
@@ -74,9 +232,82 @@ class Component(object):
 
         self.__resources[name] = value
 
+    def set_resource_pool(self, name, callable, size, timeout=None):
+        """Store a pool of resource values.
+
+        Each request gets its own value from the pool the first time it
+        gets the resource, and the value is returned to the pool when
+        the request finishes, so values like database connections are
+        never shared between concurrent requests. Values used by the
+        startup and shutdown callbacks are returned to the pool when the
+        callback finishes.
+
+        Values are created when they are needed, until the pool size is
+        reached. After that requests wait for a free value.
+
+        Callback receives the `Component` instance as first argument.
+
+        :param name: Name of the resource.
+        :type name: str
+        :param callable: A callable that returns a new resource value.
+        :type callable: function
+        :param size: Maximum number of values in the pool.
+        :type size: int
+        :param timeout: Optional seconds to wait for a free value.
+        :type timeout: float
+
+        :raises: ComponentError
+
+        """
+
+        if self._reloading and self.has_resource(name):
+            return
+
+        if size < 1:
+            raise ComponentError('Invalid pool size for resource "{}"'.format(
+                name,
+                ))
+
+        self.__pools[name] = ResourcePool(
+            name,
+            lambda: callable(self),
+            size,
+            timeout=timeout,
+            )
+
+    def get_resource_pool(self, name):
+        """Get the pool of a pooled resource.
+
+        :param name: Name of the resource.
+        :type name: str
+
+        :returns: The pool, or None when the resource is not pooled.
+        :rtype: ResourcePool
+
+        """
+
+        return self.__pools.get(name)
+
+    def __create_resource(self, name):
+        factory, lock = self.__factories[name]
+        with lock:
+            # Another thread could have created the resource
+            if name not in self.__resources:
+                value = factory(self)
+                if value is None:
+                    err = 'Invalid result value for resource "{}"'.format(name)
+                    raise ComponentError(err)
+
+                self.__resources[name] = value
+
+        return self.__resources[name]
+
     def get_resource(self, name):
         """Get a resource.
 
+        For pooled resources the value is checked out from the pool, and
+        the same value is returned until the current request finishes.
+
         :param name: Name of the resource.
         :type name: str
 
@@ -86,10 +317,200 @@ class Component(object):
 
         """
 
-        if not self.has_resource(name):
-            raise ComponentError('Resource "{}" not found'.format(name))
+        if name in self.__resources:
+            return self.__resources[name]
+        elif name in self.__factories:
+            return self.__create_resource(name)
+        elif name in self.__pools:
+            checkouts = self.__checkouts.__dict__
+            if name not in checkouts:
+                checkouts[name] = self.__pools[name].checkout()
 
-        return self.__resources[name]
+            return checkouts[name]
+
+        raise ComponentError('Resource "{}" not found'.format(name))
+
+    def release_resources(self):
+        """Return the pooled resources used by the current request.
+
+        This is called by the component server when a request finishes,
+        and by the runner after the startup and shutdown callbacks.
+
+        """
+
+        checkouts = self.__checkouts.__dict__
+        while checkouts:
+            name, value = checkouts.popitem()
+            self.__pools[name].checkin(value)
+
+    def __load_resource(self, name):
+        if name in self.__pools:
+            # Create the first value of the pool
+            pool = self.__pools[name]
+            pool.checkin(pool.checkout())
+        else:
+            self.__create_resource(name)
+
+    def load_resources(self):
+        """Create the lazy resources and the first value of each pool.
+
+        The resources are created concurrently, so the time to load them
+        is the time of the slowest resource. This can be used in the
+        startup callback to have the resources ready for the requests.
+
+        :raises: ComponentError
+
+        """
+
+        names = [
+            name for name in self.__factories if name not in self.__resources
+            ]
+        names.extend(
+            name for name, pool in self.__pools.items()
+            if not pool.get_created()
+            )
+        if len(names) < 2:
+            for name in names:
+                self.__load_resource(name)
+
+            return
+
+        from multiprocessing.pool import ThreadPool
+
+        threads = ThreadPool(len(names))
+        try:
+            threads.map(self.__load_resource, names)
+        finally:
+            threads.close()
+            threads.join()
+
+    def set_schema_snapshot(self, path):
+        """Persist the Service schemas to a local snapshot file.
+
+        The last schemas received from the framework are saved to the
+        file, and are loaded from it when the component starts, so they
+        are available before the first request.
+
+        :param path: Path to the snapshot file.
+        :type path: str
+
+        """
+
+        self.__schema_snapshot = path
+
+    def set_reload_signal(self, signum):
+        """Reload the action callbacks when a signal is received.
+
+        The component source file is executed again to get the new
+        callbacks, while the component keeps listening for requests,
+        and keeps its resources and Service schemas. Resources that
+        already exist are not created again during the reload.
+
+        Only the source file is executed again. The modules imported by
+        it are not reloaded, so changes in them are applied when the
+        component is restarted.
+
+        Hosted components can't be reloaded, and the signal is ignored.
+
+        :param signum: A signal number, like `signal.SIGHUP`.
+        :type signum: int
+
+        """
+
+        self.__reload_signal = signum
+
+    def set_grace_period(self, seconds):
+        """Set the time to wait for the current requests on shutdown.
+
+        When the component receives a SIGTERM or SIGINT signal it stops
+        receiving requests, and waits for the requests that are being
+        processed before the shutdown callback is called.
+        By default it waits for the request execution timeout.
+
+        :param seconds: Number of seconds to wait.
+        :type seconds: float
+
+        """
+
+        self.__grace_period = seconds
+
+    def set_recycling(self, max_requests=None, max_memory=None):
+        """Recycle the component process when a limit is reached.
+
+        When a limit is reached the component stops receiving requests,
+        waits for the current requests to finish and calls the shutdown
+        callback. Then the process is replaced by a new process that
+        runs the component again with the same arguments.
+
+        :param max_requests: Optional number of requests before recycling.
+        :type max_requests: int
+        :param max_memory: Optional resident memory in bytes before recycling.
+        :type max_memory: int
+
+        """
+
+        self.__recycling = (max_requests, max_memory)
+
+    def set_idle_gc(self, threshold_factor=10):
+        """Run the garbage collection when there are no requests.
+
+        While requests are processed the automatic garbage collection
+        thresholds are multiplied by the factor, and the collection is
+        done when the last request finishes. When the factor is zero the
+        automatic collection is disabled while the component runs.
+
+        The collection metrics are logged with the request metrics
+        when the component stops.
+
+        :param threshold_factor: Optional factor to raise the collection
+                                 thresholds while there are requests.
+        :type threshold_factor: int
+
+        """
+
+        self.__idle_gc = threshold_factor
+
+    def set_log_queue(self, size=DEFAULT_QUEUE_SIZE, block=False):
+        """Set the queue used to write the logs in a background thread.
+
+        By default log records are dropped when the queue is full, so
+        the requests never wait for the output stream. When blocking is
+        enabled the records are never dropped, and the callers wait for
+        a free place in the queue. When the size is zero the logs are
+        written by the caller thread.
+
+        :param size: Optional maximum number of records in the queue.
+        :type size: int
+        :param block: Optional flag to wait when the queue is full.
+        :type block: bool
+
+        """
+
+        self.__log_queue = (size, block)
+
+    def set_request_sampling(self, rate):
+        """Set the rate of requests that are logged.
+
+        Requests are sampled by request ID, so all the logs of a request
+        are either written or skipped. Logs with ERROR level or higher
+        are always written.
+
+        :param rate: The rate of requests to log, between 0 and 1.
+        :type rate: float
+
+        """
+
+        self.__sample_rate = rate
+
+    def set_structured_logging(self, enabled=True):
+        """Enable or disable writing logs as JSON lines.
+
+        :param enabled: Optional flag to enable JSON lines.
+        :type enabled: bool
+
+        """
+
+        self.__structured_logging = enabled
 
     def startup(self, callback):
         """Register a callback to be called during component startup.
@@ -157,19 +578,61 @@ class Component(object):
         if self.__error_callback:
             self._runner.set_error_callback(self.__error_callback)
 
+        if self._reloading:
+            # The component is already running so only the
+            # callbacks are updated.
+            self._runner.set_callbacks(self._callbacks)
+            return
+
+        if self.__reload_signal:
+            self._runner.set_reload_signal(self.__reload_signal)
+
+        if self.__grace_period is not None:
+            self._runner.set_grace_period(self.__grace_period)
+
+        if self.__recycling:
+            self._runner.set_recycling(*self.__recycling)
+
+        if self.__idle_gc is not None:
+            self._runner.set_idle_gc(self.__idle_gc)
+
+        if self.__log_queue:
+            self._runner.set_log_queue(*self.__log_queue)
+
+        if self.__sample_rate is not None:
+            self._runner.set_request_sampling(self.__sample_rate)
+
+        if self.__structured_logging is not None:
+            self._runner.set_structured_logging(self.__structured_logging)
+
         # Create the global schema registry instance on run
-        SchemaRegistry()
+        registry = SchemaRegistry()
+        if self.__schema_snapshot:
+            registry.set_snapshot_path(self.__schema_snapshot)
 
         self._runner.set_callbacks(self._callbacks)
         self._runner.run()
 
-    def log(self, value, level=INFO):
+    def log(self, value, level=INFO, compact=False):
         """Write a value to KATANA logs.
 
         Given value is converted to string before being logged.
+        The value is not converted when the logging level is disabled.
 
         Output is truncated to have a maximum of 100000 characters.
 
+        :param value: The value to log.
+        :type value: object
+        :param level: Optional logging level.
+        :type level: int
+        :param compact: Optional flag to log dictionaries and lists
+                        as compact JSON.
+        :type compact: bool
+
         """
 
-        self.__logger.log(level, value_to_log_string(value))
+        if self.__logger.isEnabledFor(level):
+            self.__logger.log(
+                level,
+                value_to_log_string(value, compact=compact),
+                )
@@ -0,0 +1,646 @@
+"""
+Python 2 SDK for the KATANA(tm) Framework (http://katana.kusanagi.io)
+
+Copyright (c) 2016-2018 KUSANAGI S.L. All rights reserved.
+
+Distributed under the MIT license.
+
+For the full copyright and license information, please view the LICENSE
+file that was distributed with this source code.
+
+"""
+from __future__ import absolute_import
+
+import logging
+import os
+import signal
+import time
+
+import katana.payload
+
+from ..logging import DEFAULT_QUEUE_SIZE
+from ..logging import disable_logging
+from ..logging import flush_logging
+from ..logging import set_request_sampling
+from ..logging import set_structured_logging
+from ..logging import setup_katana_logging
+from ..logging import SYSLOG_NUMERIC
+from ..middleware import MiddlewareServer
+from ..server import IdleCollector
+from ..service import ServiceServer
+from ..utils import EXIT_ERROR
+from ..utils import EXIT_OK
+from ..utils import ipc
+from .component import ComponentError
+from .middleware import Middleware
+from .runner import apply_cli_options
+from .runner import is_zmq_error
+from .runner import key_value_strings_callback
+from .service import Service
+
+__license__ = "MIT"
+__copyright__ = "Copyright (c) 2016-2018 KUSANAGI S.L. (http://kusanagi.io)"
+
+LOG = logging.getLogger(__name__)
+
+
+def create_component(cls):
+    """Create a component that is not the global component instance.
+
+    :param cls: A component class.
+    :type cls: class
+
+    :rtype: Component
+
+    """
+
+    return cls.new_instance()
+
+
+class HostedComponent(object):
+    """Component that runs inside a component host.
+
+    It is used as the runner of the component, so when the component
+    runs it only saves the callbacks to be used by the host.
+
+    """
+
+    def __init__(self, component, server_cls, name, version, **kwargs):
+        """Constructor.
+
+        :param component: The component to host.
+        :type component: Component
+        :param server_cls: Class for the component server.
+        :type server_cls: ComponentServer
+        :param name: Component name.
+        :type name: str
+        :param version: Component version.
+        :type version: str
+        :param channel: Optional channel to listen for requests.
+        :type channel: str
+        :param max_concurrency: Optional limit of requests processed at once.
+        :type max_concurrency: int
+
+        """
+
+        self.component = component
+        self.server_cls = server_cls
+        self.name = name
+        self.version = version
+        self.channel = kwargs.get('channel') or ipc(
+            server_cls.get_type(),
+            name,
+            version,
+            )
+        self.max_concurrency = kwargs.get('max_concurrency')
+        self.callbacks = {}
+        self.startup_callback = None
+        self.shutdown_callback = None
+        self.error_callback = None
+        self.server = None
+
+        component._runner = self
+
+    def set_startup_callback(self, callback):
+        self.startup_callback = callback
+
+    def set_shutdown_callback(self, callback):
+        self.shutdown_callback = callback
+
+    def set_error_callback(self, callback):
+        self.error_callback = callback
+
+    def set_callbacks(self, callbacks):
+        self.callbacks = callbacks
+
+    # Process settings are defined by the host for all the components
+    def set_reload_signal(self, signum):
+        """Ignore the reload signal.
+
+        Hosted components share the process, so the source file of a
+        single component can't be executed again.
+
+        :param signum: A signal number.
+        :type signum: int
+
+        """
+
+        LOG.warning('Reload is not supported by hosted components')
+
+    def set_grace_period(self, seconds):
+        """Ignore the grace period of the component.
+
+        The host waits for the requests of all the components on
+        shutdown, so the grace period is given to the `ComponentHost`.
+
+        :param seconds: Number of seconds to wait.
+        :type seconds: float
+
+        """
+
+        LOG.warning('Use the host to set the grace period')
+
+    def set_recycling(self, max_requests=None, max_memory=None):
+        """Ignore the recycling limits of the component.
+
+        Hosted components share the process, so a single component
+        can't recycle it.
+
+        :param max_requests: Optional number of requests before recycling.
+        :type max_requests: int
+        :param max_memory: Optional resident memory in bytes before recycling.
+        :type max_memory: int
+
+        """
+
+        LOG.warning('Recycling is not supported by hosted components')
+
+    def set_idle_gc(self, threshold_factor=10):
+        """Ignore the idle garbage collection of the component.
+
+        The collection runs when none of the hosted components are
+        processing requests, so it is enabled in the host.
+
+        :param threshold_factor: Factor to raise the collection thresholds.
+        :type threshold_factor: int
+
+        """
+
+        LOG.warning('Use the host to set the idle garbage collection')
+
+    def set_log_queue(self, size=DEFAULT_QUEUE_SIZE, block=False):
+        """Ignore the logging queue of the component.
+
+        All the hosted components write their logs with the same
+        handler, so the queue is set in the host.
+
+        :param size: Optional maximum number of records in the queue.
+        :type size: int
+        :param block: Optional flag to wait when the queue is full.
+        :type block: bool
+
+        """
+
+        LOG.warning('Use the host to set the logging queue')
+
+    def set_request_sampling(self, rate):
+        """Ignore the request sampling rate of the component.
+
+        The rate applies to all the components of the process, so it
+        is set in the host.
+
+        :param rate: The rate of requests to log, between 0 and 1.
+        :type rate: float
+
+        """
+
+        LOG.warning('Use the host to set the request sampling')
+
+    def set_structured_logging(self, enabled=True):
+        """Ignore the structured logging setting of the component.
+
+        All the hosted components write their logs with the same
+        handler, so structured logging is enabled in the host.
+
+        :param enabled: Optional flag to enable JSON lines.
+        :type enabled: bool
+
+        """
+
+        LOG.warning('Use the host to set the structured logging')
+
+    def run(self):
+        """Prepare the component to be run by the host."""
+
+    def get_metrics(self):
+        """Get the request metrics of the component.
+
+        :rtype: dict
+
+        """
+
+        return self.server.get_metrics() if self.server else {}
+
+
+class ComponentHost(object):
+    """Runs many components in a single process.
+
+    All the components share the same event loop, thread pool and ZMQ
+    context, and each component listens for requests in its own
+    channel, which by default is the IPC socket that the framework
+    uses for the component name and version.
+
+    """
+
+    def __init__(self, pool_size=None, grace_period=None):
+        """Constructor.
+
+        :param pool_size: Optional size of the shared thread pool.
+        :type pool_size: int
+        :param grace_period: Optional seconds to wait for the current
+                             requests on shutdown.
+        :type grace_period: float
+
+        """
+
+        self.__components = []
+        self.__pool_size = pool_size
+        self.__grace_period = grace_period
+        self.__stopping = False
+        self.__gc_collector = None
+        self.__log_queue = {'queue_size': DEFAULT_QUEUE_SIZE, 'block': False}
+        self._args = {}
+        self.source_file = None
+        self.help = 'Host to run many Service and Middleware components'
+
+    @property
+    def args(self):
+        """Command line arguments.
+
+        :rtype: dict
+
+        """
+
+        return self._args
+
+    def __add(self, cls, server_cls, name, version, kwargs):
+        for hosted in self.__components:
+            if (hosted.name, hosted.version) == (name, version):
+                raise ComponentError(
+                    'Component already hosted: "{}" ({})'.format(name, version)
+                    )
+
+        component = create_component(cls)
+        self.__components.append(HostedComponent(
+            component,
+            server_cls,
+            name,
+            version,
+            **kwargs
+            ))
+        return component
+
+    def service(self, name, version, **kwargs):
+        """Add a Service to the host.
+
+        :param name: Service name.
+        :type name: str
+        :param version: Service version.
+        :type version: str
+        :param channel: Optional channel to listen for requests.
+        :type channel: str
+        :param max_concurrency: Optional limit of requests processed at once.
+        :type max_concurrency: int
+
+        :raises: ComponentError
+
+        :rtype: Service
+
+        """
+
+        return self.__add(Service, ServiceServer, name, version, kwargs)
+
+    def middleware(self, name, version, **kwargs):
+        """Add a Middleware to the host.
+
+        :param name: Middleware name.
+        :type name: str
+        :param version: Middleware version.
+        :type version: str
+        :param channel: Optional channel to listen for requests.
+        :type channel: str
+        :param max_concurrency: Optional limit of requests processed at once.
+        :type max_concurrency: int
+
+        :raises: ComponentError
+
+        :rtype: Middleware
+
+        """
+
+        return self.__add(Middleware, MiddlewareServer, name, version, kwargs)
+
+    def get_components(self):
+        """Get the hosted components.
+
+        :returns: A list of `HostedComponent`.
+        :rtype: list
+
+        """
+
+        return list(self.__components)
+
+    def get_metrics(self):
+        """Get the request metrics of each component.
+
+        :returns: The metrics by component name and version.
+        :rtype: dict
+
+        """
+
+        return {
+            (hosted.name, hosted.version): hosted.get_metrics()
+            for hosted in self.__components
+            }
+
+    def get_argument_options(self):
+        """Get command line argument options.
+
+        :rtype: list.
+
+        """
+
+        import click
+
+        return [
+            click.option(
+                '-d', '--disable-compact-names',
+                is_flag=True,
+                help='Use full property names in payloads.',
+                ),
+            click.option(
+                '-D', '--debug',
+                is_flag=True,
+                help='Enable component debug.',
+                ),
+            click.option(
+                '-L', '--log-level',
+                help=(
+                    'Enable a logging using a numeric Syslog severity '
+                    'value to set the level.'
+                    ),
+                type=click.IntRange(0, 7, clamp=True),
+                ),
+            click.option(
+                '-n', '--name',
+                required=True,
+                help='Host name.',
+                ),
+            click.option(
+                '-p', '--framework-version',
+                required=True,
+                help='KATANA framework version.',
+                ),
+            click.option(
+                '-T', '--timeout',
+                help='Process execution timeout per request in milliseconds.',
+                type=click.INT,
+                default=30000,
+                ),
+            click.option(
+                '-v', '--version',
+                required=True,
+                help='Host version.',
+                ),
+            click.option(
+                '-V', '--var',
+                multiple=True,
+                callback=key_value_strings_callback,
+                help='Component variables.',
+                ),
+            ]
+
+    def set_idle_gc(self, threshold_factor=10):
+        """Run the garbage collection when no component has requests.
+
+        :param threshold_factor: Optional factor to raise the collection
+                                 thresholds while there are requests.
+        :type threshold_factor: int
+
+        """
+
+        self.__gc_collector = IdleCollector(threshold_factor)
+
+    def set_log_queue(self, size=DEFAULT_QUEUE_SIZE, block=False):
+        """Set the queue used to write the logs in a background thread.
+
+        :param size: Optional maximum number of records in the queue.
+                     When it is zero the logs are written by the caller.
+        :type size: int
+        :param block: Optional flag to wait when the queue is full,
+                      instead of dropping the log records.
+        :type block: bool
+
+        """
+
+        self.__log_queue = {'queue_size': size, 'block': block}
+
+    def set_request_sampling(self, rate):
+        """Set the rate of requests that are logged.
+
+        :param rate: The rate of requests to log, between 0 and 1.
+        :type rate: float
+
+        :raises: ValueError
+
+        """
+
+        set_request_sampling(rate)
+
+    def set_structured_logging(self, enabled=True):
+        """Enable or disable writing logs as JSON lines.
+
+        It must be called before the host runs.
+
+        :param enabled: Optional flag to enable JSON lines.
+        :type enabled: bool
+
+        """
+
+        set_structured_logging(enabled)
+
+    def get_grace_period(self):
+        """Get the time to wait for the current requests on shutdown.
+
+        By default it is the request execution timeout.
+
+        :rtype: float
+
+        """
+
+        if self.__grace_period is not None:
+            return self.__grace_period
+
+        return self._args.get('timeout', 30000) / 1000.0
+
+    def drain(self):
+        """Stop receiving requests and wait for the current requests.
+
+        All the components stop receiving requests at once, and then
+        the current requests have the grace period to finish.
+
+        :returns: False when there are requests after the grace period.
+        :rtype: bool
+
+        """
+
+        servers = [
+            hosted.server for hosted in self.__components if hosted.server
+            ]
+        for server in servers:
+            server.drain(0)
+
+        deadline = time.time() + self.get_grace_period()
+        drained = True
+        for server in servers:
+            if not server.drain(max(deadline - time.time(), 0)):
+                drained = False
+
+        return drained
+
+    def run(self):
+        """Run the hosted components.
+
+        Calling this method checks command line arguments before the
+        components start, and then blocks the caller script until all
+        the components finish.
+
+        """
+
+        return self._run()
+
+    @apply_cli_options
+    def _run(self, **kwargs):
+        import gevent
+        import zmq.green
+
+        from gevent.threadpool import ThreadPool
+        from multiprocessing import cpu_count
+
+        log_level = kwargs.get('log_level')
+        if log_level in SYSLOG_NUMERIC:
+            setup_katana_logging(
+                'host',
+                kwargs['name'],
+                kwargs['version'],
+                kwargs['framework_version'],
+                SYSLOG_NUMERIC[log_level],
+                **self.__log_queue
+                )
+        else:
+            disable_logging()
+
+        self._args = kwargs
+
+        if kwargs.get('disable_compact_names'):
+            katana.payload.DISABLE_FIELD_MAPPINGS = True
+
+        LOG.debug('Using PID: "%s"', os.getpid())
+
+        # Resources shared by all the component servers
+        pool = ThreadPool(self.__pool_size or cpu_count() * 5)
+        context = zmq.green.Context()
+        context.linger = 0
+
+        for hosted in self.__components:
+            # Save the component callbacks in the hosted component
+            hosted.component.run()
+
+            args = dict(kwargs)
+            args['name'] = hosted.name
+            args['version'] = hosted.version
+            args['component'] = hosted.server_cls.get_type()
+            hosted.server = hosted.server_cls(
+                hosted.callbacks,
+                args,
+                debug=kwargs.get('debug', False),
+                source_file=self.source_file,
+                error_callback=hosted.error_callback,
+                component=hosted.component,
+                pool=pool,
+                context=context,
+                max_concurrency=hosted.max_concurrency,
+                gc_collector=self.__gc_collector,
+                )
+
+        exit_code = EXIT_OK
+
+        for hosted in self.__components:
+            if not hosted.startup_callback:
+                continue
+
+            LOG.info('Running startup callback for "%s" ...', hosted.name)
+            try:
+                hosted.startup_callback(hosted.component)
+            except:
+                LOG.exception('Startup callback failed')
+                LOG.error('Component failed')
+                exit_code = EXIT_ERROR
+                break
+            finally:
+                # Return the pooled resources used by the callback
+                hosted.component.release_resources()
+
+        if exit_code != EXIT_ERROR:
+            greenlets = []
+
+            def stop(*args):
+                gevent.killall(greenlets, block=False)
+
+            def drain_and_stop():
+                if not self.__stopping:
+                    self.__stopping = True
+                    LOG.info('Stopping components ...')
+                    if not self.drain():
+                        LOG.warning(
+                            'Grace period ended before all the requests '
+                            'finished'
+                            )
+
+                stop()
+
+            for hosted in self.__components:
+                greenlet = gevent.spawn(hosted.server.listen, hosted.channel)
+                # When a component fails all the components are stopped
+                greenlet.link_exception(stop)
+                greenlets.append(greenlet)
+
+            # Listen for SIGTERM and SIGINT
+            gevent.signal(signal.SIGTERM, drain_and_stop)
+            gevent.signal(signal.SIGINT, drain_and_stop)
+            gevent.joinall(greenlets)
+
+            for hosted, greenlet in zip(self.__components, greenlets):
+                err = greenlet.exception
+                if not err:
+                    continue
+
+                exit_code = EXIT_ERROR
+                if is_zmq_error(err) and err.errno == 98:
+                    LOG.error('Address unavailable: "%s"', hosted.channel)
+                else:
+                    LOG.error(err)
+
+                LOG.error('Component failed: "%s"', hosted.name)
+
+            for hosted in self.__components:
+                LOG.info(
+                    'Request metrics for "%s" (%s): %s',
+                    hosted.name,
+                    hosted.version,
+                    hosted.get_metrics(),
+                    )
+
+        # Write the logs before the shutdown callbacks run
+        flush_logging()
+
+        for hosted in self.__components:
+            if not hosted.shutdown_callback:
+                continue
+
+            LOG.info('Running shutdown callback for "%s" ...', hosted.name)
+            try:
+                hosted.shutdown_callback(hosted.component)
+            except:
+                LOG.exception('Shutdown callback failed')
+                LOG.error('Component failed')
+                exit_code = EXIT_ERROR
+            finally:
+                hosted.component.release_resources()
+
+        if exit_code == EXIT_OK:
+            LOG.info('Operation complete')
+
+        # Write pending logs because exit skips the cleanup handlers
+        flush_logging()
+        os._exit(exit_code)
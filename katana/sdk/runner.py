@@ -12,21 +12,23 @@ file that was distributed with this source code.
 from __future__ import absolute_import
 
 import functools
-import inspect
 import json
 import logging
 import os
 import signal
+import sys
 
-import click
-import gevent
 import katana.payload
-import zmq.green
 
 from ..errors import KatanaError
+from ..logging import DEFAULT_QUEUE_SIZE
 from ..logging import disable_logging
+from ..logging import flush_logging
+from ..logging import set_request_sampling
+from ..logging import set_structured_logging
 from ..logging import setup_katana_logging
 from ..logging import SYSLOG_NUMERIC
+from ..server import IdleCollector
 from ..utils import EXIT_ERROR
 from ..utils import EXIT_OK
 from ..utils import ipc
@@ -47,6 +49,8 @@ def key_value_strings_callback(ctx, param, values):
 
     """
 
+    import click
+
     params = {}
     if not values:
         return params
@@ -62,6 +66,23 @@ def key_value_strings_callback(ctx, param, values):
     return params
 
 
+def is_zmq_error(err):
+    """Check if an exception was raised by ZMQ.
+
+    ZMQ is only imported when the component listens for requests, so
+    when it is not imported the exception can't be a ZMQ error.
+
+    :param err: An exception.
+    :type err: Exception
+
+    :rtype: bool
+
+    """
+
+    module = sys.modules.get('zmq.error')
+    return module is not None and isinstance(err, module.ZMQError)
+
+
 def apply_cli_options(run_method):
     """Decorator to apply command line options to `run` method.
 
@@ -71,10 +92,11 @@ def apply_cli_options(run_method):
 
     @functools.wraps(run_method)
     def wrapper(self):
+        import click
+
         # Create a command object to run the SDK component.
         # Component caller source file name is used as command name.
-        caller_frame = inspect.getouterframes(inspect.currentframe())[2]
-        self.source_file = caller_frame[1]
+        self.source_file = sys._getframe(2).f_code.co_filename
         command = click.command(name=self.source_file, help=self.help)
 
         # Run method is called when command line options are valid
@@ -117,6 +139,12 @@ class ComponentRunner(object):
         self.__startup_callback = None
         self.__shutdown_callback = None
         self.__error_callback = None
+        self.__reload_signal = None
+        self.__grace_period = None
+        self.__stopping = False
+        self.__recycling = {}
+        self.__gc_collector = None
+        self.__log_queue = {'queue_size': DEFAULT_QUEUE_SIZE, 'block': False}
         self._args = {}
         self.component = component
         self.source_file = None
@@ -224,6 +252,8 @@ class ComponentRunner(object):
 
         """
 
+        import click
+
         return [
             click.option(
                 '-A', '--action',
@@ -334,6 +364,190 @@ class ComponentRunner(object):
 
         self.callbacks = callbacks
 
+    def set_reload_signal(self, signum):
+        """Set a signal to reload the message callbacks.
+
+        Only the component source file is executed again, and the
+        modules it imports are not reloaded.
+
+        :param signum: A signal number.
+        :type signum: int
+
+        """
+
+        self.__reload_signal = signum
+
+    def set_recycling(self, max_requests=None, max_memory=None):
+        """Set the limits to recycle the component process.
+
+        :param max_requests: Optional number of requests before recycling.
+        :type max_requests: int
+        :param max_memory: Optional resident memory in bytes before recycling.
+        :type max_memory: int
+
+        """
+
+        self.__recycling = {
+            'max_requests': max_requests,
+            'max_memory': max_memory,
+            }
+
+    def recycle(self):
+        """Replace the component process with a new one.
+
+        The new process runs the component with the same command line
+        arguments, and keeps the process ID.
+
+        """
+
+        LOG.info('Recycling component process ...')
+        flush_logging()
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    def set_idle_gc(self, threshold_factor=10):
+        """Run the garbage collection when there are no requests.
+
+        :param threshold_factor: Optional factor to raise the collection
+                                 thresholds while there are requests.
+        :type threshold_factor: int
+
+        """
+
+        self.__gc_collector = IdleCollector(threshold_factor)
+
+    def set_log_queue(self, size=DEFAULT_QUEUE_SIZE, block=False):
+        """Set the queue used to write the logs in a background thread.
+
+        :param size: Optional maximum number of records in the queue.
+                     When it is zero the logs are written by the caller.
+        :type size: int
+        :param block: Optional flag to wait when the queue is full,
+                      instead of dropping the log records.
+        :type block: bool
+
+        """
+
+        self.__log_queue = {'queue_size': size, 'block': block}
+
+    def set_request_sampling(self, rate):
+        """Set the rate of requests that are logged.
+
+        :param rate: The rate of requests to log, between 0 and 1.
+        :type rate: float
+
+        :raises: ValueError
+
+        """
+
+        set_request_sampling(rate)
+
+    def set_structured_logging(self, enabled=True):
+        """Enable or disable writing logs as JSON lines.
+
+        It must be called before the component runs.
+
+        :param enabled: Optional flag to enable JSON lines.
+        :type enabled: bool
+
+        """
+
+        set_structured_logging(enabled)
+
+    def set_grace_period(self, seconds):
+        """Set the time to wait for the current requests on shutdown.
+
+        :param seconds: Number of seconds to wait.
+        :type seconds: float
+
+        """
+
+        self.__grace_period = seconds
+
+    def get_grace_period(self):
+        """Get the time to wait for the current requests on shutdown.
+
+        By default it is the request execution timeout.
+
+        :rtype: float
+
+        """
+
+        if self.__grace_period is not None:
+            return self.__grace_period
+
+        return self._args.get('timeout', 30000) / 1000.0
+
+    def stop_server(self, server, greenlet):
+        """Stop the server after the current requests finish.
+
+        The server stops receiving requests and the current requests
+        have the grace period to finish. When the server is already
+        stopping it is stopped without waiting.
+
+        :param server: The component server.
+        :type server: ComponentServer
+        :param greenlet: The greenlet that runs the server.
+        :type greenlet: gevent.Greenlet
+
+        """
+
+        if self.__stopping:
+            greenlet.kill()
+            return
+
+        self.__stopping = True
+        LOG.info('Stopping component ...')
+        if not server.drain(self.get_grace_period()):
+            LOG.warning('Grace period ended before all the requests finished')
+
+        greenlet.kill()
+
+    def reload_callbacks(self, server):
+        """Reload the message callbacks from the component source file.
+
+        The source file is executed again while the component is marked
+        as reloading, so running the component only updates the
+        callbacks. The server callbacks are replaced at once when the
+        file is executed without errors, otherwise the current callbacks
+        are kept.
+
+        :param server: The component server.
+        :type server: ComponentServer
+
+        :returns: True when the callbacks are reloaded.
+        :rtype: bool
+
+        """
+
+        import runpy
+
+        LOG.info('Reloading callbacks from: "%s"', self.source_file)
+        component = self.component
+        callbacks = component._callbacks
+        # Callbacks are set to a new dictionary because the current one
+        # is used by the server to process the requests.
+        component._callbacks = {}
+        component._reloading = True
+        try:
+            runpy.run_path(self.source_file, run_name='__main__')
+        except BaseException:
+            LOG.exception('Failed to reload callbacks')
+            component._callbacks = callbacks
+            return False
+        finally:
+            component._reloading = False
+
+        if not component._callbacks:
+            LOG.error('Failed to reload callbacks: No callbacks were found')
+            component._callbacks = callbacks
+            return False
+
+        self.callbacks = component._callbacks
+        server.error_callback = self.__error_callback
+        server.callbacks = self.callbacks
+        LOG.info('Callbacks reloaded')
+        return True
+
     @apply_cli_options
     def run(self, **kwargs):
         """Run SDK component server.
@@ -344,7 +558,9 @@ class ComponentRunner(object):
 
         """
 
-        # Initialize component logging
+        # Initialize component logging. Logs are written by a thread
+        # so the requests are not blocked by the output stream, and by
+        # default records are dropped when the logging queue is full.
         log_level = kwargs.get('log_level')
         if log_level in SYSLOG_NUMERIC:
             setup_katana_logging(
@@ -353,6 +569,7 @@ class ComponentRunner(object):
                 kwargs['version'],
                 kwargs['framework_version'],
                 SYSLOG_NUMERIC[log_level],
+                **self.__log_queue
                 )
         else:
             # No logs are printed when log-level is not available
@@ -361,6 +578,8 @@ class ComponentRunner(object):
         # Standard input is read only when action name is given
         message = {}
         if kwargs.get('action'):
+            import click
+
             contents = click.get_text_stream('stdin', encoding='utf8').read()
 
             # Add JSON file contents to message
@@ -386,6 +605,8 @@ class ComponentRunner(object):
             debug=self.debug,
             source_file=self.source_file,
             error_callback=self.__error_callback,
+            gc_collector=self.__gc_collector,
+            **self.__recycling
             )
 
         LOG.debug('Using PID: "%s"', os.getpid())
@@ -400,6 +621,7 @@ class ComponentRunner(object):
 
         # By default exit successfully
         exit_code = EXIT_OK
+        recycle = False
 
         # Call startup callback
         if self.__startup_callback:
@@ -410,36 +632,62 @@ class ComponentRunner(object):
                 LOG.exception('Startup callback failed')
                 LOG.error('Component failed')
                 exit_code = EXIT_ERROR
+            finally:
+                # Return the pooled resources used by the callback
+                self.component.release_resources()
 
         # Run component server
         if exit_code != EXIT_ERROR:
+            import gevent
+
             try:
                 # Create a greenlet to run server
                 if message:
                     greenlet = gevent.spawn(server.process_input, message)
+                    stop = (greenlet.kill, )
                 else:
                     greenlet = gevent.spawn(server.listen, channel)
+                    stop = (self.stop_server, server, greenlet)
 
                 # Listen for SIGTERM and SIGINT
-                gevent.signal(signal.SIGTERM, greenlet.kill)
-                gevent.signal(signal.SIGINT, greenlet.kill)
+                gevent.signal(signal.SIGTERM, *stop)
+                gevent.signal(signal.SIGINT, *stop)
+
+                if self.__reload_signal and not message:
+                    # Reload in a thread to avoid blocking the requests
+                    threadpool = gevent.get_hub().threadpool
+                    gevent.signal(
+                        self.__reload_signal,
+                        threadpool.spawn,
+                        self.reload_callbacks,
+                        server,
+                        )
+
                 # Run server
                 greenlet.join()
+                # The server stops by itself when it must be recycled
+                if self.__recycling and not message:
+                    recycle = server.is_recycling()
             except KatanaError as err:
                 exit_code = EXIT_ERROR
                 LOG.error(err)
                 LOG.error('Component failed')
-            except zmq.error.ZMQError as err:
+            except Exception as err:
                 exit_code = EXIT_ERROR
-                if err.errno == 98:
+                if not is_zmq_error(err):
+                    LOG.exception('Component failed')
+                elif err.errno == 98:
                     LOG.error('Address unavailable: "%s"', self.socket_name)
+                    LOG.error('Component failed')
                 else:
                     LOG.error(err.strerror)
+                    LOG.error('Component failed')
 
-                LOG.error('Component failed')
-            except Exception:
-                exit_code = EXIT_ERROR
-                LOG.exception('Component failed')
+        if not message:
+            LOG.info('Request metrics: %s', server.get_metrics())
+
+        # Write the logs before the shutdown callback runs
+        flush_logging()
 
         # Call shutdown callback
         if self.__shutdown_callback:
@@ -450,8 +698,16 @@ class ComponentRunner(object):
                 LOG.exception('Shutdown callback failed')
                 LOG.error('Component failed')
                 exit_code = EXIT_ERROR
+            finally:
+                # Return the pooled resources used by the callback
+                self.component.release_resources()
 
         if exit_code == EXIT_OK:
+            if recycle:
+                self.recycle()
+
             LOG.info('Operation complete')
 
+        # Write pending logs because exit skips the cleanup handlers
+        flush_logging()
         os._exit(exit_code)
@@ -13,6 +13,8 @@ from __future__ import absolute_import
 
 import datetime
 import decimal
+import os
+import struct
 import time
 
 import msgpack
@@ -23,6 +25,10 @@ from .payload import Payload
 __license__ = "MIT"
 __copyright__ = "Copyright (c) 2016-2018 KUSANAGI S.L. (http://kusanagi.io)"
 
+# Type byte and header format for msgpack arrays with a 32 bit length
+ARRAY32 = 0xdd
+ARRAY32_HEADER = struct.Struct('>BI')
+
 
 def encode(obj):
     """Handle packing for custom types."""
@@ -68,16 +74,76 @@ def decode(data):
     return data
 
 
+def pack_stream(obj, buffer):
+    """Pack the items of a streamed value as an array into a buffer.
+
+    Each item is packed and written to the buffer when it is read from
+    the stream, so only the packed items are kept in memory, and not
+    the item values.
+
+    The array is packed with a 32 bit header because the number of
+    items is only known after the stream is consumed.
+
+    :param obj: An object with a `__stream__` method.
+    :type obj: object
+    :param buffer: The buffer where the packed array is written.
+    :type buffer: bytearray
+
+    :returns: The number of items packed.
+    :rtype: int
+
+    """
+
+    start = len(buffer)
+    buffer.extend(ARRAY32_HEADER.pack(ARRAY32, 0))
+    count = 0
+    for item in obj.__stream__():
+        buffer.extend(pack(item))
+        count += 1
+
+    buffer[start:start + ARRAY32_HEADER.size] = ARRAY32_HEADER.pack(
+        ARRAY32,
+        count,
+        )
+    return count
+
+
 def pack(data):
     """Pack python data to a binary stream.
 
+    Values with a `__stream__` method, like lazy collections, are packed
+    as arrays after the rest of the data, one item at a time.
+
     :param data: A python object to pack.
 
     :rtype: bytes.
 
     """
 
-    return msgpack.packb(data, default=encode, encoding='utf-8')
+    streams = []
+
+    def default(obj):
+        if not hasattr(obj, '__stream__'):
+            return encode(obj)
+
+        # Use a random marker as a placeholder for the streamed value
+        marker = os.urandom(16)
+        streams.append((marker, obj))
+        return marker
+
+    stream = msgpack.packb(data, default=default, encoding='utf-8')
+    if not streams:
+        return stream
+
+    # Markers are found in the stream in the same order they were packed
+    buffer = bytearray()
+    for marker, obj in streams:
+        head, stream = stream.split(msgpack.packb(marker), 1)
+        buffer.extend(head)
+        pack_stream(obj, buffer)
+
+    buffer.extend(stream)
+    return bytes(buffer)
 
 
 def unpack(stream):
@@ -11,17 +11,14 @@ file that was distributed with this source code.
 """
 from __future__ import absolute_import
 
+import gc
 import logging
 import os
 import sys
+import threading
+import time
 
 from collections import namedtuple
-from multiprocessing import cpu_count
-
-import gevent
-import zmq.green
-
-from gevent.threadpool import ThreadPool
 
 from .errors import KatanaError
 from .json import serialize
@@ -33,6 +30,7 @@ from .payload import Payload
 from .schema import get_schema_registry
 from .serialization import pack
 from .serialization import unpack
+from .utils import get_rss
 
 __license__ = "MIT"
 __copyright__ = "Copyright (c) 2016-2018 KUSANAGI S.L. (http://kusanagi.io)"
@@ -52,6 +50,181 @@ META_VALUES = (EMPTY_META, SE, FI, TR, DL)
 # Multipart request frames
 Frames = namedtuple('Frames', ['action', 'mappings', 'stream'])
 
+# Result of a request processed without sockets
+Reply = namedtuple('Reply', ['meta', 'payload'])
+
+
+class ServerMetrics(object):
+    """Request metrics for a component server.
+
+    Metrics are counters that can be updated from any thread.
+
+    """
+
+    # Metric names
+    NAMES = (
+        'requests',  # Requests received
+        'active',  # Requests being processed
+        'errors',  # Requests where the userland callback failed
+        'timeouts',  # Requests that timed out
+        'rejected',  # Requests that didn't get a slot before timing out
+        'duration',  # Total processing time in milliseconds
+        )
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__values = dict.fromkeys(self.NAMES, 0)
+
+    def add(self, name, value=1):
+        """Add a value to a metric.
+
+        :param name: The metric name.
+        :type name: str
+        :param value: Optional value to add.
+        :type value: int
+
+        """
+
+        with self.__lock:
+            self.__values[name] += value
+
+    def get(self):
+        """Get the current metric values.
+
+        :rtype: dict
+
+        """
+
+        with self.__lock:
+            return dict(self.__values)
+
+
+class IdleCollector(object):
+    """Runs the cyclic garbage collector when there are no requests.
+
+    While requests are being processed the collection thresholds are
+    raised, so automatic collections happen less often, and when the
+    last request finishes the generations that reached the original
+    thresholds are collected.
+
+    A collector can be shared by many servers, in which case it only
+    collects when none of the servers is processing requests.
+
+    """
+
+    def __init__(self, threshold_factor=10):
+        """Constructor.
+
+        When the threshold factor is zero the automatic collection is
+        disabled while the servers are running, so the memory used by
+        reference cycles is only released when the servers are idle.
+
+        :param threshold_factor: Optional factor to raise the thresholds.
+        :type threshold_factor: int
+
+        """
+
+        self.__factor = threshold_factor
+        self.__thresholds = None
+        self.__enabled = None
+        self.__servers = 0
+        self.__active = 0
+        self.__values = {
+            'gc_collections': 0,  # Collections run by the collector
+            'gc_full_collections': 0,  # Collections of the oldest generation
+            'gc_pause': 0,  # Total collection time in milliseconds
+            'gc_max_pause': 0,  # Longest collection time in milliseconds
+            }
+
+    def start(self):
+        """Raise the collection thresholds for a server that starts."""
+
+        if not self.__servers:
+            self.__thresholds = gc.get_threshold()
+            self.__enabled = gc.isenabled()
+            if not self.__factor:
+                gc.disable()
+            elif self.__thresholds[0]:
+                gc.set_threshold(*[
+                    value * self.__factor for value in self.__thresholds
+                    ])
+
+        self.__servers += 1
+
+    def stop(self):
+        """Restore the collection thresholds when the last server stops."""
+
+        if not self.__servers:
+            return
+
+        self.__servers -= 1
+        if not self.__servers:
+            gc.set_threshold(*self.__thresholds)
+            if self.__enabled:
+                gc.enable()
+
+    def enter(self):
+        """Mark the start of a request."""
+
+        self.__active += 1
+
+    def leave(self, requests=1):
+        """Mark the end of requests and collect when there are no more.
+
+        :param requests: Optional number of requests that ended.
+        :type requests: int
+
+        """
+
+        self.__active = max(self.__active - requests, 0)
+        if not self.__active:
+            self.collect()
+
+    def collect(self):
+        """Collect the generations that reached the original thresholds.
+
+        The oldest generation whose count is higher than its threshold
+        is collected, like the automatic collection does.
+
+        :returns: The collected generation, or None.
+        :rtype: int
+
+        """
+
+        thresholds = self.__thresholds or gc.get_threshold()
+        # A zero threshold means that the automatic collection is disabled
+        if not thresholds[0]:
+            return
+
+        counts = gc.get_count()
+        for generation in (2, 1, 0):
+            if counts[generation] > thresholds[generation]:
+                break
+        else:
+            return
+
+        start = time.time()
+        gc.collect(generation)
+        pause = round((time.time() - start) * 1000, 3)
+
+        values = self.__values
+        values['gc_collections'] += 1
+        if generation == 2:
+            values['gc_full_collections'] += 1
+
+        values['gc_pause'] += pause
+        values['gc_max_pause'] = max(values['gc_max_pause'], pause)
+        return generation
+
+    def get_metrics(self):
+        """Get the garbage collection metrics.
+
+        :rtype: dict
+
+        """
+
+        return dict(self.__values)
+
 
 def create_error_response(message, *args, **kwargs):
     """Create a new multipart error response.
@@ -84,13 +257,43 @@ class ComponentServer(object):
         :type error_callback: function
         :param source_file: Full path to component source file.
         :type source_file: str
+        :param pool: Optional thread pool to share between servers.
+        :type pool: gevent.threadpool.ThreadPool
+        :param context: Optional ZMQ context to share between servers.
+        :type context: zmq.green.Context
+        :param max_concurrency: Optional limit of requests processed at once.
+        :type max_concurrency: int
+        :param max_requests: Optional number of requests before recycling.
+        :type max_requests: int
+        :param max_memory: Optional resident memory in bytes before recycling.
+        :type max_memory: int
+        :param gc_collector: Optional collector to run the garbage collection
+                             when there are no requests.
+        :type gc_collector: IdleCollector
 
         """
 
         self.__args = args
         self.__socket = None
+        self.__worker_socket = None
         self.__registry = get_schema_registry()
-        self._pool = ThreadPool(cpu_count() * 5)
+        # The thread pool is only needed when listening for requests
+        self._pool = kwargs.get('pool')
+        self.__context = kwargs.get('context')
+        self.__max_concurrency = kwargs.get('max_concurrency')
+        self.__slots = None
+        self.__metrics = ServerMetrics()
+        # Requests received that didn't send a response yet
+        self.__pending = 0
+        self.__drained = None
+        self.__receiving = False
+        self.__max_requests = kwargs.get('max_requests')
+        self.__max_memory = kwargs.get('max_memory')
+        self.__recycling = False
+        self.__gc_collector = kwargs.get('gc_collector')
+        self.__collecting = False
+        # Servers that share a ZMQ context need a different worker channel
+        self.__workers_channel = 'inproc://workers-{}'.format(id(self))
 
         self.callbacks = callbacks
         self.error_callback = kwargs.get('error_callback')
@@ -98,6 +301,10 @@ class ComponentServer(object):
 
         self.context = None
         self.poller = None
+        # Modules used while listening, which are imported by `listen()`
+        # to avoid importing them for each request.
+        self.__zmq = None
+        self.__timeout_error = None
 
     @staticmethod
     def get_type():
@@ -134,6 +341,61 @@ class ComponentServer(object):
     def component_title(self):
         return '"{}" ({})'.format(self.component_name, self.component_version)
 
+    @property
+    def max_concurrency(self):
+        return self.__max_concurrency
+
+    def is_recycling(self):
+        """Check if the server stopped to be recycled.
+
+        :rtype: bool
+
+        """
+
+        return self.__recycling
+
+    def __check_recycling(self):
+        # Check the limits that require the process to be recycled
+        if self.__max_requests:
+            requests = self.__metrics.get()['requests']
+            if requests >= self.__max_requests:
+                LOG.info('Recycling after %d requests', requests)
+                return True
+
+        if self.__max_memory:
+            rss = get_rss()
+            if rss >= self.__max_memory:
+                LOG.info('Recycling after using %d bytes of memory', rss)
+                return True
+
+        return False
+
+    def get_metrics(self):
+        """Get the request metrics of the server.
+
+        When there is a garbage collector the collection metrics are
+        included, which are shared by the servers using the collector.
+
+        :rtype: dict
+
+        """
+
+        metrics = self.__metrics.get()
+        if self.__gc_collector:
+            metrics.update(self.__gc_collector.get_metrics())
+
+        return metrics
+
+    def get_component(self):
+        """
+        Get the SDK component that handles the requests.
+
+        :rtype: Component
+
+        """
+
+        raise NotImplementedError()
+
     def create_error_payload(self, exc, component, **kwargs):
         """Create a payload for the error response.
 
@@ -205,9 +467,13 @@ class ComponentServer(object):
 
         """
 
+        # Mappings are sent with each request but they rarely change
+        if self.__registry.is_current(stream):
+            return
+
         LOG.debug('Updating schemas for Services ...')
         try:
-            self.__registry.update_registry(unpack(stream))
+            self.__registry.update_registry(unpack(stream), stream=stream)
         except:
             LOG.exception('Failed to update schemas')
 
@@ -219,11 +485,42 @@ class ComponentServer(object):
 
         """
 
-        socket = self.context.socket(zmq.PUSH)
-        socket.connect('inproc://workers')
+        socket = self.context.socket(self.__zmq.PUSH)
+        socket.connect(self.__workers_channel)
         socket.send_multipart(response)
         socket.close()
 
+    def __run_error_callback(self, error, rlog, action):
+        if not self.error_callback:
+            return
+
+        rlog.debug('Running error callback ...')
+        try:
+            self.error_callback(error)
+        except:
+            rlog.exception('Error callback failed for "%s"', action)
+
+    def __create_response(self, action, payload):
+        request_id = CommandPayload(payload).request_id
+        try:
+            payload = self.__process_request_payload(action, payload)
+            try:
+                stream = pack(payload)
+            except Exception as exc:
+                # Entities of lazy collections are validated while packing
+                self.__metrics.add('errors')
+                rlog = RequestLogger(request_id, __name__, action=action)
+                rlog.exception('Failed to pack the response')
+                self.__run_error_callback(exc, rlog, action)
+                error = ErrorPayload.new(str(exc)).entity()
+                return [EMPTY_META, pack(error)]
+        finally:
+            # Return the pooled resources used during the request after
+            # packing, because lazy collections can read from them.
+            self.get_component().release_resources()
+
+        return [self.get_response_meta(payload) or EMPTY_META, stream]
+
     def __process_request_payload(self, action, payload):
         # Call request handler and send response back
         cmd = CommandPayload(payload)
@@ -266,30 +563,59 @@ class ComponentServer(object):
             LOG.exception('Received an invalid message format')
             return create_error_response('Internal communication failed')
 
-        payload = self.__process_request_payload(action, payload)
-        return [self.get_response_meta(payload) or EMPTY_META, pack(payload)]
+        return self.__create_response(action, payload)
 
     def __process_request(self, stream, pid, timeout):
-        # Process request and get response stream.
-        # Request are processed inside a thread pool to avoid
-        # userland code to block requests.
-        res = self._pool.spawn(self.__process_request_stream, stream)
-
-        # Wait for a period of seconds to get the execution result
-        try:
-            response = res.get(timeout=timeout)
-        except gevent.Timeout:
+        metrics = self.__metrics
+        metrics.add('requests')
+        start = time.time()
+
+        # The frames before the request frames are the envelope with
+        # the identities of the client, and they are sent back with the
+        # response so the router socket can route it to the client.
+        size = len(Frames._fields)
+        envelope, stream = stream[:-size], stream[-size:]
+
+        # When there is a concurrency limit wait for a free slot
+        # during the request timeout.
+        if self.__slots and not self.__slots.acquire(timeout=timeout):
+            metrics.add('rejected')
             msg = 'SDK execution timed out after {}ms'.format(
                 int(timeout * 1000),
-                pid,
                 )
-            response = create_error_response(msg)
-            LOG.warn('{}. PID: {}'.format(msg, pid))
-        except:
-            LOG.exception('Failed to handle request. PID: %d', pid)
-            response = create_error_response('Failed to handle request')
+            LOG.warn('{}. Concurrency limit reached. PID: {}'.format(msg, pid))
+            self._send_response(envelope + create_error_response(msg))
+            return
+
+        metrics.add('active')
+        try:
+            # Process request and get response stream.
+            # Request are processed inside a thread pool to avoid
+            # userland code to block requests.
+            res = self._pool.spawn(self.__process_request_stream, stream)
+
+            # Wait for a period of seconds to get the execution result
+            try:
+                waited = time.time() - start
+                response = res.get(timeout=max(timeout - waited, 0))
+            except self.__timeout_error:
+                metrics.add('timeouts')
+                msg = 'SDK execution timed out after {}ms'.format(
+                    int(timeout * 1000),
+                    pid,
+                    )
+                response = create_error_response(msg)
+                LOG.warn('{}. PID: {}'.format(msg, pid))
+            except:
+                LOG.exception('Failed to handle request. PID: %d', pid)
+                response = create_error_response('Failed to handle request')
+        finally:
+            metrics.add('active', -1)
+            metrics.add('duration', int((time.time() - start) * 1000))
+            if self.__slots:
+                self.__slots.release()
 
-        self._send_response(response)
+        self._send_response(envelope + response)
 
     def process_payload(self, action, payload):
         """Process a request payload.
@@ -310,7 +636,7 @@ class ComponentServer(object):
 
         command_name = payload.get('command/name')
         # Create a request logger using the request ID from the command payload
-        rlog = RequestLogger(payload.request_id, __name__)
+        rlog = RequestLogger(payload.request_id, __name__, action=action)
         # Create a variable to hold extra command reply result values.
         # This is used for example to the request attributes.
         # Because extra is passed by reference any modification by the
@@ -324,9 +650,11 @@ class ComponentServer(object):
             return ErrorPayload.new('Internal communication failed').entity()
 
         error = None
+        start = time.time()
         try:
             component = self.callbacks[action](component)
         except KatanaError as exc:
+            self.__metrics.add('errors')
             error = exc
             payload = self.create_error_payload(
                 exc,
@@ -334,18 +662,23 @@ class ComponentServer(object):
                 payload=payload,
                 )
         except Exception as exc:
+            self.__metrics.add('errors')
             rlog.exception('Component failed')
             error = exc
             payload = ErrorPayload.new(str(exc)).entity()
         else:
             payload = self.component_to_payload(payload, component)
 
-        if error and self.error_callback:
-            rlog.debug('Running error callback ...')
-            try:
-                self.error_callback(error)
-            except:
-                rlog.exception('Error callback failed for "%s"', action)
+        duration = round((time.time() - start) * 1000, 3)
+        rlog.debug(
+            'Action "%s" processed in %sms',
+            action,
+            duration,
+            extra={'duration': duration},
+            )
+
+        if error:
+            self.__run_error_callback(error, rlog, action)
 
         # Add extra command reply result values to payload
         if extra:
@@ -354,6 +687,55 @@ class ComponentServer(object):
         # Convert callback result to a command payload
         return CommandResultPayload.new(command_name, payload).entity()
 
+    def invoke(self, action, payload):
+        """Process a request payload without using sockets.
+
+        The payload is processed in the caller thread in the same way
+        as the requests received by the server, so it can be used to
+        test or benchmark the action callbacks. The response payload is
+        packed and unpacked, as it would be when it is sent.
+
+        :param action: Name of action that must process payload.
+        :type action: str
+        :param payload: A command payload, or the payload packed as bytes.
+        :type payload: CommandPayload
+
+        :raises: KatanaError
+
+        :returns: The response meta and payload.
+        :rtype: Reply
+
+        """
+
+        if action not in self.callbacks:
+            raise KatanaError('Invalid action for component {}: "{}"'.format(
+                self.component_title,
+                action,
+                ))
+
+        if isinstance(payload, bytes):
+            payload = unpack(payload)
+
+        meta, stream = self.__create_response(action, payload)
+        return Reply(meta, Payload(unpack(stream)))
+
+    def invoke_many(self, requests):
+        """Process many request payloads without using sockets.
+
+        The payloads are processed one after the other.
+
+        :param requests: Action name and payload for each request.
+        :type requests: iterable
+
+        :raises: KatanaError
+
+        :returns: A list of `Reply`, one for each request.
+        :rtype: list
+
+        """
+
+        return [self.invoke(action, payload) for action, payload in requests]
+
     def process_input(self, message):
         """Process input message and print result payload.
 
@@ -368,18 +750,7 @@ class ComponentServer(object):
 
         """
 
-        action = message['action']
-        if action not in self.callbacks:
-            message = 'Invalid action for component {}: "{}"'.format(
-                self.component_title,
-                action,
-                )
-            raise KatanaError(message)
-
-        payload = self.__process_request_payload(
-            action,
-            message['payload'],
-            )
+        payload = self.invoke(message['action'], message['payload']).payload
         # When an error payload is returned use its message
         # to raise an exception.
         error = payload.get('error/message', None)
@@ -393,48 +764,129 @@ class ComponentServer(object):
     def listen(self, channel):
         """Start listening for incoming requests.
 
+        Requests are received with a router socket, so requests from
+        different clients are processed at the same time, up to the
+        concurrency limit when there is one. Each client still gets
+        the responses in the order of its requests when it waits for
+        each response before sending the next request.
+
         :param channel: Channel to listen for incoming requests.
         :type channel: str
 
         """
 
+        import gevent
+        import zmq.green
+
+        from gevent.event import Event
+        from gevent.lock import BoundedSemaphore
+        from gevent.threadpool import ThreadPool
+        from multiprocessing import cpu_count
+
+        self.__zmq = zmq.green
+        self.__timeout_error = gevent.Timeout
         pid = os.getpid()
         timeout = self.__args["timeout"] / 1000.0
 
-        self.context = zmq.green.Context()
+        if not self._pool:
+            self._pool = ThreadPool(cpu_count() * 5)
+
+        if self.__max_concurrency:
+            self.__slots = BoundedSemaphore(self.__max_concurrency)
+
+        self.context = self.__context or zmq.green.Context()
         self.poller = zmq.green.Poller()
+        self.__drained = Event()
+        self.__drained.set()
 
         LOG.debug('Listening for requests in channel: "%s"', channel)
         self.__worker_socket = self.context.socket(zmq.PULL)
-        self.__worker_socket.bind('inproc://workers')
+        self.__worker_socket.bind(self.__workers_channel)
         self.poller.register(self.__worker_socket, zmq.POLLIN)
-        self.__socket = self.context.socket(zmq.REP)
+        # A router socket is used to receive many requests at once
+        self.__socket = self.context.socket(zmq.ROUTER)
         self.__socket.bind(channel)
         self.poller.register(self.__socket, zmq.POLLIN)
+        self.__receiving = True
+
+        if self.__gc_collector:
+            self.__gc_collector.start()
+            self.__collecting = True
 
         LOG.info('Component initiated...')
         try:
             while 1:
                 events = dict(self.poller.poll())
 
-                if events.get(self.__socket) == zmq.POLLIN:
+                # Requests are not received while draining
+                receive = self.__receiving
+                if receive and events.get(self.__socket) == zmq.POLLIN:
                     # Get request multipart stream
                     stream = self.__socket.recv_multipart()
+                    self.__pending += 1
+                    self.__drained.clear()
+                    if self.__collecting:
+                        self.__gc_collector.enter()
+
                     gevent.spawn(self.__process_request, stream, pid, timeout)
 
                 if events.get(self.__worker_socket) == zmq.POLLIN:
                     stream = self.__worker_socket.recv_multipart()
                     self.__socket.send_multipart(stream)
+                    self.__pending -= 1
+                    if not self.__pending:
+                        self.__drained.set()
+
+                    # Collect garbage between requests
+                    if self.__collecting:
+                        self.__gc_collector.leave()
+
+                    # Stop receiving requests when a limit is reached and
+                    # stop listening after the current requests finish.
+                    if self.__receiving and self.__check_recycling():
+                        self.__recycling = True
+                        self.__stop_receiving()
+
+                    if self.__recycling and not self.__pending:
+                        break
         except:
             self.stop()
             raise
 
+        self.stop()
+
+    def __stop_receiving(self):
+        if self.__receiving:
+            self.__receiving = False
+            self.poller.unregister(self.__socket)
+
+    def drain(self, timeout=None):
+        """Stop receiving requests and wait for the current requests.
+
+        The server keeps sending the responses of the requests that are
+        being processed, and it must be stopped after draining.
+
+        :param timeout: Optional seconds to wait for the requests to finish.
+        :type timeout: float
+
+        :returns: False when there are requests after the timeout.
+        :rtype: bool
+
+        """
+
+        self.__stop_receiving()
+        if not self.__drained:
+            return True
+
+        LOG.debug('Waiting for %d requests to finish ...', self.__pending)
+        return bool(self.__drained.wait(timeout))
+
     def stop(self):
         """Stop server."""
 
         LOG.debug('Stopping Component...')
         if self.__socket:
-            self.poller.unregister(self.__socket)
+            self.__stop_receiving()
             self.__socket.close()
             self.__socket = None
 
@@ -442,3 +894,12 @@ class ComponentServer(object):
             self.poller.unregister(self.__worker_socket)
             self.__worker_socket.close()
             self.__worker_socket = None
+
+        if self.__collecting:
+            self.__collecting = False
+            # Requests without response must not block the collection
+            # for the other servers that use the collector.
+            if self.__pending:
+                self.__gc_collector.leave(self.__pending)
+
+            self.__gc_collector.stop()
@@ -35,7 +35,8 @@ class ServiceServer(ComponentServer):
         from .sdk.service import get_component
 
         super(ServiceServer, self).__init__(*args, **kwargs)
-        self.__component = get_component()
+        # Hosted components are not the global component instance
+        self.__component = kwargs.get('component') or get_component()
         self.__return_value = None
         self.__transport = None
 
@@ -43,6 +44,9 @@ class ServiceServer(ComponentServer):
     def get_type():
         return 'service'
 
+    def get_component(self):
+        return self.__component
+
     @property
     def component_path(self):
         return '{}/{}'.format(
@@ -18,7 +18,6 @@ import socket
 
 from datetime import datetime
 from binascii import crc32
-from uuid import uuid4
 
 __license__ = "MIT"
 __copyright__ = "Copyright (c) 2016-2018 KUSANAGI S.L. (http://kusanagi.io)"
@@ -50,9 +49,35 @@ def uuid():
 
     """
 
+    # The uuid module loads the system UUID library when imported
+    from uuid import uuid4
+
     return str(uuid4())
 
 
+def get_rss():
+    """Get the resident set size of the current process.
+
+    The peak resident set size is used when the current size
+    is not available.
+
+    :returns: The size in bytes.
+    :rtype: int
+
+    """
+
+    try:
+        with open('/proc/self/statm') as file:
+            pages = int(file.read().split()[1])
+
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError):
+        import resource
+
+        # Linux gives the size in kilobytes
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
 def tcp(*args):
     """Create a tcp connection string.
 
@@ -678,6 +703,17 @@ class Singleton(type):
 
         return cls.instance
 
+    def new_instance(cls, *args, **kw):
+        """Create an instance that is not the singleton instance.
+
+        The class `instance` property is not changed by this call.
+
+        :rtype: object
+
+        """
+
+        return super(Singleton, cls).__call__(*args, **kw)
+
 
 def dict_crc(dict):
     """Create a CRC for a dictionary like object.
@@ -107,6 +107,36 @@ def test_api_http_request_headers():
     assert request.get_headers() == {'X-TYPE': expected}
     assert request.get_headers_array() == {'X-TYPE': [expected, expected2]}
 
+    # Headers with the same name in different case are merged
+    headers = {'X-Type': [expected], 'x-type': [expected2]}
+    request = HttpRequest(method, url, headers=headers)
+    assert sorted(request.get_header_array('x-TYPE')) == [expected, expected2]
+
+
+def test_api_http_request_lazy_values():
+    method = 'GET'
+    url = 'http://foo.com/bar/index/'
+    query = {'a': ['1', '2']}
+    headers = {'Content-Type': ['text/plain']}
+    request = HttpRequest(method, url, query=query, headers=headers)
+
+    # Payload values are converted only when they are used
+    assert request._HttpRequest__parsed_url is None
+    assert request._HttpRequest__headers is None
+    assert request._HttpRequest__query is query
+    assert request.get_method() == method
+
+    assert request.get_url_path() == '/bar/index'
+    assert request._HttpRequest__parsed_url is not None
+
+    assert request.get_header('content-type') == 'text/plain'
+    assert request.get_headers_array() == {'CONTENT-TYPE': ['text/plain']}
+
+    assert request.get_query_param('a') == '1'
+    query_params = request.get_query_params_array()
+    assert isinstance(query_params, MultiDict)
+    assert query_params == query
+
 
 def test_api_http_request_body():
     method = 'POST'
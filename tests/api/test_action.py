@@ -1,10 +1,16 @@
 import pytest
 
+import katana.api.action
+
 from katana.api.action import Action
+from katana.api.action import get_context
+from katana.api.action import get_zmq
 from katana.api.action import NoFileServerError
 from katana.api.action import parse_params
 from katana.api.action import ReturnTypeError
 from katana.api.action import UndefinedReturnValueError
+from katana.api.collection import ColumnCollection
+from katana.api.collection import LazyCollection
 from katana.api.file import File
 from katana.api.file import file_to_payload
 from katana.api.param import Param
@@ -16,6 +22,8 @@ from katana.payload import FIELD_MAPPINGS
 from katana.payload import get_path
 from katana.payload import Payload
 from katana.schema import SchemaRegistry
+from katana.serialization import pack
+from katana.serialization import unpack
 from katana.utils import nomap
 
 # Mapped parameter names for payload
@@ -46,6 +54,25 @@ def test_api_parse_params():
         ]
 
 
+def test_api_action_get_context(mocker):
+    # The context is created on first use
+    mocker.patch.object(katana.api.action, 'CONTEXT', None)
+    context = get_context()
+    assert context is not None
+    assert context.linger == 0
+    assert katana.api.action.CONTEXT is context
+    assert get_context() is context
+
+
+def test_api_action_get_zmq(mocker):
+    import zmq.green
+
+    # The module is resolved once and reused by the run-time calls
+    mocker.patch.object(katana.api.action, 'ZMQ', None)
+    assert get_zmq() is zmq.green
+    assert katana.api.action.ZMQ is zmq.green
+
+
 def test_api_action(read_json, registry):
     transport = Payload(read_json('transport.json'))
     params = [
@@ -309,6 +336,45 @@ def test_api_action_data(read_json, registry):
     with pytest.raises(TypeError):
         action.set_collection([1])
 
+    # Clear transport data
+    del transport[FIELD_MAPPINGS['data']]
+
+    # Set a transport collection using a generator
+    entities = (entity for entity in collection)
+    assert action.set_collection(entities) == action
+    lazy_collection = transport.get(data_path, delimiter='|')[0]
+    assert isinstance(lazy_collection, LazyCollection)
+    # Generator is consumed only when the transport is serialized
+    assert not lazy_collection.is_consumed()
+    unpacked = Payload(unpack(pack(transport)))
+    assert unpacked.get(data_path, delimiter='|') == [collection]
+    assert lazy_collection.is_consumed()
+
+    # Items in a lazy collection are validated during serialization
+    del transport[FIELD_MAPPINGS['data']]
+    action.set_collection(iter([{'foo': 1}, 1]))
+    with pytest.raises(TypeError):
+        pack(transport)
+
+    # Clear transport data
+    del transport[FIELD_MAPPINGS['data']]
+
+    # Set a transport collection using columns
+    fields = ['foo', 'bar']
+    columns = [(1, 2), ('a', 'b')]
+    assert action.set_collection_columns(fields, columns) == action
+    column_collection = transport.get(data_path, delimiter='|')[0]
+    assert isinstance(column_collection, ColumnCollection)
+    unpacked = Payload(unpack(pack(transport)))
+    assert unpacked.get(data_path, delimiter='|') == [[
+        {'foo': 1, 'bar': 'a'},
+        {'foo': 2, 'bar': 'b'},
+        ]]
+
+    # Columns must match the field names
+    with pytest.raises(TypeError):
+        action.set_collection_columns(fields, columns[:1])
+
 
 def test_api_action_relate(read_json, registry):
     transport = Payload(read_json('transport.json'))
@@ -385,6 +451,62 @@ def test_api_action_relate(read_json, registry):
         action.relate_many_remote(pk, remote, service_name, 1)
 
 
+def test_api_action_relate_bulk(read_json, registry):
+    transport = Payload(read_json('transport.json'))
+    address = transport.get('meta/gateway')[1]
+    remote = 'ktp://87.65.43.21:4321'
+    service_name = 'foo'
+    relations_path = '|'.join(['relations', address, nomap(service_name)])
+    action = Action(**{
+        'action': 'bar',
+        'params': [],
+        'transport': transport,
+        'component': None,
+        'path': '/path/to/file.py',
+        'name': service_name,
+        'version': '1.0',
+        'framework_version': '1.0.0',
+        })
+
+    # Clear transport relations
+    del transport[FIELD_MAPPINGS['relations']]
+
+    # Relate entities in bulk
+    assert action.relate_one_bulk({'1': '321', 2: '123'}, 'bar') == action
+    assert action.relate_many_bulk({'1': ['4', '5']}, 'baz') == action
+    assert action.relate_one_remote_bulk({'1': '6'}, remote, 'bar') == action
+    assert action.relate_many_remote_bulk({'3': ['7']}, remote, 'baz') == action
+    assert transport.get(relations_path, delimiter='|') == {
+        '1': {
+            address: {'bar': '321', 'baz': ['4', '5']},
+            remote: {'bar': '6'},
+            },
+        '2': {address: {'bar': '123'}},
+        '3': {remote: {'baz': ['7']}},
+        }
+
+    # Bulk relations must be the same as the single relations
+    expected = transport.get(relations_path, delimiter='|')
+    del transport[FIELD_MAPPINGS['relations']]
+    action.relate_one('1', 'bar', '321')
+    action.relate_one(2, 'bar', '123')
+    action.relate_many('1', 'baz', ['4', '5'])
+    action.relate_one_remote('1', remote, 'bar', '6')
+    action.relate_many_remote('3', remote, 'baz', ['7'])
+    assert transport.get(relations_path, delimiter='|') == expected
+
+    # Relations must be a dictionary
+    with pytest.raises(TypeError):
+        action.relate_one_bulk([('1', '321')], 'bar')
+
+    # Foreign keys for "one-to-many" relations must be a list
+    with pytest.raises(TypeError):
+        action.relate_many_bulk({'1': '4'}, 'baz')
+
+    with pytest.raises(TypeError):
+        action.relate_many_remote_bulk({'1': '4'}, remote, 'baz')
+
+
 def test_api_action_links(read_json, registry):
     transport = Payload(read_json('transport.json'))
     address = transport.get('meta/gateway')[1]
@@ -419,6 +541,20 @@ def test_api_action_links(read_json, registry):
     assert transport.path_exists(links_path, delimiter='|')
     assert transport.get(links_path, delimiter='|') == uri
 
+    # Set many links
+    links = {
+        'self': uri,
+        'list': 'http://api.example.com/v1/users',
+        }
+    assert action.set_links(links) == action
+    for name, link_uri in links.items():
+        path = '|'.join(['links', address, nomap(service_name), nomap(name)])
+        assert transport.get(path, delimiter='|') == link_uri
+
+    # Links must be a dictionary
+    with pytest.raises(TypeError):
+        action.set_links([uri])
+
 
 def test_api_action_transactions(read_json, registry):
     transport = Payload(read_json('transport.json'))
@@ -1,10 +1,13 @@
 from __future__ import unicode_literals
 
+import logging
+
 import pytest
 
 from katana.api import base
 from katana.api.schema.service import ServiceSchema
 from katana.errors import KatanaError
+from katana.logging import RequestLogger
 from katana.schema import get_schema_registry
 from katana.schema import SchemaRegistry
 
@@ -144,3 +147,17 @@ def test_api_base_log(mocker, logs):
     out = logs.getvalue()
     # There should be no ouput at all
     assert len(out) == 0
+
+    # Values are only converted to string when the level is enabled
+    api._logger = RequestLogger('RID', 'katana.api')
+    to_string = mocker.patch(
+        'katana.api.base.value_to_log_string',
+        return_value=log_message,
+        )
+    api.log({'a': 1}, level=logging.DEBUG)
+    assert not to_string.called
+    assert len(logs.getvalue()) == 0
+    api.log({'a': 1}, compact=True)
+    to_string.assert_called_once_with({'a': 1}, compact=True)
+    assert logs.getvalue().rstrip().endswith('{} |RID|'.format(log_message))
+
@@ -0,0 +1,111 @@
+from array import array
+
+import pytest
+
+from katana.api.collection import ColumnCollection
+from katana.api.collection import LazyCollection
+from katana.serialization import pack
+from katana.serialization import unpack
+
+
+def test_api_lazy_collection():
+    entities = [{'id': 1}, {'id': 2}]
+    collection = LazyCollection(iter(entities))
+    assert not collection.is_consumed()
+
+    # Entities are read from the iterator only once
+    assert collection.get_entities() == entities
+    assert collection.is_consumed()
+    assert collection.get_entities() == entities
+    assert list(collection) == entities
+    assert len(collection) == 2
+    assert collection == LazyCollection(iter(entities))
+    assert collection != [{'id': 1}]
+
+    # Collection is serialized as a list of entities
+    assert unpack(pack([collection])) == [entities]
+
+
+def test_api_lazy_collection_stream():
+    entities = [{'id': 1}, {'id': 2}]
+    collection = LazyCollection(iter(entities))
+
+    # Entities are packed one at a time while the iterator is consumed
+    data = {'foo': [collection, 'bar'], 'baz': LazyCollection(iter([]))}
+    assert unpack(pack(data)) == {'foo': [entities, 'bar'], 'baz': []}
+    assert collection.is_consumed()
+
+    # Packed entities are not kept in the collection
+    with pytest.raises(ValueError):
+        collection.get_entities()
+
+
+def test_api_lazy_collection_invalid_entity():
+    collection = LazyCollection(entity for entity in [{'id': 1}, 'foo'])
+    with pytest.raises(TypeError):
+        collection.get_entities()
+
+    with pytest.raises(TypeError):
+        pack(LazyCollection(iter([1])))
+
+
+def test_api_column_collection():
+    ids = array('l', [1, 2, 3])
+    names = ('foo', 'bar', 'baz')
+    collection = ColumnCollection(['id', 'name'], [ids, names])
+    expected = [
+        {'id': 1, 'name': 'foo'},
+        {'id': 2, 'name': 'bar'},
+        {'id': 3, 'name': 'baz'},
+        ]
+
+    assert len(collection) == 3
+    assert collection.get_fields() == ('id', 'name')
+    assert collection.get_column('id') is ids
+    assert collection.get_column('name') is names
+    with pytest.raises(KeyError):
+        collection.get_column('missing')
+
+    assert collection.get_entities() == expected
+    assert list(collection) == expected
+    assert collection == ColumnCollection(('id', 'name'), (ids, names))
+    assert collection != expected[:1]
+
+    # Collection is serialized as a list of entities
+    assert unpack(pack([collection])) == [expected]
+
+    # An empty collection has no entities
+    assert ColumnCollection([], []).get_entities() == []
+    assert ColumnCollection(['id'], [[]]).get_entities() == []
+
+
+def test_api_column_collection_stream(mocker):
+    collection = ColumnCollection(['id'], [array('l', [1, 2])])
+    get_entities = mocker.spy(collection, 'get_entities')
+
+    # Entities are created one at a time while they are packed
+    stream = collection.__stream__()
+    assert next(stream) == {'id': 1}
+    assert next(stream) == {'id': 2}
+    assert unpack(pack({'foo': collection})) == {'foo': [{'id': 1}, {'id': 2}]}
+    get_entities.assert_not_called()
+
+
+def test_api_column_collection_invalid():
+    # Fields must be a list of strings
+    with pytest.raises(TypeError):
+        ColumnCollection('id', [[1]])
+
+    with pytest.raises(TypeError):
+        ColumnCollection([1], [[1]])
+
+    # There must be a column for each field
+    with pytest.raises(TypeError):
+        ColumnCollection(['id'], None)
+
+    with pytest.raises(TypeError):
+        ColumnCollection(['id', 'name'], [[1]])
+
+    # All columns must have the same length
+    with pytest.raises(TypeError):
+        ColumnCollection(['id', 'name'], [[1, 2], ['foo']])
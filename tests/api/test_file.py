@@ -1,10 +1,16 @@
+import mmap
 import os
+import types
 
 import pytest
 
+from katana.api import fileserver
+from katana.api.file import exists_many
 from katana.api.file import File
 from katana.api.file import file_to_payload
 from katana.api.file import payload_to_file
+from katana.api.file import read_many
+from katana.api.file import stat_many
 from katana.payload import FIELD_MAPPINGS
 
 
@@ -56,6 +62,8 @@ def test_api_file(data_path, mocker):
     with pytest.raises(TypeError):
         File('foo', 'http://127.0.0.1:8080/ANBDKAD23142421')
 
+    fileserver.set_client(fileserver.FileServerClient())
+
     # Patch HTTP connection object and make al request "200 OK"
     response = mocker.MagicMock(status=200, reason='OK')
     connection = mocker.MagicMock()
@@ -80,16 +88,18 @@ def test_api_file(data_path, mocker):
     assert not file.exists()
 
     # Check remote file read
-    request = mocker.MagicMock()
-    request.read.return_value = b'CONTENT'
-    reader = mocker.MagicMock()
-    reader.__enter__.return_value = request
-    reader.__exit__.return_value = False
-    mocker.patch('urllib2.urlopen', return_value=reader)
+    connection.request.side_effect = None
+    response.status = 200
+    response.read.return_value = b'CONTENT'
     assert file.read() == b'CONTENT'
 
+    # Check remote file read when file server returns an error
+    response.status = 404
+    assert file.read() == b''
+
     # Check error during remote file read
-    request.read.side_effect = Exception
+    response.status = 200
+    response.read.side_effect = Exception
     assert file.read() == b''
 
     # A file with empty path should not exist
@@ -147,3 +157,184 @@ def test_api_file_copy(data_path):
     assert clon.get_name() == file.get_name()
     assert clon.get_path() == file.get_path()
     assert clon.get_size() == file.get_size()
+
+
+def test_api_file_many(data_path, mocker):
+    fileserver.set_client(fileserver.FileServerClient())
+
+    response = mocker.MagicMock(status=200, reason='OK', will_close=False)
+    response.read.return_value = b'CONTENT'
+    connection = mocker.MagicMock()
+    connection.getresponse.return_value = response
+    mocker.patch('httplib.HTTPConnection', return_value=connection)
+
+    local_file = os.path.join(data_path, 'foo.json')
+    files = [
+        File('foo', local_file),
+        File('bar', 'http://127.0.0.1:8080/ANBDKAD23142421', token='xx'),
+        File('baz', 'http://127.0.0.1:8080/ANBDKAD23142422', token='xx'),
+        File('missing', 'does-not-exist'),
+        ]
+    assert exists_many(files) == [True, True, True, False]
+
+    with open(local_file, 'rb') as test_file:
+        contents = test_file.read()
+
+    assert read_many(files) == [contents, b'CONTENT', b'CONTENT', b'']
+    assert exists_many([]) == []
+    assert read_many(files[:1]) == [contents]
+
+
+def test_api_file_read_buffer(data_path, tmpdir):
+    local_file = os.path.join(data_path, 'foo.json')
+    with open(local_file, 'rb') as test_file:
+        contents = test_file.read()
+
+    # Local files are memory mapped
+    buffer = File('foo', local_file).read_buffer()
+    assert isinstance(buffer, mmap.mmap)
+    assert len(buffer) == len(contents)
+    assert buffer[:] == contents
+    buffer.close()
+
+    # Empty and missing files return empty data
+    empty_file = tmpdir.join('empty.txt')
+    empty_file.write('')
+    assert File('foo', str(empty_file)).read_buffer() == b''
+    assert File('foo', 'does-not-exist').read_buffer() == b''
+
+
+def test_api_file_iter_chunks(data_path, mocker):
+    fileserver.set_client(fileserver.FileServerClient())
+
+    local_file = os.path.join(data_path, 'foo.json')
+    with open(local_file, 'rb') as test_file:
+        contents = test_file.read()
+
+    file = File('foo', local_file)
+    chunks = file.iter_chunks(10)
+    assert isinstance(chunks, types.GeneratorType)
+    chunks = list(chunks)
+    assert len(chunks) == 6
+    assert b''.join(chunks) == contents
+    assert list(File('foo', 'does-not-exist').iter_chunks()) == []
+
+    # Stream remote files
+    response = mocker.MagicMock(status=200, reason='OK', will_close=False)
+    response.read.side_effect = [b'AB', b'CD', b'']
+    connection = mocker.MagicMock()
+    connection.getresponse.return_value = response
+    mocker.patch('httplib.HTTPConnection', return_value=connection)
+
+    file = File('foo', 'http://127.0.0.1:8080/ANBDKAD23142421', token='xx')
+    assert list(file.iter_chunks(2)) == [b'AB', b'CD']
+    assert connection.request.call_args[1]['headers'] == {'X-Token': 'xx'}
+
+    # Remote errors stop the iteration
+    response.status = 404
+    response.read.side_effect = [b'Not found', b'']
+    assert list(file.iter_chunks(2)) == []
+
+    # Errors while reading the data are raised after the chunks read
+    response.status = 200
+    response.read.side_effect = [b'AB', Exception]
+    chunks = file.iter_chunks(2)
+    assert next(chunks) == b'AB'
+    with pytest.raises(IOError):
+        next(chunks)
+
+    # Local files also raise when reading fails
+    read = mocker.patch('__builtin__.open', mocker.mock_open())
+    read.return_value.read.side_effect = [b'AB', IOError]
+    chunks = File('foo', local_file).iter_chunks(2)
+    assert next(chunks) == b'AB'
+    with pytest.raises(IOError):
+        next(chunks)
+
+
+def test_api_file_lazy_values(data_path, mocker):
+    getsize = mocker.patch('os.path.getsize', return_value=54)
+    guess_type = mocker.patch(
+        'mimetypes.guess_type',
+        return_value=('application/json', None),
+        )
+
+    # File values are not resolved when the file is created
+    local_file = os.path.join(data_path, 'foo.json')
+    file = File('foo', local_file)
+    assert not getsize.called
+    assert not guess_type.called
+
+    # Values are resolved once when they are used
+    assert file.get_size() == 54
+    assert file.get_size() == 54
+    getsize.assert_called_once_with(local_file)
+    assert file.get_mime() == 'application/json'
+    assert file.get_mime() == 'application/json'
+    guess_type.assert_called_once_with(local_file)
+
+    # Known values are not resolved
+    getsize.reset_mock()
+    guess_type.reset_mock()
+    file = File('foo', local_file, size=10, mime='text/plain')
+    assert file.get_size() == 10
+    assert file.get_mime() == 'text/plain'
+    # Remote files don't read the size
+    file = File('foo', 'http://127.0.0.1:8080/ANBDKAD23142421', token='xx')
+    assert file.get_size() == 0
+    assert not getsize.called
+
+    # Copies keep values unresolved
+    file = File('foo', local_file).copy_with_name('bar')
+    assert not getsize.called
+    assert not guess_type.called
+
+    # Resolve the values of many files, reading each path only once
+    other_file = os.path.join(data_path, 'bar.json')
+    files = [file, File('bar', local_file), File('baz', other_file)]
+    assert stat_many(files) == files
+    assert sorted(call[0][0] for call in getsize.call_args_list) == sorted([
+        local_file,
+        other_file,
+        ])
+    assert guess_type.call_count == 3
+    assert [file.get_size() for file in files] == [54, 54, 54]
+    assert getsize.call_count == 2
+
+
+def test_api_file_cache(tmpdir, mocker):
+    fileserver.set_client(fileserver.FileServerClient())
+    fileserver.set_cache(fileserver.FileCache(str(tmpdir), 1024))
+
+    response = mocker.MagicMock(status=200, reason='OK', will_close=False)
+    response.read.return_value = b'CONTENT'
+    connection = mocker.MagicMock()
+    connection.getresponse.return_value = response
+    mocker.patch('httplib.HTTPConnection', return_value=connection)
+
+    try:
+        file = File('foo', 'http://127.0.0.1:8080/ANBDKAD23142421', token='xx')
+        assert file.read() == b'CONTENT'
+        assert file.read() == b'CONTENT'
+        assert list(file.iter_chunks(4)) == [b'CONT', b'ENT']
+        # Remote file is only requested once
+        assert connection.request.call_count == 1
+
+        # Streamed files are added to the cache
+        file = File('foo', 'http://127.0.0.1:8080/ANBDKAD23142423', token='xx')
+        response.read.side_effect = [b'STRE', b'AM', b'']
+        assert list(file.iter_chunks(4)) == [b'STRE', b'AM']
+        response.read.side_effect = None
+        assert file.read() == b'STREAM'
+        assert connection.request.call_count == 2
+
+        # Errors are not cached
+        file = File('foo', 'http://127.0.0.1:8080/ANBDKAD23142422', token='xx')
+        response.status = 404
+        assert file.read() == b''
+        response.status = 200
+        assert file.read() == b'CONTENT'
+        assert connection.request.call_count == 4
+    finally:
+        fileserver.set_cache(None)
+
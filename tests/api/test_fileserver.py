@@ -0,0 +1,288 @@
+import httplib
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from katana.api import fileserver
+from katana.api.fileserver import ConnectionPool
+from katana.api.fileserver import FileCache
+from katana.api.fileserver import FileServerClient
+
+
+def test_api_fileserver_pool(mocker):
+    connections = [mocker.MagicMock(), mocker.MagicMock(), mocker.MagicMock()]
+    connect = mocker.patch('httplib.HTTPConnection', side_effect=connections)
+
+    pool = ConnectionPool('127.0.0.1:8080', size=1, timeout=5)
+    assert pool.acquire() == (connections[0], False)
+    connect.assert_called_once_with('127.0.0.1:8080', timeout=5)
+    assert pool.acquire() == (connections[1], False)
+
+    # Idle connections are reused
+    pool.release(connections[0])
+    assert pool.acquire() == (connections[0], True)
+
+    # Connections are closed when the pool is full
+    pool.release(connections[0])
+    pool.release(connections[1])
+    assert not connections[0].close.called
+    connections[1].close.assert_called_once_with()
+
+    pool.close()
+    connections[0].close.assert_called_once_with()
+    assert pool.acquire() == (connections[2], False)
+
+
+def test_api_fileserver_client(mocker):
+    response = mocker.MagicMock(status=200, reason='OK', will_close=False)
+    response.read.return_value = b'CONTENT'
+    connection = mocker.MagicMock()
+    connection.getresponse.return_value = response
+    connect = mocker.patch('httplib.HTTPConnection', return_value=connection)
+
+    client = FileServerClient(timeout=5, pool_size=2)
+    assert client.get_timeout() == 5
+    assert client.get_pool_size() == 2
+
+    url = 'http://127.0.0.1:8080/ANBDKAD23142421?foo=bar'
+    headers = {'X-Token': 'xx'}
+    assert client.get(url, headers) == (200, 'OK', b'CONTENT')
+    connection.request.assert_called_once_with(
+        'GET',
+        '/ANBDKAD23142421?foo=bar',
+        headers=headers,
+        )
+    assert client.head(url) == (200, 'OK', b'CONTENT')
+    # The connection is kept alive for the second request
+    assert connect.call_count == 1
+    assert not connection.close.called
+
+    # Connections that the server closes are not reused
+    response.will_close = True
+    client.get(url)
+    connection.close.assert_called_once_with()
+    client.get(url)
+    assert connect.call_count == 2
+
+    # Idle connections are retried once when they fail
+    response.will_close = False
+    client.get(url)
+    connection.request.side_effect = [httplib.BadStatusLine(''), None]
+    assert client.get(url) == (200, 'OK', b'CONTENT')
+    assert connect.call_count == 4
+
+    # New connections are not retried
+    connection.request.side_effect = socket.error
+    with pytest.raises(socket.error):
+        client.get(url)
+
+    client.close()
+
+
+def test_api_fileserver_client_map():
+    client = FileServerClient(pool_size=2)
+    assert client.map(lambda value: value * 2, [1, 2, 3]) == [2, 4, 6]
+    assert client.map(lambda value: value * 2, iter([1])) == [2]
+    assert client.map(lambda value: value * 2, []) == []
+    client.close()
+
+
+def test_api_fileserver_shared_client(mocker):
+    fileserver.set_client(None)
+    client = fileserver.get_client()
+    assert isinstance(client, FileServerClient)
+    assert fileserver.get_client() is client
+
+    # The previous client is closed when a new one is set
+    close = mocker.patch.object(client, 'close')
+    other = FileServerClient()
+    fileserver.set_client(other)
+    assert fileserver.get_client() is other
+    close.assert_called_once_with()
+
+
+def test_api_fileserver_client_stream(mocker):
+    response = mocker.MagicMock(status=200, reason='OK', will_close=False)
+    response.read.side_effect = [b'AB', b'CD', b'']
+    connection = mocker.MagicMock()
+    connection.getresponse.return_value = response
+    connect = mocker.patch('httplib.HTTPConnection', return_value=connection)
+
+    client = FileServerClient()
+    url = 'http://127.0.0.1:8080/ANBDKAD23142421'
+    status, reason, chunks = client.stream(url, size=2)
+    assert (status, reason) == (200, 'OK')
+    assert list(chunks) == [b'AB', b'CD']
+    response.read.assert_called_with(2)
+
+    # The connection is reused after the body is read
+    response.read.side_effect = None
+    client.get(url)
+    assert connect.call_count == 1
+
+    # Connections are closed when the iteration stops early
+    response.read.side_effect = [b'AB', b'CD', b'']
+    _, _, chunks = client.stream(url, size=2)
+    assert next(chunks) == b'AB'
+    chunks.close()
+    connection.close.assert_called_once_with()
+    client.close()
+
+
+def test_api_fileserver_cache(tmpdir):
+    directory = str(tmpdir.join('cache'))
+    cache = FileCache(directory, 10)
+    assert os.path.isdir(directory)
+    assert cache.get_directory() == directory
+    assert cache.get_max_size() == 10
+    assert cache.get_size() == 0
+
+    # Keys depend on the path and the token
+    key = cache.get_key('http://127.0.0.1:8080/ABC', 'xx')
+    assert key == cache.get_key('http://127.0.0.1:8080/ABC', 'xx')
+    assert key != cache.get_key('http://127.0.0.1:8080/ABC', 'yy')
+    assert cache.get_path(key) == os.path.join(directory, key)
+    # Unicode paths are encoded as UTF-8
+    key = cache.get_key(u'http://127.0.0.1:8080/\xf1', u'xx')
+    assert key == cache.get_key(b'http://127.0.0.1:8080/\xc3\xb1', 'xx')
+
+    assert not cache.has('a')
+    assert cache.get('a') is None
+    assert cache.put('a', b'AAAA')
+    assert cache.has('a')
+    assert cache.get('a') == b'AAAA'
+    assert cache.put('b', b'BBBB')
+    assert cache.get_size() == 8
+    # Files bigger than the cache are not added
+    assert not cache.put('c', b'C' * 11)
+    assert not cache.has('c')
+
+    # Least recently used files are removed first
+    assert cache.get('a') == b'AAAA'
+    assert cache.put('c', b'CCCC')
+    assert cache.get_size() == 8
+    assert not cache.has('b')
+    assert cache.has('a')
+    assert cache.has('c')
+
+    # Replace a cached file
+    assert cache.put('c', b'CC')
+    assert cache.get('c') == b'CC'
+    assert cache.get_size() == 6
+
+    # Files removed from the directory are removed from the cache
+    os.remove(cache.get_path('a'))
+    assert cache.get('a') is None
+    assert cache.get_size() == 2
+
+    # Existing files are loaded when the cache is created
+    cache = FileCache(directory, 10)
+    assert cache.get_size() == 2
+    assert cache.get('c') == b'CC'
+    # Existing files that don't fit are removed
+    assert cache.put('d', b'DDDDDDDD')
+    cache = FileCache(directory, 8)
+    assert cache.get_size() == 8
+    assert not cache.has('c')
+
+
+def test_api_fileserver_cache_fetch(tmpdir):
+    cache = FileCache(str(tmpdir), 1024)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return b'DATA'
+
+    # Only one thread loads the file
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.fetch('a', loader)))
+        for _ in range(5)
+        ]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert results == [b'DATA'] * 5
+    assert len(calls) == 1
+    assert cache.fetch('a', loader) == b'DATA'
+    assert len(calls) == 1
+
+    # Failed loads are not cached
+    assert cache.fetch('b', lambda: None) is None
+    assert not cache.has('b')
+
+
+
+def test_api_fileserver_cache_fetch_timeout(tmpdir):
+    cache = FileCache(str(tmpdir), 1024, timeout=0.01)
+    loading = threading.Event()
+    release = threading.Event()
+
+    def slow_loader():
+        loading.set()
+        release.wait(1)
+        return b'SLOW'
+
+    thread = threading.Thread(target=cache.fetch, args=('a', slow_loader))
+    thread.start()
+    loading.wait(1)
+    try:
+        # Waiting threads load the file when the fetch takes too long
+        assert cache.fetch('a', lambda: b'FAST') == b'FAST'
+        assert list(cache.stream('a', lambda: iter([b'FAST']))) == [b'FAST']
+    finally:
+        release.set()
+        thread.join()
+
+    assert cache.get('a') == b'SLOW'
+
+
+def test_api_fileserver_cache_stream(tmpdir):
+    cache = FileCache(str(tmpdir), 8)
+    calls = []
+
+    def loader(*chunks):
+        def load():
+            calls.append(1)
+            return iter(chunks)
+
+        return load
+
+    # Streamed files are added to the cache when all the chunks are read
+    assert list(cache.stream('a', loader(b'AB', b'CD'))) == [b'AB', b'CD']
+    assert cache.get('a') == b'ABCD'
+    assert cache.get_size() == 4
+    assert list(cache.stream('a', loader(b'XX'), size=3)) == [b'ABC', b'D']
+    assert len(calls) == 1
+
+    # Streaming a cached file marks it as the most recently used
+    assert cache.put('b', b'BB')
+    assert list(cache.stream('a', loader())) == [b'ABCD']
+    assert cache.put('c', b'CCCC')
+    assert cache.has('a')
+    assert not cache.has('b')
+
+    # Incomplete streams are not cached
+    chunks = cache.stream('d', loader(b'DD', b'DD'))
+    assert next(chunks) == b'DD'
+    chunks.close()
+    assert not cache.has('d')
+
+    # Files bigger than the cache are streamed but not cached
+    chunks = [b'EEEE', b'EEEE', b'E']
+    assert list(cache.stream('e', loader(*chunks))) == chunks
+    assert not cache.has('e')
+
+    # Failed loads are not cached
+    assert list(cache.stream('f', lambda: None)) == []
+    assert not cache.has('f')
+    # Temporary files are removed
+    assert sorted(os.listdir(str(tmpdir))) == ['a', 'c']
@@ -7,6 +7,7 @@ from katana.api.param import TYPE_INTEGER
 from katana.api.param import TYPE_NULL
 from katana.api.request import Request
 from katana.api.response import Response
+from katana.api.router import Router
 from katana.api.transport import Transport
 from katana.schema import SchemaRegistry
 
@@ -128,6 +129,53 @@ def test_api_request_new_response():
     assert isinstance(request.get_http_request(), HttpRequest)
 
 
+def test_api_request_route():
+    SchemaRegistry.instance = None
+    registry = SchemaRegistry()
+    registry.update_registry({
+        'users': {
+            '1.0': {
+                'h': {'b': '/1.0'},
+                'ac': {'read': {'h': {'p': '/users/{id}'}}},
+                },
+            },
+        })
+
+    values = {
+        'attributes': {},
+        'component': object(),
+        'path': '/path/to/file.py',
+        'name': 'dummy',
+        'version': '1.0',
+        'framework_version': '1.0.0',
+        'client_address': '205.81.5.62:7681',
+        'gateway_protocol': urn.HTTP,
+        'gateway_addresses': ['12.34.56.78:1234', 'http://127.0.0.1:80'],
+        }
+
+    try:
+        # Without an HTTP request there is no route
+        request = Request(**values)
+        assert isinstance(request.get_router(), Router)
+        assert request.get_route() is None
+
+        values['http_request'] = {
+            'method': 'GET',
+            'url': 'http://foo.com/1.0/users/42/',
+            }
+        request = Request(**values)
+        route = request.get_route()
+        assert route.get_service_name() == 'users'
+        assert route.get_service_version() == '1.0'
+        assert route.get_action_name() == 'read'
+        assert route.get_params() == {'id': '42'}
+
+        values['http_request']['url'] = 'http://foo.com/1.0/posts'
+        assert Request(**values).get_route() is None
+    finally:
+        SchemaRegistry.instance = None
+
+
 def test_api_request_new_param():
     SchemaRegistry()
 
@@ -41,8 +41,24 @@ def test_api_response():
         'status_text': 'OK',
         }
     response = Response(**values)
-    assert isinstance(response.get_http_request(), HttpRequest)
-    assert isinstance(response.get_http_response(), HttpResponse)
+    # HTTP request and response are created when they are used
+    assert response._Response__http_request is None
+    assert response._Response__http_response is None
+    http_request = response.get_http_request()
+    assert isinstance(http_request, HttpRequest)
+    assert response.get_http_request() is http_request
+    http_response = response.get_http_response()
+    assert isinstance(http_response, HttpResponse)
+    assert response.get_http_response() is http_response
+
+    # Transport can be given as a payload
+    values['transport'] = {'m': {'i': 'TEST'}}
+    response = Response(**values)
+    assert not isinstance(response._Response__transport, Transport)
+    transport = response.get_transport()
+    assert isinstance(transport, Transport)
+    assert transport.get_request_id() == 'TEST'
+    assert response.get_transport() is transport
 
 
 def test_response_log(mocker, logs):
@@ -0,0 +1,112 @@
+from katana.api.router import get_router
+from katana.api.router import Route
+from katana.api.router import Router
+from katana.api.router import split_path
+from katana.schema import SchemaRegistry
+
+
+def test_api_router_split_path():
+    assert split_path('') == []
+    assert split_path('/') == []
+    assert split_path('/users/') == ['users']
+    assert split_path('users//1') == ['users', '1']
+
+
+def test_api_router():
+    router = Router()
+    assert len(router) == 0
+    assert router.match('GET', '/users') is None
+
+    router.add_route('get', '/1.0/users', 'users', '1.0', 'list')
+    router.add_route('get', '/1.0/users/{id}', 'users', '1.0', 'read')
+    router.add_route('put', '/1.0/users/{user_id}', 'users', '1.0', 'update')
+    router.add_route('get', '/1.0/users/me', 'users', '1.0', 'me')
+    router.add_route('get', '/1.0/users/{id}/posts', 'posts', '1.0', 'list')
+    router.add_route('get', '/1.0/files/{name}.{ext}', 'files', '1.0', 'read')
+    # The first route is kept for duplicated paths
+    router.add_route('get', '/1.0/users', 'users', '2.0', 'list')
+    assert len(router) == 6
+
+    route = router.match('get', '/1.0/users/')
+    assert isinstance(route, Route)
+    assert route.get_service_name() == 'users'
+    assert route.get_service_version() == '1.0'
+    assert route.get_action_name() == 'list'
+    assert route.get_method() == 'GET'
+    assert route.get_path() == '/1.0/users'
+    assert route.get_params() == {}
+
+    route = router.match('GET', '/1.0/users/42')
+    assert route.get_action_name() == 'read'
+    assert route.get_path() == '/1.0/users/{id}'
+    assert route.get_params() == {'id': '42'}
+
+    # Parameter names are resolved for each route
+    route = router.match('PUT', '/1.0/users/42')
+    assert route.get_action_name() == 'update'
+    assert route.get_params() == {'user_id': '42'}
+
+    # Static segments have priority over parameters
+    route = router.match('GET', '/1.0/users/me')
+    assert route.get_action_name() == 'me'
+    assert route.get_params() == {}
+
+    route = router.match('GET', '/1.0/users/me/posts')
+    assert route.get_service_name() == 'posts'
+    assert route.get_params() == {'id': 'me'}
+
+    # Segments can mix text and parameters
+    route = router.match('GET', '/1.0/files/report.tar.gz')
+    assert route.get_service_name() == 'files'
+    assert route.get_params() == {'name': 'report', 'ext': 'tar.gz'}
+
+    # Paths or methods without routes don't match
+    assert router.match('POST', '/1.0/users') is None
+    assert router.match('GET', '/1.0/users/42/comments') is None
+    assert router.match('GET', '/1.0/files/report') is None
+    assert router.match('GET', '/') is None
+
+
+def test_api_router_from_registry():
+    SchemaRegistry.instance = None
+    registry = SchemaRegistry()
+    registry.update_registry({
+        'users': {
+            '1.0': {
+                'h': {'b': '/1.0'},
+                'ac': {
+                    'list': {'h': {'p': '/users'}},
+                    'read': {'h': {'p': '/users/{id}'}},
+                    'create': {'h': {'p': '/users', 'm': 'post'}},
+                    'internal': {'h': {'p': '/internal', 'g': False}},
+                    },
+                },
+            },
+        'private': {
+            '1.0': {
+                'h': {'b': '/private', 'g': False},
+                'ac': {'list': {'h': {'p': '/'}}},
+                },
+            },
+        })
+
+    try:
+        router = get_router(registry)
+        assert len(router) == 3
+        assert router.match('GET', '/1.0/users').get_action_name() == 'list'
+        assert router.match('POST', '/1.0/users').get_action_name() == 'create'
+        route = router.match('GET', '/1.0/users/7')
+        assert route.get_action_name() == 'read'
+        assert route.get_params() == {'id': '7'}
+
+        # Actions and services without gateway access are not routed
+        assert router.match('GET', '/1.0/internal') is None
+        assert router.match('GET', '/private') is None
+
+        # Router is cached until the registry changes
+        assert get_router(registry) is router
+        registry.update_registry({})
+        assert get_router(registry) is not router
+        assert len(get_router(registry)) == 0
+    finally:
+        SchemaRegistry.instance = None
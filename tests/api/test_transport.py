@@ -1,9 +1,16 @@
+import datetime
+import json
+import types
+
 import pytest
 
+from katana.api.base import ApiError
 from katana.api.file import File
 from katana.api.param import Param
 from katana.api.transport import TransactionTypeError
 from katana.api.transport import Transport
+from katana.api.transport.resolver import RelationResolver
+from katana.api.transport.resolver import ResolvedRelation
 from katana.payload import delete_path
 
 
@@ -127,6 +134,84 @@ def test_api_transport_relations(read_json):
     assert transport.get_relations() == []
 
 
+def test_api_transport_relation_resolver():
+    local = 'http://127.0.0.1:80'
+    remote = 'ktp://87.65.43.21:4321'
+    payload = {
+        'd': {
+            local: {
+                'users': {
+                    '1.0.0': {'read': [{'id': 1, 'name': 'Foo'}]},
+                    '1.1.0': {'list': [[{'id': 2}]]},
+                    },
+                'roles': {'1.0.0': {'read': [{'id': 'admin'}]}},
+                },
+            remote: {
+                'posts': {'1.0.0': {'list': [[{'id': 1}, {'id': 3}]]}},
+                },
+            },
+        'r': {local: {'users': {'1': {
+            local: {'roles': 'admin'},
+            remote: {'posts': ['1', '2', '3']},
+            }}}},
+        }
+    transport = Transport(payload)
+    resolver = transport.get_relation_resolver()
+    assert isinstance(resolver, RelationResolver)
+    assert resolver.get_primary_key_name() == 'id'
+    # Resolvers are created once for each primary key name
+    assert transport.get_relation_resolver() is resolver
+    assert transport.get_relation_resolver('uid') is not resolver
+
+    # Entities from all the service versions are indexed
+    assert resolver.get_entity(local, 'users', 1) == {'id': 1, 'name': 'Foo'}
+    assert resolver.get_entity(local, 'users', '2') == {'id': 2}
+    assert resolver.get_entity(remote, 'posts', 3) == {'id': 3}
+    assert resolver.get_entity(local, 'users', 3) is None
+    assert resolver.get_entity(local, 'missing', 1) is None
+
+    # Get the relations with the related entities
+    relations = sorted(
+        resolver.get_related(local, 'users', 1),
+        key=lambda relation: relation.get_name(),
+        )
+    assert len(relations) == 2
+    assert isinstance(relations[0], ResolvedRelation)
+    assert relations[0].get_address() == remote
+    assert relations[0].get_name() == 'posts'
+    assert relations[0].get_type() == 'many'
+    assert relations[0].get_foreign_keys() == ['1', '2', '3']
+    # Only the entities in the transport are returned
+    assert relations[0].get_entities() == [{'id': 1}, {'id': 3}]
+    assert relations[1].get_address() == local
+    assert relations[1].get_name() == 'roles'
+    assert relations[1].get_type() == 'one'
+    assert relations[1].get_entity() == {'id': 'admin'}
+    assert resolver.get_related(local, 'users', 2) == []
+    assert resolver.get_related(remote, 'users', 1) == []
+
+    # Get related entities by service name
+    assert resolver.get_related_entities(local, 'users', {'id': 1}) == {
+        'posts': [{'id': 1}, {'id': 3}],
+        'roles': {'id': 'admin'},
+        }
+    assert resolver.get_related_entities(local, 'users', {'id': 2}) == {}
+    assert resolver.get_related_entities(local, 'users', {'name': 'Foo'}) == {}
+
+    # Related entities that are not in the transport are None
+    del payload['d'][local]['roles']
+    resolver = RelationResolver(payload)
+    assert resolver.get_related_entities(local, 'users', {'id': 1}) == {
+        'posts': [{'id': 1}, {'id': 3}],
+        'roles': None,
+        }
+
+    # Resolve relations without transport data
+    resolver = RelationResolver({})
+    assert resolver.get_entity(local, 'users', 1) is None
+    assert resolver.get_related(local, 'users', 1) == []
+
+
 def test_api_transport_links(read_json):
     transport = Transport(read_json('transport.json'))
     payload = transport._Transport__transport
@@ -146,6 +231,80 @@ def test_api_transport_links(read_json):
     assert transport.get_links() == []
 
 
+def test_api_transport_render_json(read_json):
+    payload = read_json('transport.json')
+    transport = Transport(payload)
+    result = json.loads(transport.render_json())
+    assert result == {
+        'data': payload['d'],
+        'relations': payload['r'],
+        'links': payload['l'],
+        }
+
+    # Custom types are serialized using the encoder
+    address = 'http://127.0.0.1:80'
+    date = datetime.datetime(2018, 1, 2, 3, 4, 5)
+    entity = {'id': 1, 'date': date}
+    transport = Transport({'d': {address: {'users': {'1.0.0': {'read': [entity]}}}}})
+    result = json.loads(transport.render_json())
+    assert result['data'][address]['users']['1.0.0']['read'] == [
+        {'id': 1, 'date': '2018-01-02T03:04:05.000000+00:00'},
+        ]
+    assert result['relations'] == {}
+    assert result['links'] == {}
+
+    # Embed the related entities
+    payload = {
+        'd': {address: {
+            'users': {'1.0.0': {'read': [{'id': 1, 'name': 'Foo'}]}},
+            'posts': {'1.0.0': {'list': [[{'id': 1}, {'id': 2}]]}},
+            'roles': {'1.0.0': {'read': [{'id': 'admin'}]}},
+            }},
+        'r': {address: {'users': {'1': {address: {
+            'posts': ['1', '2', '3'],
+            'roles': 'admin',
+            }}}}},
+        }
+    transport = Transport(payload)
+    result = json.loads(transport.render_json(embed=True))
+    assert sorted(result.keys()) == ['data', 'links']
+    data = result['data'][address]
+    assert data['users']['1.0.0']['read'] == [{
+        'id': 1,
+        'name': 'Foo',
+        '_embedded': {
+            # Related entities missing from the data are not embedded
+            'posts': [{'id': 1}, {'id': 2}],
+            'roles': {'id': 'admin'},
+            },
+        }]
+    # Entities without relations are not changed
+    assert data['posts']['1.0.0']['list'] == [[{'id': 1}, {'id': 2}]]
+
+    # Use custom primary key and embed field names
+    payload['d'][address]['users']['1.0.0']['read'] = [{'uid': 1}]
+    payload['d'][address]['roles']['1.0.0']['read'] = [{'uid': 'admin'}]
+    result = json.loads(transport.render_json(
+        embed=True,
+        primary_key='uid',
+        embed_field='related',
+        ))
+    data = result['data'][address]
+    assert data['users']['1.0.0']['read'] == [{
+        'uid': 1,
+        'related': {'posts': [], 'roles': {'uid': 'admin'}},
+        }]
+
+    # Existing entity fields are not replaced by the embedded entities
+    payload['d'][address]['users']['1.0.0']['read'] = [{'uid': 1, 'related': 1}]
+    with pytest.raises(ApiError):
+        transport.render_json(
+            embed=True,
+            primary_key='uid',
+            embed_field='related',
+            )
+
+
 def test_api_transport_calls(read_json):
     transport = Transport(read_json('transport.json'))
     payload = transport._Transport__transport
@@ -250,3 +409,66 @@ def test_api_transport_errors(read_json):
     # Remove errors
     assert delete_path(payload, 'errors')
     assert transport.get_errors() == []
+
+
+def test_api_transport_iterators(read_json):
+    transport = Transport(read_json('transport.json'))
+    payload = transport._Transport__transport
+    address = 'http://127.0.0.1:80'
+
+    # Iterators are generators
+    assert isinstance(transport.iter_data(), types.GeneratorType)
+    assert isinstance(transport.iter_relations(), types.GeneratorType)
+    assert isinstance(transport.iter_links(), types.GeneratorType)
+    assert isinstance(transport.iter_calls(), types.GeneratorType)
+    assert isinstance(transport.iter_errors(), types.GeneratorType)
+    assert isinstance(transport.iter_transactions('commit'), types.GeneratorType)
+
+    # Invalid transaction types fail before iterating
+    with pytest.raises(TransactionTypeError):
+        transport.iter_transactions('foo')
+
+    # Filter the data
+    data = list(transport.iter_data(service='users'))
+    assert len(data) == 1
+    assert data[0].get_name() == 'users'
+    assert data[0].get_version() == '1.0.0'
+    assert len(list(transport.iter_data(address, 'users', '1.0.0'))) == 1
+    assert len(list(transport.iter_data(address))) == 2
+    assert list(transport.iter_data(service='users', version='2.0.0')) == []
+    assert list(transport.iter_data(address='ktp://87.65.43.21:4321')) == []
+
+    # Filter the relations
+    relations = list(transport.iter_relations(address, 'posts'))
+    assert len(relations) == 2
+    assert all(relation.get_name() == 'posts' for relation in relations)
+    assert list(transport.iter_relations(service='missing')) == []
+
+    # Filter the links
+    links = list(transport.iter_links(service='users'))
+    assert len(links) == 1
+    assert links[0].get_uri() == 'http://api.example.com/v1/users/123'
+    assert list(transport.iter_links(address, 'posts')) == []
+
+    # Filter the calls
+    calls = list(transport.iter_calls(service='users', version='1.0.0'))
+    assert len(calls) == 2
+    assert all(call.get_name() == 'users' for call in calls)
+    assert list(transport.iter_calls(service='foo', version='2.0.0')) == []
+
+    # Filter the errors
+    assert transport.has_errors()
+    errors = transport.get_errors_for('users')
+    assert len(errors) == 1
+    assert errors[0].get_message() == 'The user does not exist'
+    assert len(transport.get_errors_for('users', '1.0.0', address)) == 1
+    assert transport.get_errors_for('users', '2.0.0') == []
+    assert transport.get_errors_for('posts') == []
+
+    # Empty error lists are not errors
+    payload.set('errors', {address: {'users': {'1.0.0': []}}})
+    assert not transport.has_errors()
+
+    assert delete_path(payload, 'errors')
+    assert not transport.has_errors()
+    assert transport.get_errors_for('users') == []
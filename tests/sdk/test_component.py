@@ -1,10 +1,16 @@
 from __future__ import unicode_literals
 
+import logging
+import threading
+import time
+
 import pytest
 
+from katana.logging import value_to_log_string
 from katana.schema import get_schema_registry
 from katana.sdk.component import Component
 from katana.sdk.component import ComponentError
+from katana.sdk.component import ResourcePool
 
 
 def test_component():
@@ -32,6 +38,140 @@ def test_component():
     assert component.error(lambda: 'foo') == component
 
 
+def test_component_lazy_resource(mocker):
+    Component.instance = None
+    component = Component()
+    factory = mocker.MagicMock(return_value='RESULT')
+    component.set_resource('lazy', factory, lazy=True)
+    assert component.has_resource('lazy')
+    factory.assert_not_called()
+
+    # Resource is created once, the first time it is used
+    assert component.get_resource('lazy') == 'RESULT'
+    assert component.get_resource('lazy') == 'RESULT'
+    factory.assert_called_once_with(component)
+
+    # Invalid values fail when the resource is used
+    component.set_resource('invalid', lambda component: None, lazy=True)
+    with pytest.raises(ComponentError):
+        component.get_resource('invalid')
+
+
+def test_component_resource_pool():
+    Component.instance = None
+    component = Component()
+    values = iter(range(10))
+
+    with pytest.raises(ComponentError):
+        component.set_resource_pool('pool', lambda component: 1, 0)
+
+    component.set_resource_pool('pool', lambda c: next(values), 2, timeout=0.05)
+    assert component.has_resource('pool')
+    pool = component.get_resource_pool('pool')
+    assert pool.get_size() == 2
+    assert pool.get_created() == 0
+    assert component.get_resource_pool('missing') is None
+
+    # The same value is used until the request finishes
+    assert component.get_resource('pool') == 0
+    assert component.get_resource('pool') == 0
+    assert pool.get_created() == 1
+    assert pool.get_idle() == 0
+
+    # Other threads get their own value
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(component.get_resource('pool')),
+        )
+    thread.start()
+    thread.join()
+    assert result == [1]
+    assert pool.get_created() == 2
+
+    # The pool is full, so checkouts time out
+    with pytest.raises(ComponentError):
+        pool.checkout()
+
+    # Values are returned to the pool when the request finishes
+    component.release_resources()
+    assert pool.get_idle() == 1
+    assert component.get_resource('pool') == 0
+    component.release_resources()
+    component.release_resources()
+    assert pool.get_idle() == 1
+
+
+def failing_factory():
+    raise Exception('Boom')
+
+
+def test_resource_pool_wait():
+    pool = ResourcePool('foo', lambda: object(), 1)
+    value = pool.checkout()
+
+    # Wait until the value is returned by another thread
+    def checkin():
+        time.sleep(0.01)
+        pool.checkin(value)
+
+    thread = threading.Thread(target=checkin)
+    thread.start()
+    assert pool.checkout() is value
+    thread.join()
+
+    # Factory errors don't use a place in the pool
+    pool = ResourcePool('foo', failing_factory, 1)
+    with pytest.raises(Exception):
+        pool.checkout()
+
+    with pytest.raises(Exception):
+        pool.checkout()
+
+    assert pool.get_created() == 0
+
+    pool = ResourcePool('foo', lambda: None, 1)
+    with pytest.raises(ComponentError):
+        pool.checkout()
+
+    assert pool.get_created() == 0
+
+
+def test_component_load_resources(mocker):
+    Component.instance = None
+    component = Component()
+    barrier = threading.Event()
+    started = []
+
+    # Each factory waits for the others to start, which only
+    # works when the resources are created concurrently.
+    def factory(component):
+        started.append(1)
+        if len(started) == 3:
+            barrier.set()
+
+        assert barrier.wait(1)
+        return len(started)
+
+    component.set_resource('a', factory, lazy=True)
+    component.set_resource('b', factory, lazy=True)
+    component.set_resource_pool('c', factory, 2)
+    component.load_resources()
+    assert component.get_resource('a') == 3
+    assert component.get_resource('b') == 3
+    assert component.get_resource_pool('c').get_created() == 1
+    assert component.get_resource_pool('c').get_idle() == 1
+
+    # Loaded resources are not created again
+    component.load_resources()
+    assert len(started) == 3
+
+    # A single resource is created in the current thread
+    factory = mocker.MagicMock(return_value='RESULT')
+    component.set_resource('d', factory, lazy=True)
+    component.load_resources()
+    factory.assert_called_once_with(component)
+
+
 def test_component_run(mocker):
     Component.instance = None
     component = Component()
@@ -77,10 +217,111 @@ def test_component_run(mocker):
     runner.set_error_callback.assert_called_once_with(error_callback)
 
 
-def test_component_log(logs):
+def test_component_reload(mocker, registry):
+    Component.instance = None
+    component = Component()
+    runner = mocker.MagicMock()
+    component._runner = runner
+    component.set_reload_signal(1)
+    component.run()
+    runner.set_reload_signal.assert_called_once_with(1)
+    runner.run.assert_called_once()
+
+    # While reloading only the callbacks are updated
+    runner.reset_mock()
+    component._callbacks = {'foo': None}
+    component._reloading = True
+    component.run()
+    runner.set_callbacks.assert_called_once_with({'foo': None})
+    runner.run.assert_not_called()
+
+    # Existing resources are not created again
+    component.set_resource('foo', lambda component: 'FOO')
+    component.set_resource('foo', lambda component: 'BAR')
+    component.set_resource_pool('foo', lambda component: 'BAR', 1)
+    assert component.get_resource('foo') == 'FOO'
+    component._reloading = False
+
+
+def test_component_schema_snapshot(mocker, registry, tmpdir):
+    path = str(tmpdir.join('schemas.bin'))
+    Component.instance = None
+    component = Component()
+    component._runner = mocker.MagicMock()
+    component.set_schema_snapshot(path)
+    component.run()
+    assert registry.get_snapshot_path() == path
+
+
+def test_component_recycling(mocker, registry):
+    Component.instance = None
+    component = Component()
+    runner = mocker.MagicMock()
+    component._runner = runner
+    component.run()
+    runner.set_recycling.assert_not_called()
+
+    component.set_recycling(max_requests=100, max_memory=1024)
+    component.run()
+    runner.set_recycling.assert_called_once_with(100, 1024)
+
+
+def test_component_idle_gc(mocker, registry):
+    Component.instance = None
+    component = Component()
+    runner = mocker.MagicMock()
+    component._runner = runner
+    component.run()
+    runner.set_idle_gc.assert_not_called()
+
+    component.set_idle_gc(0)
+    component.run()
+    runner.set_idle_gc.assert_called_once_with(0)
+
+
+def test_component_log_queue(mocker, registry):
+    Component.instance = None
+    component = Component()
+    runner = mocker.MagicMock()
+    component._runner = runner
+    component.run()
+    runner.set_log_queue.assert_not_called()
+
+    component.set_log_queue(100, block=True)
+    component.run()
+    runner.set_log_queue.assert_called_once_with(100, True)
+
+
+def test_component_logging_settings(mocker, registry):
+    Component.instance = None
+    component = Component()
+    runner = mocker.MagicMock()
+    component._runner = runner
+    component.run()
+    runner.set_request_sampling.assert_not_called()
+    runner.set_structured_logging.assert_not_called()
+
+    component.set_request_sampling(0.5)
+    component.set_structured_logging()
+    component.run()
+    runner.set_request_sampling.assert_called_once_with(0.5)
+    runner.set_structured_logging.assert_called_once_with(True)
+
+
+def test_component_log(mocker, logs):
     Component.instance = None
     expected = 'Test log message'
     Component().log(expected)
     out = logs.getvalue()
     # Output without line break should match
     assert out.rstrip().endswith(expected)
+
+    # Values are not converted to string when the level is disabled
+    to_string = mocker.patch('katana.sdk.component.value_to_log_string')
+    Component().log({'a': 1}, level=logging.DEBUG)
+    assert not to_string.called
+
+    # Log a value as compact JSON
+    to_string.side_effect = value_to_log_string
+    Component().log({'a': 1}, compact=True)
+    assert logs.getvalue().rstrip().endswith('{"a":1}')
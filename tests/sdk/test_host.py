@@ -0,0 +1,168 @@
+import signal
+
+import pytest
+
+from katana.middleware import MiddlewareServer
+from katana.schema import SchemaRegistry
+from katana.sdk.component import ComponentError
+from katana.sdk.host import ComponentHost
+from katana.sdk.host import create_component
+from katana.sdk.middleware import Middleware
+from katana.sdk.service import Service
+from katana.service import ServiceServer
+from katana.utils import EXIT_ERROR
+from katana.utils import EXIT_OK
+
+
+def test_create_component():
+    Service.instance = None
+    service = Service()
+
+    # Created components are not the global instance
+    component = create_component(Service)
+    assert isinstance(component, Service)
+    assert component is not service
+    assert Service.instance is service
+    Service.instance = None
+
+
+def test_component_host():
+    host = ComponentHost()
+    service = host.service('foo', '1.0', max_concurrency=2)
+    middleware = host.middleware('bar', '1.0', channel='tcp://127.0.0.1:5010')
+    assert isinstance(service, Service)
+    assert isinstance(middleware, Middleware)
+    assert Service.instance is None
+
+    # Components can't be hosted twice
+    with pytest.raises(ComponentError):
+        host.service('foo', '1.0')
+
+    foo, bar = host.get_components()
+    assert foo.component is service
+    assert foo.server_cls is ServiceServer
+    assert foo.channel == 'ipc://@katana-service-foo-1-0'
+    assert foo.max_concurrency == 2
+    assert bar.component is middleware
+    assert bar.server_cls is MiddlewareServer
+    assert bar.channel == 'tcp://127.0.0.1:5010'
+    assert bar.max_concurrency is None
+
+    # Components are not running so there are no metrics
+    assert host.get_metrics() == {('foo', '1.0'): {}, ('bar', '1.0'): {}}
+
+
+def test_hosted_component_settings(mocker):
+    log = mocker.patch('katana.sdk.host.LOG')
+    host = ComponentHost()
+    service = host.service('foo', '1.0')
+    # Process settings of hosted components are ignored
+    service.set_reload_signal(signal.SIGHUP)
+    service.set_grace_period(5)
+    service.set_recycling(max_requests=100)
+    service.set_log_queue(100)
+    service.set_request_sampling(0.5)
+    service.set_structured_logging()
+    try:
+        service.run()
+    finally:
+        SchemaRegistry.instance = None
+
+    log.warning.assert_has_calls([
+        mocker.call('Reload is not supported by hosted components'),
+        mocker.call('Use the host to set the grace period'),
+        mocker.call('Recycling is not supported by hosted components'),
+        mocker.call('Use the host to set the logging queue'),
+        mocker.call('Use the host to set the request sampling'),
+        mocker.call('Use the host to set the structured logging'),
+        ])
+
+
+def test_component_host_run(mocker, cli):
+    exit = mocker.patch('os._exit')
+    gevent_signal = mocker.patch('gevent.signal')
+    gevent_joinall = mocker.patch('gevent.joinall')
+    greenlets = [
+        mocker.MagicMock(exception=None),
+        mocker.MagicMock(exception=None),
+        ]
+    gevent_spawn = mocker.patch('gevent.spawn', side_effect=greenlets)
+    setup_logging = mocker.patch('katana.sdk.host.setup_katana_logging')
+    cli_args = [
+        '--name', 'host',
+        '--version', '1.0',
+        '--framework-version', '1.0.0',
+        '--var', 'foo=bar',
+        '--log-level', '6',
+        ]
+
+    host = ComponentHost()
+    host.set_idle_gc()
+    host.set_log_queue(100, block=True)
+    startup = mocker.MagicMock()
+    shutdown = mocker.MagicMock()
+    foo = host.service('foo', '1.0', max_concurrency=2)
+    foo.action('bar', lambda action: action)
+    foo.startup(startup)
+    bar = host.service('bar', '2.0')
+    bar.shutdown(shutdown)
+    # Process settings of hosted components are ignored
+    bar.set_idle_gc()
+
+    try:
+        result = cli.invoke(host.run(), cli_args)
+    finally:
+        SchemaRegistry.instance = None
+
+    assert result.exit_code == 0
+    exit.assert_called_once_with(EXIT_OK)
+    assert setup_logging.call_args[1] == {'queue_size': 100, 'block': True}
+    startup.assert_called_once_with(foo)
+    shutdown.assert_called_once_with(bar)
+    gevent_signal.assert_called()
+    gevent_joinall.assert_called_once_with(greenlets)
+
+    # Each component has its own server that shares the pool and context
+    foo_hosted, bar_hosted = host.get_components()
+    assert foo_hosted.callbacks == foo._callbacks
+    assert foo_hosted.server.component_name == 'foo'
+    assert foo_hosted.server.component_version == '1.0'
+    assert foo_hosted.server.variables == {'foo': 'bar'}
+    assert foo_hosted.server.max_concurrency == 2
+    assert bar_hosted.server.component_name == 'bar'
+    assert bar_hosted.server.max_concurrency is None
+    assert foo_hosted.server._pool is bar_hosted.server._pool
+    gevent_spawn.assert_any_call(
+        foo_hosted.server.listen,
+        'ipc://@katana-service-foo-1-0',
+        )
+    gevent_spawn.assert_any_call(
+        bar_hosted.server.listen,
+        'ipc://@katana-service-bar-2-0',
+        )
+    assert host.get_metrics()[('foo', '1.0')]['requests'] == 0
+    # The garbage collection metrics are shared by the components
+    assert host.get_metrics()[('bar', '2.0')]['gc_collections'] == 0
+
+    # When a component fails the host exits with an error
+    exit.reset_mock()
+    greenlets[0] = mocker.MagicMock(exception=Exception('Boom'))
+    gevent_spawn.side_effect = greenlets
+    try:
+        result = cli.invoke(host.run(), cli_args)
+    finally:
+        SchemaRegistry.instance = None
+
+    exit.assert_called_once_with(EXIT_ERROR)
+
+    # When a startup callback fails the components are not run
+    exit.reset_mock()
+    gevent_spawn.reset_mock()
+    startup.side_effect = Exception('Boom')
+    try:
+        result = cli.invoke(host.run(), cli_args)
+    finally:
+        SchemaRegistry.instance = None
+
+    exit.assert_called_once_with(EXIT_ERROR)
+    gevent_spawn.assert_not_called()
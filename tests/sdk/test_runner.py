@@ -1,12 +1,18 @@
 import os
+import sys
 
 import click
 import pytest
 
+import katana.logging
+
 from katana import payload
+from katana.logging import DEFAULT_QUEUE_SIZE
 from katana.sdk.runner import apply_cli_options
 from katana.sdk.runner import ComponentRunner
+from katana.sdk.runner import is_zmq_error
 from katana.sdk.runner import key_value_strings_callback
+from katana.server import IdleCollector
 from katana.utils import EXIT_ERROR
 from katana.utils import EXIT_OK
 from zmq.error import ZMQError
@@ -32,6 +38,15 @@ def test_key_value_strings_callback():
         key_value_strings_callback(ctx, param, ['boom'])
 
 
+def test_is_zmq_error(mocker):
+    assert is_zmq_error(ZMQError(98))
+    assert not is_zmq_error(Exception('Boom'))
+
+    # When ZMQ is not imported the error can't be a ZMQ error
+    mocker.patch.dict('sys.modules', {'zmq.error': None})
+    assert not is_zmq_error(ZMQError(98))
+
+
 def test_apply_cli_options(mocker, cli):
     class Foo(ComponentRunner):
         pass
@@ -209,6 +224,46 @@ def test_component_run(mocker, cli):
     exit.assert_called_once_with(EXIT_OK)
 
 
+def test_component_run_log_queue(mocker, cli):
+    mocker.patch('os._exit')
+    mocker.patch('gevent.signal')
+    mocker.patch('gevent.spawn')
+    setup_logging = mocker.patch('katana.sdk.runner.setup_katana_logging')
+    cli_args = [
+        '--name', 'foo',
+        '--version', '1.0',
+        '--component', 'service',
+        '--framework-version', '1.0.0',
+        '--log-level', '6',
+        ]
+
+    # By default records are dropped when the logging queue is full
+    runner = ComponentRunner(None, mocker.MagicMock(), None)
+    runner.set_callbacks({})
+    cli.invoke(runner.run(), cli_args)
+    kwargs = setup_logging.call_args[1]
+    assert kwargs == {'queue_size': DEFAULT_QUEUE_SIZE, 'block': False}
+
+    runner.set_log_queue(100, block=True)
+    cli.invoke(runner.run(), cli_args)
+    assert setup_logging.call_args[1] == {'queue_size': 100, 'block': True}
+
+
+def test_component_runner_logging_settings(mocker):
+    mocker.patch('katana.logging.SAMPLE_RATE', 1.0)
+    mocker.patch('katana.logging.STRUCTURED', False)
+
+    # Logging settings apply to the whole process
+    runner = ComponentRunner(None, None, None)
+    runner.set_request_sampling(0.5)
+    runner.set_structured_logging()
+    assert katana.logging.SAMPLE_RATE == 0.5
+    assert katana.logging.STRUCTURED
+
+    with pytest.raises(ValueError):
+        runner.set_request_sampling(2)
+
+
 def test_component_run_errors(mocker, cli):
     exit = mocker.patch('os._exit')
     mocker.patch('gevent.signal')
@@ -252,7 +307,7 @@ def test_component_run_callbacks(mocker, cli):
     # Define values to be used in component runner
     startup_callback = mocker.MagicMock()
     shutdown_callback = mocker.MagicMock()
-    component = object()
+    component = mocker.MagicMock()
     ServerCls = mocker.MagicMock()
     cli_args = [
         '--name', 'foo',
@@ -274,6 +329,8 @@ def test_component_run_callbacks(mocker, cli):
     # Check that callbacks were called
     startup_callback.assert_called_once_with(component)
     shutdown_callback.assert_called_once_with(component)
+    # Pooled resources used by the callbacks are returned to the pools
+    assert component.release_resources.call_count == 2
 
     # Check normal exit
     exit.assert_called_once_with(EXIT_OK)
@@ -294,3 +351,123 @@ def test_component_run_callbacks(mocker, cli):
     assert result.exit_code == 0
     # Check error exit
     exit.assert_called_with(EXIT_ERROR)
+
+
+def test_component_runner_reload_callbacks(mocker, tmpdir):
+    from katana.sdk.service import Service
+
+    source = tmpdir.join('service.py')
+    source.write('\n'.join([
+        'from katana.sdk import Service',
+        'service = Service()',
+        'service.set_resource("db", lambda component: object())',
+        'service.action("foo", lambda action: "NEW")',
+        'if __name__ == "__main__":',
+        '    service.run()',
+        ]))
+
+    Service.instance = None
+    try:
+        service = Service()
+        runner = service._runner
+        runner_run = mocker.patch.object(runner, 'run')
+        db = object()
+        service.set_resource('db', lambda component: db)
+        service.action('foo', lambda action: 'OLD')
+        service.action('bar', lambda action: 'OLD')
+        runner.source_file = str(source)
+        runner.set_callbacks(service._callbacks)
+        server = mocker.MagicMock(callbacks=service._callbacks)
+        callbacks = server.callbacks
+
+        # Callbacks are replaced, and resources are kept
+        assert runner.reload_callbacks(server)
+        assert server.callbacks is not callbacks
+        assert sorted(server.callbacks.keys()) == ['foo']
+        assert server.callbacks['foo'](None) == 'NEW'
+        assert runner.callbacks is server.callbacks
+        assert service.get_resource('db') is db
+        assert not service._reloading
+        runner_run.assert_not_called()
+
+        # When the source file fails the callbacks are kept
+        callbacks = server.callbacks
+        source.write('raise Exception("Boom")')
+        assert not runner.reload_callbacks(server)
+        assert server.callbacks is callbacks
+        assert service._callbacks is callbacks
+        assert not service._reloading
+
+        # Source files without callbacks are not used
+        source.write('pass')
+        assert not runner.reload_callbacks(server)
+        assert server.callbacks is callbacks
+    finally:
+        Service.instance = None
+
+
+def test_component_runner_stop_server(mocker):
+    runner = ComponentRunner(None, None, None)
+    runner._args = {'timeout': 5000}
+    assert runner.get_grace_period() == 5
+    runner.set_grace_period(2)
+    assert runner.get_grace_period() == 2
+
+    server = mocker.MagicMock()
+    server.drain.return_value = False
+    greenlet = mocker.MagicMock()
+
+    # Server is stopped after draining the requests
+    runner.stop_server(server, greenlet)
+    server.drain.assert_called_once_with(2)
+    greenlet.kill.assert_called_once()
+
+    # When the server is already stopping it is stopped without draining
+    server.reset_mock()
+    greenlet.reset_mock()
+    runner.stop_server(server, greenlet)
+    server.drain.assert_not_called()
+    greenlet.kill.assert_called_once()
+
+
+def test_component_runner_recycle(mocker, cli):
+    exit = mocker.patch('os._exit')
+    execv = mocker.patch('os.execv')
+    mocker.patch('gevent.signal')
+    mocker.patch('gevent.spawn')
+    server = mocker.MagicMock()
+    server.is_recycling.return_value = True
+    ServerCls = mocker.MagicMock(return_value=server)
+    cli_args = [
+        '--name', 'foo',
+        '--version', '1.0',
+        '--component', 'service',
+        '--framework-version', '1.0.0',
+        ]
+
+    # Without limits the component is never recycled
+    runner = ComponentRunner(None, ServerCls, None)
+    runner.set_callbacks({})
+    cli.invoke(runner.run(), cli_args)
+    execv.assert_not_called()
+    exit.assert_called_once_with(EXIT_OK)
+    assert ServerCls.call_args[1]['gc_collector'] is None
+
+    exit.reset_mock()
+    runner.set_idle_gc()
+    runner.set_recycling(max_requests=10)
+    cli.invoke(runner.run(), cli_args)
+    args, kwargs = ServerCls.call_args
+    assert kwargs['max_requests'] == 10
+    assert kwargs['max_memory'] is None
+    assert isinstance(kwargs['gc_collector'], IdleCollector)
+    execv.assert_called_once()
+    assert execv.call_args[0][1] == [sys.executable] + sys.argv
+
+    # Servers that are not recycling exit
+    execv.reset_mock()
+    exit.reset_mock()
+    server.is_recycling.return_value = False
+    cli.invoke(runner.run(), cli_args)
+    execv.assert_not_called()
+    exit.assert_called_once_with(EXIT_OK)
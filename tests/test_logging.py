@@ -1,6 +1,22 @@
+import io
+import json
 import logging
+import sys
+import threading
+import uuid
 
+import pytest
+
+from katana import logging as katana_logging
+from katana.logging import AsyncStreamHandler
+from katana.logging import flush_logging
+from katana.logging import is_request_sampled
+from katana.logging import JsonFormatter
 from katana.logging import KatanaFormatter
+from katana.logging import RequestLogger
+from katana.logging import set_request_sampling
+from katana.logging import set_structured_logging
+from katana.logging import setup_katana_logging
 from katana.logging import value_to_log_string
 
 
@@ -34,6 +50,9 @@ def test_value_to_log_string():
     # Dictionaries and list are serialized as pretty JSON
     assert value_to_log_string({'a': 1}) == '{\n  "a": 1\n}'
     assert value_to_log_string(['1', '2']) == '[\n  "1", \n  "2"\n]'
+    # ... or as compact JSON
+    assert value_to_log_string({'a': 1}, compact=True) == '{"a":1}'
+    assert value_to_log_string(['1', '2'], compact=True) == '["1","2"]'
 
     # For unknown types 'repr()' is used to get log string
     assert value_to_log_string(Dummy()) == 'DUMMY'
@@ -73,3 +92,255 @@ def test_setup_katana_logging(logs):
     assert out_parts[4] == '[INFO]'  # Level
     assert out_parts[5] == '[SDK]'  # SDK prefix
     assert ' '.join(out_parts[6:]).strip() == message
+
+
+def test_async_stream_handler():
+    output = io.StringIO()
+    handler = AsyncStreamHandler(stream=output, queue_size=10)
+    assert not handler.is_blocking()
+    handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    logger = logging.Logger('test')
+    logger.addHandler(handler)
+
+    logger.info(u'First %s', u'message')
+    logger.error(u'Second')
+    handler.flush()
+    assert output.getvalue() == u'INFO First message\nERROR Second\n'
+    assert handler.get_dropped() == 0
+
+    # Records are written when the handler is closed
+    logger.info(u'Third')
+    handler.close()
+    assert output.getvalue().endswith(u'INFO Third\n')
+
+
+def test_async_stream_handler_prepare():
+    # Use a stream that blocks the writer thread until it is released
+    release = threading.Event()
+
+    class Stream(io.StringIO):
+        def write(self, value):
+            release.wait()
+            return io.StringIO.write(self, value)
+
+    output = Stream()
+    handler = AsyncStreamHandler(stream=output, queue_size=10)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger = logging.Logger('test')
+    logger.addHandler(handler)
+
+    # Messages use the argument values at the time of the call
+    values = [1]
+    logger.info(u'Values: %s', values)
+    values.append(2)
+
+    # Exceptions are formatted without keeping the traceback
+    try:
+        raise Exception('Boom')
+    except Exception:
+        logger.exception(u'Failed')
+
+    record = handler._AsyncStreamHandler__queue.queue[-1]
+    assert record.args is None
+    assert record.exc_info is None
+    assert 'Exception: Boom' in record.exc_text
+
+    release.set()
+    handler.close()
+    lines = output.getvalue().splitlines()
+    assert lines[0] == u'Values: [1]'
+    assert lines[1] == u'Failed'
+    assert lines[-1] == u'Exception: Boom'
+
+
+def test_async_stream_handler_full_queue():
+    # Use a stream that blocks the writer thread until it is released
+    release = threading.Event()
+
+    class Stream(io.StringIO):
+        def write(self, value):
+            release.wait()
+            return io.StringIO.write(self, value)
+
+    output = Stream()
+    handler = AsyncStreamHandler(stream=output, queue_size=1)
+    logger = logging.Logger('test')
+    logger.addHandler(handler)
+
+    # The first record is taken by the thread, and the second one is
+    # queued, so the following records are dropped.
+    logger.info(u'1')
+    while not handler._AsyncStreamHandler__queue.empty():
+        pass
+
+    logger.info(u'2')
+    logger.info(u'3')
+    logger.info(u'4')
+    assert handler.get_dropped() == 2
+
+    release.set()
+    handler.flush()
+    assert output.getvalue() == u'1\n2\n'
+
+    # Blocking handlers wait for room in the queue
+    release.clear()
+    output = Stream()
+    handler = AsyncStreamHandler(stream=output, queue_size=1, block=True)
+    assert handler.is_blocking()
+    logger = logging.Logger('test')
+    logger.addHandler(handler)
+    thread = threading.Thread(target=lambda: [
+        logger.info(str(value).decode('utf8')) for value in range(4)
+        ])
+    thread.start()
+    thread.join(0.1)
+    assert thread.is_alive()
+    release.set()
+    thread.join()
+    handler.close()
+    assert output.getvalue() == u'0\n1\n2\n3\n'
+    assert handler.get_dropped() == 0
+
+
+def test_setup_katana_logging_async(mocker):
+    output = io.StringIO()
+    mocker.patch('katana.logging.get_output_buffer', return_value=output)
+    try:
+        setup_katana_logging(
+            'component', 'name', 'version', 'framework-version', logging.INFO,
+            queue_size=100,
+            block=True,
+            )
+        handler = logging.getLogger('katana').handlers[0]
+        assert isinstance(handler, AsyncStreamHandler)
+        assert isinstance(handler.formatter, KatanaFormatter)
+        assert handler.is_blocking()
+        # All the loggers share the same handler
+        assert logging.root.handlers == [handler]
+        assert logging.getLogger('katana.api').handlers == [handler]
+
+        logging.getLogger('katana').info(u'Test message')
+        flush_logging()
+        assert output.getvalue().strip().endswith(u'[SDK] Test message')
+    finally:
+        for handler in logging.root.handlers:
+            logging.root.removeHandler(handler)
+
+        logging.getLogger('katana').handlers = []
+        logging.getLogger('katana.api').handlers = []
+        handler.close()
+
+
+def test_is_request_sampled():
+    rids = [str(uuid.uuid4()) for _ in range(2000)]
+
+    assert all(is_request_sampled(rid, 1) for rid in rids)
+    assert not any(is_request_sampled(rid, 0) for rid in rids)
+    # Requests without ID are always sampled
+    assert is_request_sampled(None, 0)
+    assert is_request_sampled('', 0.5)
+
+    # Sampling is the same for each request ID
+    sampled = [rid for rid in rids if is_request_sampled(rid, 0.25)]
+    assert sampled == [rid for rid in rids if is_request_sampled(rid, 0.25)]
+    assert 300 < len(sampled) < 700
+    # Requests sampled with a lower rate are sampled with higher rates
+    assert all(is_request_sampled(rid, 0.5) for rid in sampled)
+    assert is_request_sampled(u'\xf1', 1)
+
+
+def test_set_request_sampling():
+    try:
+        set_request_sampling(0.5)
+        assert katana_logging.SAMPLE_RATE == 0.5
+
+        for rate in (-0.1, 1.1):
+            with pytest.raises(ValueError):
+                set_request_sampling(rate)
+
+        assert katana_logging.SAMPLE_RATE == 0.5
+    finally:
+        set_request_sampling(1)
+
+
+def test_request_logger(logs):
+    rlog = RequestLogger('RID', 'katana', action='foo')
+    assert rlog.sampled
+    assert rlog.action == 'foo'
+    rlog.info(u'Message %s', u'one')
+    assert logs.getvalue().rstrip().endswith(u'Message one |RID|')
+
+    try:
+        set_request_sampling(0)
+        rlog = RequestLogger('RID', 'katana')
+        assert not rlog.sampled
+        assert not rlog.isEnabledFor(logging.WARNING)
+        assert rlog.isEnabledFor(logging.ERROR)
+
+        # Only errors are logged for requests that are not sampled
+        rlog.warning(u'Message two')
+        assert u'Message two' not in logs.getvalue()
+        rlog.error(u'Message three')
+        assert logs.getvalue().rstrip().endswith(u'Message three |RID|')
+    finally:
+        set_request_sampling(1)
+
+
+def test_json_formatter():
+    formatter = JsonFormatter('service', 'foo', '1.0', '2.0.0')
+    record = logging.LogRecord(
+        'katana', logging.INFO, __file__, 1, u'Message %s', (u'one', ), None,
+        )
+    record.created = 1485622839.2490458
+    entry = json.loads(formatter.format(record))
+    assert entry == {
+        'timestamp': '2017-01-28T17:00:39.249Z',
+        'level': 'INFO',
+        'component': {'type': 'service', 'name': 'foo', 'version': '1.0'},
+        'framework': '2.0.0',
+        'message': 'Message one',
+        }
+
+    # Request values are added when available
+    record.request_id = 'RID'
+    record.action = 'bar'
+    record.duration = 1.5
+    try:
+        raise Exception('Failed')
+    except Exception:
+        record.exc_info = sys.exc_info()
+
+    output = formatter.format(record)
+    assert '\n' not in output
+    entry = json.loads(output)
+    assert entry['request_id'] == 'RID'
+    assert entry['action'] == 'bar'
+    assert entry['duration'] == 1.5
+    assert entry['exception'].endswith('Exception: Failed')
+
+
+def test_setup_katana_logging_structured(mocker):
+    output = io.StringIO()
+    mocker.patch('katana.logging.get_output_buffer', return_value=output)
+    set_structured_logging()
+    try:
+        setup_katana_logging(
+            'service', 'foo', '1.0', '2.0.0', logging.INFO,
+            )
+        handler = logging.getLogger('katana').handlers[0]
+        assert isinstance(handler.formatter, JsonFormatter)
+
+        # Request ID is not added to the message
+        RequestLogger('RID', 'katana', action='bar').info(u'Message')
+        entry = json.loads(output.getvalue())
+        assert entry['message'] == 'Message'
+        assert entry['request_id'] == 'RID'
+        assert entry['action'] == 'bar'
+    finally:
+        set_structured_logging(False)
+        for handler in logging.root.handlers:
+            logging.root.removeHandler(handler)
+
+        logging.getLogger('katana').handlers = []
+        logging.getLogger('katana.api').handlers = []
+
@@ -2,7 +2,9 @@ import pytest
 
 from katana import schema
 from katana import utils
+from katana.api.router import get_router
 from katana.errors import KatanaError
+from katana.serialization import pack
 
 
 def test_schema_registry():
@@ -41,3 +43,110 @@ def test_schema_registry():
 
     # ... and with a default
     assert registry.get('missing/path', default='DEFAULT') == 'DEFAULT'
+
+
+def test_schema_registry_revision(registry):
+    mappings = {'foo': {'1.0': {'field': 'value'}}}
+    stream = pack(mappings)
+    registry.update_registry(mappings, stream=stream)
+    revision = registry.revision
+    router = get_router(registry)
+    assert registry.is_current(stream)
+
+    # Same mappings don't change the revision or the router
+    registry.update_registry(mappings, stream=pack(mappings))
+    assert registry.revision == revision
+    assert get_router(registry) is router
+    registry.update_registry(mappings)
+    assert registry.revision == revision
+
+    # Different mappings change the revision
+    registry.update_registry({'bar': {}}, stream=pack({'bar': {}}))
+    assert registry.revision > revision
+    assert not registry.is_current(stream)
+    assert get_router(registry) is not router
+
+
+def test_schema_registry_snapshot(registry, tmpdir, mocker):
+    schema.SchemaRegistry.instance = None
+    registry = schema.SchemaRegistry()
+    path = str(tmpdir.join('schemas.bin'))
+    mappings = {'foo': {'1.0': {'field': 'value'}}}
+    stream = pack(mappings)
+
+    # A missing snapshot file keeps the registry empty
+    revision = registry.revision
+    registry.set_snapshot_path(path)
+    assert registry.get_snapshot_path() == path
+    assert registry.revision == revision
+    assert registry.has_mappings is False
+
+    # Updating the registry writes the snapshot
+    registry.update_registry(mappings, stream=stream)
+    assert tmpdir.join('schemas.bin').read_binary() == stream
+
+    # Same mappings don't write the snapshot again
+    write_snapshot = mocker.patch('katana.schema.write_snapshot')
+    registry.update_registry(mappings, stream=stream)
+    write_snapshot.assert_not_called()
+    mocker.stopall()
+
+    # Updates without a stream are not persisted
+    registry.update_registry({})
+    assert tmpdir.join('schemas.bin').read_binary() == stream
+
+    # A new registry loads the snapshot and unpacks it on first use
+    schema.SchemaRegistry.instance = None
+    registry = schema.SchemaRegistry()
+    unpack = mocker.patch('katana.schema.unpack', side_effect=schema.unpack)
+    registry.set_snapshot_path(path)
+    assert registry.revision > revision
+    unpack.assert_not_called()
+    assert registry.get_service_names() == ['foo']
+    assert registry.get('foo/1.0/field') == 'value'
+    unpack.assert_called_once()
+
+    # Loaded mappings are not written again and don't change the revision
+    revision = registry.revision
+    write_snapshot = mocker.patch('katana.schema.write_snapshot')
+    registry.update_registry(mappings, stream=stream)
+    write_snapshot.assert_not_called()
+    assert registry.revision == revision
+
+    # Invalid snapshots are ignored
+    tmpdir.join('invalid.bin').write_binary(b'\xc1')
+    registry.set_snapshot_path(str(tmpdir.join('invalid.bin')))
+    assert registry.has_mappings is False
+
+
+def test_schema_is_same_stream(tmpdir):
+    path = str(tmpdir.join('schemas.bin'))
+    stream = pack({'foo': 'bar'})
+    assert schema.write_snapshot(path, stream)
+    snapshot = schema.read_snapshot(path)
+
+    # Memory maps are compared with the streams
+    assert schema.is_same_stream(stream, snapshot)
+    assert schema.is_same_stream(snapshot, stream)
+    assert not schema.is_same_stream(pack({'foo': 'baz'}), snapshot)
+    assert not schema.is_same_stream(pack({}), snapshot)
+    assert not schema.is_same_stream(stream, None)
+    assert not schema.is_same_stream(None, None)
+
+
+def test_schema_snapshot_files(tmpdir):
+    path = str(tmpdir.join('schemas.bin'))
+
+    # Missing and empty files can't be read
+    assert schema.read_snapshot(path) is None
+    tmpdir.join('schemas.bin').write_binary(b'')
+    assert schema.read_snapshot(path) is None
+
+    assert schema.write_snapshot(path, b'DATA')
+    assert schema.read_snapshot(path)[:] == b'DATA'
+
+    # Temporary files are removed
+    assert tmpdir.listdir() == [tmpdir.join('schemas.bin')]
+
+    # Snapshots can't be written to missing directories
+    assert not schema.write_snapshot(str(tmpdir.join('missing', 'x')), b'A')
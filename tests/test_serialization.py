@@ -8,6 +8,7 @@ from katana.payload import Payload
 from katana.serialization import decode
 from katana.serialization import encode
 from katana.serialization import pack
+from katana.serialization import pack_stream
 from katana.serialization import stream_to_payload
 from katana.serialization import unpack
 
@@ -74,6 +75,27 @@ def test_pack():
     assert pack({'foo': 'bar'}) == b'\x81\xa3foo\xa3bar'
 
 
+class Stream(object):
+    def __init__(self, items):
+        self.items = items
+
+    def __stream__(self):
+        for item in self.items:
+            yield item
+
+
+def test_pack_stream():
+    buffer = bytearray(b'\x01')
+    assert pack_stream(Stream([{'foo': 1}, 2]), buffer) == 2
+    # The array uses a 32 bit header after the existing buffer contents
+    assert buffer[:6] == b'\x01\xdd\x00\x00\x00\x02'
+    assert unpack(bytes(buffer[1:])) == [{'foo': 1}, 2]
+
+    # Streamed values are packed inside the rest of the data
+    stream = pack({'a': Stream([1, 2]), 'b': Stream([]), 'c': 3})
+    assert unpack(stream) == {'a': [1, 2], 'b': [], 'c': 3}
+
+
 def test_unpack():
     assert unpack(b'\x81\xa3foo\xa3bar') == {'foo': 'bar'}
 
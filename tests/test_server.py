@@ -0,0 +1,506 @@
+import socket
+import threading
+import time
+
+import gevent
+import pytest
+import zmq.green as zmq
+
+from gevent.lock import BoundedSemaphore
+
+from katana.errors import KatanaError
+from katana.payload import CommandPayload
+from katana.sdk.component import Component
+from katana.sdk.service import Service
+from katana.serialization import pack
+from katana.serialization import unpack
+from katana.server import ComponentServer
+from katana.server import create_error_response
+from katana.server import DOWNLOAD
+from katana.server import EMPTY_META
+from katana.server import IdleCollector
+from katana.server import ServerMetrics
+from katana.server import TRANSACTIONS
+from katana.service import ServiceServer
+
+
+def test_server_metrics():
+    metrics = ServerMetrics()
+    values = metrics.get()
+    assert sorted(values.keys()) == sorted(ServerMetrics.NAMES)
+    assert set(values.values()) == {0}
+
+    metrics.add('requests')
+    metrics.add('duration', 15)
+    metrics.add('duration', 5)
+    values = metrics.get()
+    assert values['requests'] == 1
+    assert values['duration'] == 20
+
+    # Values are a copy of the metrics
+    values['requests'] = 10
+    assert metrics.get()['requests'] == 1
+
+
+def test_idle_collector(mocker):
+    gc = mocker.patch('katana.server.gc')
+    gc.get_threshold.return_value = (700, 10, 10)
+    gc.isenabled.return_value = True
+
+    collector = IdleCollector(threshold_factor=10)
+    collector.start()
+    gc.set_threshold.assert_called_once_with(7000, 100, 100)
+    # Servers that share the collector don't raise the thresholds again
+    collector.start()
+    gc.set_threshold.assert_called_once()
+
+    # Nothing is collected when the counts are below the thresholds
+    gc.get_count.return_value = (100, 0, 0)
+    collector.enter()
+    collector.enter()
+    collector.leave()
+    collector.leave()
+    assert collector.collect() is None
+    gc.collect.assert_not_called()
+
+    # The oldest generation that reached its threshold is collected,
+    # but only when there are no requests.
+    gc.get_count.return_value = (800, 11, 0)
+    collector.enter()
+    gc.collect.assert_not_called()
+    collector.leave()
+    gc.collect.assert_called_once_with(1)
+
+    gc.get_count.return_value = (800, 11, 11)
+    assert collector.collect() == 2
+    metrics = collector.get_metrics()
+    assert metrics['gc_collections'] == 2
+    assert metrics['gc_full_collections'] == 1
+    assert metrics['gc_max_pause'] <= metrics['gc_pause']
+
+    # The thresholds are restored when the last server stops
+    gc.set_threshold.reset_mock()
+    collector.stop()
+    gc.set_threshold.assert_not_called()
+    collector.stop()
+    gc.set_threshold.assert_called_once_with(700, 10, 10)
+    gc.enable.assert_called_once()
+
+    # The automatic collection can be disabled while the servers run
+    gc.reset_mock()
+    gc.get_threshold.return_value = (700, 10, 10)
+    collector = IdleCollector(threshold_factor=0)
+    collector.start()
+    gc.disable.assert_called_once()
+    gc.set_threshold.assert_not_called()
+    collector.stop()
+    gc.enable.assert_called_once()
+
+
+class SlowServer(ComponentServer):
+    component = Component.new_instance()
+
+    def get_component(self):
+        return self.component
+
+    def process_payload(self, action, payload):
+        time.sleep(0.05)
+        return {'action': action}
+
+
+def get_tcp_channel():
+    # Get a free TCP port
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    channel = 'tcp://127.0.0.1:{}'.format(sock.getsockname()[1])
+    sock.close()
+    return channel
+
+
+def test_server_drain(registry):
+    channel = get_tcp_channel()
+    server = SlowServer({'foo': None}, {'name': 'foo', 'timeout': 1000})
+    # Servers that are not listening are always drained
+    assert server.drain(0)
+
+    greenlet = gevent.spawn(server.listen, channel)
+    context = zmq.Context()
+    client = context.socket(zmq.REQ)
+    client.linger = 0
+    try:
+        client.connect(channel)
+        client.send_multipart([b'foo', b'', b'\x80'])
+        # Wait until the request is being processed
+        while not server.get_metrics()['active']:
+            gevent.sleep(0.001)
+
+        # Draining waits for the current request
+        assert server.drain(1)
+        assert unpack(client.recv_multipart()[1]) == {'action': 'foo'}
+
+        # New requests are not received after draining
+        client.send_multipart([b'foo', b'', b'\x80'])
+        assert not client.poll(100)
+        assert server.get_metrics()['requests'] == 1
+    finally:
+        client.close()
+        greenlet.kill()
+        context.term()
+
+
+class ConcurrentServer(SlowServer):
+    def __init__(self, *args, **kwargs):
+        super(ConcurrentServer, self).__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    def process_payload(self, action, payload):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.active, self.max_active)
+
+        try:
+            return super(ConcurrentServer, self).process_payload(
+                action,
+                payload,
+                )
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def test_server_concurrency(registry):
+    channel = get_tcp_channel()
+    server = ConcurrentServer(
+        {'foo': None},
+        {'name': 'foo', 'timeout': 1000},
+        max_concurrency=2,
+        )
+    greenlet = gevent.spawn(server.listen, channel)
+    context = zmq.Context()
+    # Clients can send many requests without waiting for the responses
+    client = context.socket(zmq.DEALER)
+    client.linger = 0
+    try:
+        client.connect(channel)
+        for _ in range(4):
+            client.send_multipart([b'', b'foo', b'', b'\x80'])
+
+        for _ in range(4):
+            # Responses are routed back with the request envelope
+            assert client.poll(1000)
+            envelope, meta, payload = client.recv_multipart()
+            assert envelope == b''
+            assert unpack(payload) == {'action': 'foo'}
+    finally:
+        client.close()
+        greenlet.kill()
+        context.term()
+
+    # Requests are processed at once up to the concurrency limit
+    assert server.max_active == 2
+    assert server.get_metrics()['requests'] == 4
+    assert server.get_metrics()['rejected'] == 0
+
+
+def test_server_concurrency_rejected(registry, mocker):
+    server = ComponentServer(
+        {'foo': None},
+        {'name': 'foo', 'timeout': 1000},
+        max_concurrency=1,
+        )
+    send_response = mocker.patch.object(server, '_send_response')
+    slots = BoundedSemaphore(1)
+    server._ComponentServer__slots = slots
+
+    # Requests that don't get a slot during the timeout are rejected
+    slots.acquire()
+    stream = [b'client', b'', b'foo', b'', b'\x80']
+    server._ComponentServer__process_request(stream, 1, 0.01)
+    assert server.get_metrics()['rejected'] == 1
+    assert server.get_metrics()['active'] == 0
+
+    response = send_response.call_args[0][0]
+    assert response[:2] == [b'client', b'']
+    msg = 'SDK execution timed out after 10ms'
+    assert response[2:] == create_error_response(msg)
+
+
+class EchoServer(ComponentServer):
+    component = Component.new_instance()
+
+    def get_component(self):
+        return self.component
+
+    def process_payload(self, action, payload):
+        time.sleep(payload.get('delay'))
+        return {'action': action, 'id': payload.get('id')}
+
+
+def test_server_concurrent_clients(registry):
+    channel = get_tcp_channel()
+    server = EchoServer(
+        {'slow': None, 'fast': None},
+        {'name': 'foo', 'timeout': 1000},
+        )
+    greenlet = gevent.spawn(server.listen, channel)
+    context = zmq.Context()
+    slow = context.socket(zmq.REQ)
+    fast = context.socket(zmq.REQ)
+    slow.linger = fast.linger = 0
+    try:
+        slow.connect(channel)
+        fast.connect(channel)
+        slow.send_multipart([b'slow', b'', pack({'id': 1, 'delay': 0.3})])
+        # Wait until the slow request is being processed
+        while not server.get_metrics()['active']:
+            gevent.sleep(0.001)
+
+        # The fast request doesn't wait for the slow one
+        fast.send_multipart([b'fast', b'', pack({'id': 2, 'delay': 0})])
+        assert fast.poll(200)
+        assert unpack(fast.recv_multipart()[1]) == {'action': 'fast', 'id': 2}
+        assert server.get_metrics()['active'] == 1
+
+        # Each client gets the response for its own request
+        assert slow.poll(1000)
+        assert unpack(slow.recv_multipart()[1]) == {'action': 'slow', 'id': 1}
+
+        # Requests of a client that waits for each response keep the order
+        for id in range(3):
+            slow.send_multipart([b'slow', b'', pack({'id': id, 'delay': 0})])
+            assert slow.poll(1000)
+            assert unpack(slow.recv_multipart()[1])['id'] == id
+    finally:
+        slow.close()
+        fast.close()
+        greenlet.kill()
+        context.term()
+
+
+def test_server_recycling(registry, mocker):
+    channel = get_tcp_channel()
+    server = SlowServer(
+        {'foo': None},
+        {'name': 'foo', 'timeout': 1000},
+        max_requests=2,
+        )
+    assert not server.is_recycling()
+
+    greenlet = gevent.spawn(server.listen, channel)
+    context = zmq.Context()
+    client = context.socket(zmq.REQ)
+    client.linger = 0
+    try:
+        client.connect(channel)
+        for _ in range(2):
+            client.send_multipart([b'foo', b'', b'\x80'])
+            assert unpack(client.recv_multipart()[1]) == {'action': 'foo'}
+
+        # Server stops listening after the request limit
+        greenlet.join(1)
+        assert greenlet.successful()
+        assert server.is_recycling()
+    finally:
+        client.close()
+        greenlet.kill()
+        context.term()
+
+    # Recycle when the memory limit is reached
+    get_rss = mocker.patch('katana.server.get_rss', return_value=100)
+    channel = get_tcp_channel()
+    server = SlowServer(
+        {'foo': None},
+        {'name': 'foo', 'timeout': 1000},
+        max_memory=100,
+        )
+    greenlet = gevent.spawn(server.listen, channel)
+    context = zmq.Context()
+    client = context.socket(zmq.REQ)
+    client.linger = 0
+    try:
+        client.connect(channel)
+        client.send_multipart([b'foo', b'', b'\x80'])
+        client.recv_multipart()
+        greenlet.join(1)
+        assert greenlet.successful()
+        assert server.is_recycling()
+        get_rss.assert_called()
+    finally:
+        client.close()
+        greenlet.kill()
+        context.term()
+
+
+def test_server_idle_gc(registry, mocker):
+    collector = IdleCollector()
+    leave = mocker.spy(collector, 'leave')
+    stop = mocker.spy(collector, 'stop')
+    channel = get_tcp_channel()
+    server = SlowServer(
+        {'foo': None},
+        {'name': 'foo', 'timeout': 1000},
+        gc_collector=collector,
+        max_requests=1,
+        )
+    assert server.get_metrics()['gc_collections'] == 0
+
+    greenlet = gevent.spawn(server.listen, channel)
+    context = zmq.Context()
+    client = context.socket(zmq.REQ)
+    client.linger = 0
+    try:
+        client.connect(channel)
+        client.send_multipart([b'foo', b'', b'\x80'])
+        client.recv_multipart()
+        greenlet.join(1)
+        assert greenlet.successful()
+    finally:
+        client.close()
+        greenlet.kill()
+        context.term()
+
+    # The collector runs after each request and stops with the server
+    leave.assert_called_once_with()
+    stop.assert_called_once_with()
+
+
+def test_server_invoke(registry, read_json):
+    def foo(action):
+        action.set_property('foo', 'bar')
+        return action
+
+    def fail(action):
+        raise Exception('Boom')
+
+    service = Service.new_instance()
+    server = ServiceServer(
+        {'foo': foo, 'fail': fail},
+        {'name': 'foo', 'version': '1.0', 'framework_version': '1.0.0',
+         'debug': False},
+        component=service,
+        )
+    transport = read_json('transport')
+    payload = CommandPayload.new('foo', 'service', {
+        'transport': transport,
+        'params': [],
+        })
+
+    # The transport has a download and transactions
+    meta, result = server.invoke('foo', payload)
+    assert meta == DOWNLOAD + TRANSACTIONS
+    path = 'command_reply/result/transport/meta/properties/foo'
+    assert result.get(path) == 'bar'
+
+    # Payloads can also be given packed
+    assert server.invoke('foo', pack(payload)) == (meta, result)
+
+    # Errors in the callbacks are returned as error payloads
+    meta, result = server.invoke('fail', payload)
+    assert result.get('command_reply/result/error/message') == 'Boom'
+
+    # Batches return a reply for each request
+    replies = server.invoke_many([('foo', payload), ('fail', payload)])
+    assert len(replies) == 2
+    assert replies[0].payload.get(path) == 'bar'
+    assert replies[1].payload == result
+
+    with pytest.raises(KatanaError):
+        server.invoke('missing', payload)
+
+
+def test_server_lazy_collection_error(registry, read_json, mocker):
+    def foo(action):
+        return action.set_collection(iter([{'id': 1}, 'invalid']))
+
+    error_callback = mocker.MagicMock()
+    service = Service.new_instance()
+    server = ServiceServer(
+        {'foo': foo},
+        {'name': 'foo', 'version': '1.0', 'framework_version': '1.0.0',
+         'debug': False},
+        component=service,
+        error_callback=error_callback,
+        )
+    payload = CommandPayload.new('foo', 'service', {
+        'transport': read_json('transport'),
+        'params': [],
+        })
+
+    # Invalid entities are found when the response is packed
+    meta, stream = server._ComponentServer__process_request_stream(
+        [b'foo', b'', pack(payload)],
+        )
+    assert meta == EMPTY_META
+    assert unpack(stream) == {'E': {'m': 'Entity must be an dict'}}
+    assert server.get_metrics()['errors'] == 1
+    error_callback.assert_called_once()
+
+
+def test_server_release_resources(registry, read_json):
+    def foo(action):
+        action.get_resource('pool')
+        raise Exception('Boom')
+
+    def error_callback(error):
+        service.get_resource('pool')
+
+    service = Service.new_instance()
+    service.set_resource_pool('pool', lambda component: object(), 2)
+    server = ServiceServer(
+        {'foo': foo},
+        {'name': 'foo', 'version': '1.0', 'framework_version': '1.0.0',
+         'debug': False},
+        component=service,
+        error_callback=error_callback,
+        )
+    payload = CommandPayload.new('foo', 'service', {
+        'transport': read_json('transport'),
+        'params': [],
+        })
+
+    # Values used by failed requests and by the error callback are
+    # returned to the pool when the request finishes.
+    server.invoke('foo', payload)
+    pool = service.get_resource_pool('pool')
+    assert pool.get_created() == 1
+    assert pool.get_idle() == 1
+
+
+def test_server_release_resources_after_packing(registry, read_json):
+    idle = []
+
+    def entities():
+        # Lazy collections are read while the response is packed
+        idle.append(pool.get_idle())
+        yield {'id': 1}
+
+    def foo(action):
+        action.get_resource('pool')
+        return action.set_collection(entities())
+
+    service = Service.new_instance()
+    service.set_resource_pool('pool', lambda component: object(), 1)
+    pool = service.get_resource_pool('pool')
+    server = ServiceServer(
+        {'foo': foo},
+        {'name': 'foo', 'version': '1.0', 'framework_version': '1.0.0',
+         'debug': False},
+        component=service,
+        )
+    payload = CommandPayload.new('foo', 'service', {
+        'transport': read_json('transport'),
+        'params': [],
+        })
+
+    stream = pack(payload)
+
+    # The pooled value is still checked out when the collection is read
+    server.invoke('foo', payload)
+    assert idle == [0]
+    assert pool.get_idle() == 1
+
+    server._ComponentServer__process_request_stream([b'foo', b'', stream])
+    assert idle == [0, 0]
+    assert pool.get_idle() == 1
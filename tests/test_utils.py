@@ -619,6 +619,12 @@ def test_singleton():
     assert singleton.instance == same
     assert same.instance == singleton
 
+    # Instances can be created without changing the singleton instance
+    other = TestSingleton.new_instance()
+    assert isinstance(other, TestSingleton)
+    assert other is not singleton
+    assert TestSingleton.instance is singleton
+
 
 def test_dict_crc():
     # Check CRC32 value
@@ -644,3 +650,11 @@ def test_safe_cast():
 
     # Cast that fails with default
     assert utils.safe_cast('A', float, default=2.2) == 2.2
+
+
+def test_get_rss(mocker):
+    assert utils.get_rss() > 0
+
+    # The peak size is used when the current size is not available
+    mocker.patch('katana.utils.open', side_effect=IOError, create=True)
+    assert utils.get_rss() > 0